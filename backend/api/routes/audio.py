@@ -1,12 +1,12 @@
 # File: backend/api/routes/audio.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends
 from fastapi.responses import FileResponse, JSONResponse
 from pathlib import Path
 import shutil
 import os
 import time
-from audio.speech_to_text import SpeechToText
-from audio.text_to_speech import TextToSpeech
+from audio.speech_to_text import TranscriptionQueueFull
+from app.registry import get_speech_to_text, get_text_to_speech
 import logging
 
 # Set up logging
@@ -14,8 +14,6 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-speech_to_text = SpeechToText()
-text_to_speech = TextToSpeech()
 
 # Ensure audio directory exists
 AUDIO_DIR = Path("data/audio")
@@ -50,7 +48,11 @@ def remove_file(file_path: Path):
         logger.error(f"Error removing file {file_path}: {e}")
 
 @router.post("/speech-to-text")
-async def convert_speech_to_text(background_tasks: BackgroundTasks, audio: UploadFile = File(...)):
+async def convert_speech_to_text(
+    background_tasks: BackgroundTasks,
+    audio: UploadFile = File(...),
+    speech_to_text=Depends(get_speech_to_text)
+):
     """Convert speech to text"""
     logger.info(f"Received audio file for conversion: {audio.filename}")
     
@@ -82,6 +84,15 @@ async def convert_speech_to_text(background_tasks: BackgroundTasks, audio: Uploa
             status_code=200
         )
         
+    except TranscriptionQueueFull as e:
+        if temp_file.exists():
+            temp_file.unlink()
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
+        
     except Exception as e:
         logger.error(f"Error processing audio: {str(e)}")
         # Clean up on error
@@ -93,7 +104,11 @@ async def convert_speech_to_text(background_tasks: BackgroundTasks, audio: Uploa
         )
 
 @router.post("/text-to-speech")
-async def convert_text_to_speech(text: str, background_tasks: BackgroundTasks):
+async def convert_text_to_speech(
+    text: str,
+    background_tasks: BackgroundTasks,
+    text_to_speech=Depends(get_text_to_speech)
+):
     """Convert text to speech"""
     logger.info("Received text for speech conversion")
     
@@ -113,9 +128,7 @@ async def convert_text_to_speech(text: str, background_tasks: BackgroundTasks):
                 detail="Failed to generate audio file"
             )
         
-        # Schedule cleanup for later
-        background_tasks.add_task(remove_file, audio_file)
-        
+        # The file is a shared TTS cache entry, so it is not removed after sending
         return FileResponse(
             path=audio_file,
             media_type="audio/mpeg",
@@ -130,11 +143,12 @@ async def convert_text_to_speech(text: str, background_tasks: BackgroundTasks):
         )
 
 @router.post("/cleanup")
-async def cleanup_files():
+async def cleanup_files(text_to_speech=Depends(get_text_to_speech)):
     """Clean up old temporary files"""
     try:
         cleanup_old_files(TEMP_DIR)
-        cleanup_old_files(RESPONSE_DIR)
+        # Responses are a content-addressed cache evicted by LRU under a byte budget
+        await text_to_speech.cleanup_old_files()
         return {"status": "success", "message": "Cleanup completed"}
     except Exception as e:
         raise HTTPException(
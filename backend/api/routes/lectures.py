@@ -4,30 +4,125 @@ from sqlalchemy.orm import Session
 from typing import List
 from app.dependencies import get_db
 from database.models.lecture import Lecture
-from api.schemas.responses import LectureCreate, Lecture as LectureSchema
-from rag.processor import RAGProcessor
+from api.schemas.responses import (
+    LectureCreate, LectureCreated, LectureUpdate, LectureUpdated, IngestionJob,
+    IndexRebuildRequest, IndexRebuildStatus, Lecture as LectureSchema
+)
+from app.registry import get_ingestion_queue, get_index_rebuilder
+from rag.ingestion import job_summary
+from rag.rebuild import RebuildInProgress
 
 router = APIRouter()
-rag_processor = RAGProcessor()
 
-@router.post("/", response_model=LectureSchema)
+def _lecture_response(lecture: Lecture, job_id=None) -> dict:
+    return {
+        "id": lecture.id,
+        "title": lecture.title,
+        "content": lecture.content,
+        "created_at": lecture.created_at,
+        "updated_at": lecture.updated_at,
+        "job_id": job_id
+    }
+
+@router.post("/", response_model=LectureCreated, status_code=202)
 async def create_lecture(
     lecture: LectureCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    ingestion_queue=Depends(get_ingestion_queue)
 ):
-    """Create new lecture"""
+    """Create new lecture and queue it for RAG ingestion.
+
+    Returns immediately with a job id; poll ``/jobs/{job_id}`` for progress.
+    """
     db_lecture = Lecture(**lecture.dict())
     db.add(db_lecture)
     db.commit()
     db.refresh(db_lecture)
     
-    # Process lecture for RAG
-    await rag_processor.process_lecture(
-        db_lecture.id,
-        db_lecture.content
-    )
+    # Chunking, embedding and indexing run in the background
+    job = await ingestion_queue.submit(db_lecture.id)
     
-    return db_lecture
+    return _lecture_response(db_lecture, job["id"])
+
+@router.put("/{lecture_id}", response_model=LectureUpdated)
+async def update_lecture(
+    lecture_id: int,
+    update: LectureUpdate,
+    db: Session = Depends(get_db),
+    ingestion_queue=Depends(get_ingestion_queue)
+):
+    """Update a lecture; changed content is re-indexed incrementally in the background.
+
+    Only new or changed chunks are embedded and chunks that no longer exist
+    are removed from the index.
+    """
+    db_lecture = db.query(Lecture).filter(Lecture.id == lecture_id).first()
+    if db_lecture is None:
+        raise HTTPException(status_code=404, detail="Lecture not found")
+    
+    content_changed = update.content is not None and update.content != db_lecture.content
+    if update.title is not None:
+        db_lecture.title = update.title
+    if content_changed:
+        db_lecture.content = update.content
+    db.commit()
+    db.refresh(db_lecture)
+    
+    job_id = None
+    if content_changed:
+        job = await ingestion_queue.submit(db_lecture.id, kind="update")
+        job_id = job["id"]
+    
+    return _lecture_response(db_lecture, job_id)
+
+@router.get("/jobs/{job_id}", response_model=IngestionJob)
+async def get_ingestion_job(
+    job_id: str,
+    ingestion_queue=Depends(get_ingestion_queue)
+):
+    """Get ingestion progress, timings and failures for a lecture"""
+    job = ingestion_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_summary(job)
+
+@router.post("/jobs/{job_id}/retry", response_model=IngestionJob)
+async def retry_ingestion_job(
+    job_id: str,
+    ingestion_queue=Depends(get_ingestion_queue)
+):
+    """Retry a failed ingestion job from its last embedded chunk"""
+    job = await ingestion_queue.retry(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_summary(job)
+
+@router.post("/index/rebuild", response_model=IndexRebuildStatus, status_code=202)
+async def rebuild_index(
+    request: IndexRebuildRequest,
+    index_rebuilder=Depends(get_index_rebuilder)
+):
+    """Rebuild the vector index in the background and switch to it once validated.
+
+    Questions keep being answered from the current index throughout; pass
+    an embedding provider, model or chunk settings to rebuild with different ones.
+    """
+    try:
+        return await index_rebuilder.start(
+            embedding_provider=request.embedding_provider,
+            embedding_model=request.embedding_model,
+            chunk_size=request.chunk_size,
+            chunk_overlap=request.chunk_overlap
+        )
+    except RebuildInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/index/rebuild", response_model=IndexRebuildStatus)
+async def get_index_rebuild(index_rebuilder=Depends(get_index_rebuilder)):
+    """Get the state of the current or last index rebuild"""
+    return index_rebuilder.status()
 
 @router.get("/", response_model=List[LectureSchema])
 async def get_lectures(
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from app.dependencies import get_db
-from qa.pipeline import QAPipeline
+from app.registry import registry, get_qa_pipeline
+import json
 import logging
 
 # Set up logging
@@ -13,7 +14,6 @@ logger = logging.getLogger(__name__)
 
 # Configure router with CORS options
 router = APIRouter()
-qa_pipeline = QAPipeline()
 
 class QuestionRequest(BaseModel):
     question: str
@@ -39,14 +39,38 @@ async def options_question():
         },
     )
 
+def _sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream_answer_events(qa_pipeline, question: str):
+    """Relay pipeline stream events as SSE frames"""
+    async for event in qa_pipeline.stream_answer(question):
+        event_type = event.pop("type")
+        yield _sse_event(event_type, event)
+
 @router.post("/ask", response_model=QuestionResponse)
 async def ask_question(
     request: QuestionRequest,
-    db: Session = Depends(get_db)
+    stream: bool = False,
+    db: Session = Depends(get_db),
+    qa_pipeline=Depends(get_qa_pipeline)
 ):
-    """Process a question and return an answer with audio"""
+    """Process a question and return an answer with audio.
+
+    With ``?stream=true`` the answer is sent as Server-Sent Events: one
+    ``token`` event per LLM token, then a final ``answer`` event with the
+    same fields as the JSON response.
+    """
     logger.info(f"Received question: {request.question}")
     
+    if stream:
+        return StreamingResponse(
+            _stream_answer_events(qa_pipeline, request.question),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
     try:
         # Get response from QA pipeline
         response = await qa_pipeline.get_answer(request.question)
@@ -69,11 +93,11 @@ async def ask_question(
 
 @router.get("/health")
 async def health_check():
-    """Check if the QA system is operational"""
-    try:
-        return {"status": "healthy"}
-    except Exception as e:
+    """Check if the QA system is operational (its pipeline is built and warm)"""
+    status = registry.readiness()["components"]["qa_pipeline"]
+    if status["state"] != "ready":
         raise HTTPException(
             status_code=503,
-            detail=f"System unhealthy: {str(e)}"
-        )
\ No newline at end of file
+            detail=f"System unhealthy: QA pipeline is {status['state']}"
+        )
+    return {"status": "healthy"}
\ No newline at end of file
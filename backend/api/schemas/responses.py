@@ -1,6 +1,6 @@
 # File: backend/api/schemas/responses.py
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 class LectureBase(BaseModel):
@@ -18,6 +18,59 @@ class Lecture(LectureBase):
     class Config:
         orm_mode = True
 
+class LectureUpdate(BaseModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+
+class LectureCreated(Lecture):
+    job_id: str
+
+class LectureUpdated(Lecture):
+    job_id: Optional[str] = None        # set when the content changed and re-indexing was queued
+
+class IngestionFailure(BaseModel):
+    attempt: int
+    chunk: int
+    error: str
+    at: float
+
+class IngestionJob(BaseModel):
+    id: str
+    lecture_id: int
+    kind: str = "create"                 # create or update
+    status: str                          # queued, running, completed or failed
+    total_chunks: Optional[int] = None   # known once the lecture is chunked
+    embedded_chunks: int = 0             # chunks present in the index
+    deleted_chunks: int = 0              # stale chunks removed by an update
+    progress: float = 0.0
+    attempts: int = 0
+    error: Optional[str] = None
+    failures: List[IngestionFailure] = []
+    timings: Dict[str, float] = {}
+    created_at: float
+    finished_at: Optional[float] = None
+
+class IndexRebuildRequest(BaseModel):
+    embedding_provider: Optional[str] = None  # openai, local or hashing; defaults to the current index's
+    embedding_model: Optional[str] = None     # defaults to the current index's (or the provider's default)
+    chunk_size: Optional[int] = None
+    chunk_overlap: Optional[int] = None
+
+class IndexRebuildStatus(BaseModel):
+    state: str                           # idle, building, catching_up, validating, completed or failed
+    current_generation: Optional[str] = None
+    generation: Optional[str] = None     # the generation being (or last) built
+    config: Dict[str, Any] = {}
+    lectures: int = 0
+    total_chunks: int = 0
+    embedded_chunks: int = 0
+    caught_up_lectures: int = 0          # lectures re-synced because they changed mid-build
+    validation: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    seconds: Optional[float] = None
+
 class QuestionResponse(BaseModel):
     question: str
     answer: str
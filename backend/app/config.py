@@ -19,9 +19,110 @@ class Settings(BaseSettings):
 
     # Paths
     VECTOR_STORE_PATH: str = str(BASE_DIR / "data/vector_store")
+    NUMPY_INDEX_PATH: str = str(BASE_DIR / "data/numpy_index")
+    CORPUS_VERSION_PATH: str = str(BASE_DIR / "data/corpus_version")
     AUDIO_TEMP_DIR: str = str(BASE_DIR / "data/audio/temp")
     AUDIO_RESPONSE_DIR: str = str(BASE_DIR / "data/audio/responses")
 
+    # Vector store backend: "chroma" or "numpy"
+    VECTOR_STORE_BACKEND: str = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+
+    # Retrieval thread pool (similarity search runs off the event loop)
+    RETRIEVAL_WORKERS: int = int(os.getenv("RETRIEVAL_WORKERS", 4))
+
+    # Retrieval mode: "hybrid" (BM25 + vectors, fused by rank), "dense" or "lexical"
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "hybrid")
+    RETRIEVAL_CANDIDATES: int = int(os.getenv("RETRIEVAL_CANDIDATES", 20))  # per ranking before fusion
+    RETRIEVAL_RRF_K: int = int(os.getenv("RETRIEVAL_RRF_K", 60))
+    RETRIEVAL_EMBED_TIMEOUT_SECONDS: float = float(os.getenv("RETRIEVAL_EMBED_TIMEOUT_SECONDS", 5))
+    RETRIEVAL_DENSE_COOLDOWN_SECONDS: float = float(os.getenv("RETRIEVAL_DENSE_COOLDOWN_SECONDS", 30))  # lexical-only after an embedding failure
+
+    # Speech to text (faster-whisper)
+    WHISPER_MODEL_SIZE: str = os.getenv("WHISPER_MODEL_SIZE", "tiny")
+    WHISPER_DEVICE: str = os.getenv("WHISPER_DEVICE", "cpu")
+    WHISPER_COMPUTE_TYPE: str = os.getenv("WHISPER_COMPUTE_TYPE", "int8")  # int8, float32, ...
+    WHISPER_CPU_THREADS: int = int(os.getenv("WHISPER_CPU_THREADS", 2))  # per worker
+    WHISPER_NUM_WORKERS: int = int(os.getenv("WHISPER_NUM_WORKERS", 2))
+    WHISPER_BEAM_SIZE: int = int(os.getenv("WHISPER_BEAM_SIZE", 5))
+    WHISPER_QUEUE_SIZE: int = int(os.getenv("WHISPER_QUEUE_SIZE", 8))  # per worker
+    WHISPER_SHARED_MODEL: bool = os.getenv("WHISPER_SHARED_MODEL", "false").lower() == "true"
+
+    # Streaming speech recognition over /ws binary frames
+    STT_VAD_ENERGY_THRESHOLD: float = float(os.getenv("STT_VAD_ENERGY_THRESHOLD", 0.01))  # RMS, 0-1
+    STT_PARTIAL_INTERVAL_MS: int = int(os.getenv("STT_PARTIAL_INTERVAL_MS", 1000))
+    STT_ENDPOINT_SILENCE_MS: int = int(os.getenv("STT_ENDPOINT_SILENCE_MS", 700))
+    STT_MAX_UTTERANCE_MS: int = int(os.getenv("STT_MAX_UTTERANCE_MS", 30000))
+
+    # WebSocket sessions
+    WS_MAX_CONCURRENT_REQUESTS: int = int(os.getenv("WS_MAX_CONCURRENT_REQUESTS", 4))  # tagged requests in flight per connection
+    WS_SUPERSEDE_PREVIOUS: bool = os.getenv("WS_SUPERSEDE_PREVIOUS", "false").lower() == "true"  # a new question cancels unfinished ones
+    WS_MAX_CONNECTIONS: int = int(os.getenv("WS_MAX_CONNECTIONS", 5000))  # per worker process, 0 = unlimited
+    WS_MAX_CONNECTIONS_PER_IP: int = int(os.getenv("WS_MAX_CONNECTIONS_PER_IP", 200))  # classrooms often share one address
+    WS_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", 600))  # no frames and no work; 0 = never reap
+    WS_REAP_INTERVAL_SECONDS: float = float(os.getenv("WS_REAP_INTERVAL_SECONDS", 30))
+    WS_PING_INTERVAL_SECONDS: float = float(os.getenv("WS_PING_INTERVAL_SECONDS", 20))  # protocol ping/pong, set on uvicorn
+    WS_PING_TIMEOUT_SECONDS: float = float(os.getenv("WS_PING_TIMEOUT_SECONDS", 20))
+
+    # Text to speech
+    TTS_WORKERS: int = int(os.getenv("TTS_WORKERS", 4))
+    TTS_PIPELINE_PARALLELISM: int = int(os.getenv("TTS_PIPELINE_PARALLELISM", 3))
+    TTS_LANGUAGE: str = os.getenv("TTS_LANGUAGE", "en")
+    TTS_VOICE: str = os.getenv("TTS_VOICE", "com")  # gTTS accent (Google domain tld)
+    TTS_CACHE_MAX_BYTES: int = int(os.getenv("TTS_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+    # Answer cache: "memory", "sqlite" (survives restarts) or "none"
+    ANSWER_CACHE_BACKEND: str = os.getenv("ANSWER_CACHE_BACKEND", "memory")
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+    ANSWER_CACHE_TTL_SECONDS: int = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600))
+    ANSWER_CACHE_PATH: str = str(BASE_DIR / "data/answer_cache.sqlite3")
+
+    # Semantic question cache (reuses answers to similarly phrased questions)
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))  # cosine similarity
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 2000))
+    SEMANTIC_CACHE_AUDIT_LOG: str = str(BASE_DIR / "data/semantic_cache_hits.jsonl")
+
+    # Background lecture ingestion
+    INGESTION_WORKERS: int = int(os.getenv("INGESTION_WORKERS", 2))  # lectures processed concurrently
+    INGESTION_MAX_ATTEMPTS: int = int(os.getenv("INGESTION_MAX_ATTEMPTS", 3))
+    INGESTION_JOBS_PATH: str = str(BASE_DIR / "data/ingestion_jobs.sqlite3")
+
+    # Answer generation
+    LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1200))  # whole prompt: template, question and context
+    CONTEXT_CANDIDATE_CHUNKS: int = int(os.getenv("CONTEXT_CANDIDATE_CHUNKS", 8))  # retrieved, then packed by relevance
+
+    # Startup warmup
+    WARMUP_LLM: bool = os.getenv("WARMUP_LLM", "true").lower() == "true"  # one-token request at startup
+    WARMUP_RETRY_SECONDS: float = float(os.getenv("WARMUP_RETRY_SECONDS", 5))  # first retry after a failed warmup (0: no retries)
+    WARMUP_RETRY_MAX_SECONDS: float = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", 300))  # retry delay doubles up to this
+
+    # Embeddings: provider "openai", "local" (sentence-transformers on CPU, see requirements-local-embeddings.txt) or "hashing" (tests, offline)
+    EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "openai")
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")  # OpenAI model
+    LOCAL_EMBEDDING_MODEL: str = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    LOCAL_EMBEDDING_DEVICE: str = os.getenv("LOCAL_EMBEDDING_DEVICE", "cpu")
+    LOCAL_EMBEDDING_BATCH_SIZE: int = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", 32))
+    LOCAL_EMBEDDING_THREADS: int = int(os.getenv("LOCAL_EMBEDDING_THREADS", 2))  # batches encoded in parallel
+    HASHING_EMBEDDING_DIM: int = int(os.getenv("HASHING_EMBEDDING_DIM", 512))
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = str(BASE_DIR / "data/embedding_cache/embeddings.sqlite3")
+    EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))  # chunks per embedding request
+    EMBEDDING_CONCURRENCY: int = int(os.getenv("EMBEDDING_CONCURRENCY", 4))  # requests in flight
+    EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", 5))
+    INDEX_FLUSH_CHUNKS: int = int(os.getenv("INDEX_FLUSH_CHUNKS", 512))  # buffered chunks per index write
+    INDEX_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("INDEX_FLUSH_INTERVAL_SECONDS", 5))
+
+    # Chunking (defaults for new indexes; each index generation records its own)
+    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", 1000))  # characters
+    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", 200))
+
+    # Blue/green index rebuilds
+    REBUILD_SMOKE_QUERIES: str = os.getenv("REBUILD_SMOKE_QUERIES", "")  # "|"-separated questions that must return results
+    REBUILD_SMOKE_SAMPLES: int = int(os.getenv("REBUILD_SMOKE_SAMPLES", 5))  # chunks that must retrieve themselves
+    REBUILD_GC_DELAY_SECONDS: float = float(os.getenv("REBUILD_GC_DELAY_SECONDS", 60))  # old generation kept for in-flight readers
+
     class Config:
         env_file = ".env"
         case_sensitive = True
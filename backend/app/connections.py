@@ -0,0 +1,204 @@
+# File: backend/app/connections.py
+import sys
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, Any, List, Optional
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+from app.config import settings
+from app.metrics import metrics
+from app.ws_protocol import negotiate
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+    typing.Callable = Callable
+
+logger = logging.getLogger(__name__)
+
+# Close codes (RFC 6455): going away, and try again later
+CLOSE_IDLE = 1001
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class Connection:
+    """A live WebSocket and what the manager knows about it"""
+
+    def __init__(self, websocket: WebSocket, kind: str, client_ip: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.websocket = websocket
+        self.kind = kind
+        self.client_ip = client_ip
+        self.connected_at = time.time()
+        self.last_seen = time.monotonic()
+        self.closing = False
+        # Set by the session handling the socket: number of unfinished requests
+        self.in_flight: Callable[[], int] = lambda: 0
+
+    def touch(self) -> None:
+        """Record activity from the client"""
+        self.last_seen = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_seen
+
+    def describe(self) -> Dict[str, Any]:
+        """Public view of the connection (served unauthenticated by /connections, so no client address)"""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "connected_seconds": round(time.time() - self.connected_at, 1),
+            "idle_seconds": round(self.idle_seconds(), 1),
+            "in_flight": self.in_flight()
+        }
+
+
+class ConnectionManager:
+    """Admits, tracks and reaps the process's WebSocket connections.
+
+    A connection over the global or per-client-IP cap is accepted and then
+    closed with 1013 (try again later), so clients see a reason instead of
+    a failed handshake. A background reaper closes connections that have
+    sent nothing for ``idle_timeout`` seconds and have no request in flight
+    (1001, going away). Protocol-level ping/pong is left to the server
+    (uvicorn's ``ws_ping_interval``/``ws_ping_timeout``), which drops
+    half-open sockets and so ends their sessions and in-flight tasks.
+    """
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_per_ip: int,
+        idle_timeout: float,
+        reap_interval: float
+    ):
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.idle_timeout = idle_timeout
+        self.reap_interval = max(1.0, reap_interval)
+        self._connections = {}
+        self._per_ip = defaultdict(int)
+        self._reaper = None
+        metrics.register_source("ws_connections", self.stats)
+
+    def _refusal(self, client_ip: str) -> Optional[str]:
+        if self.max_connections and len(self._connections) >= self.max_connections:
+            return f"Server is at its connection limit ({self.max_connections})"
+        if self.max_per_ip and self._per_ip[client_ip] >= self.max_per_ip:
+            return f"Too many connections from {client_ip} (limit {self.max_per_ip})"
+        return None
+
+    async def admit(self, websocket: WebSocket, kind: str) -> Optional[Connection]:
+        """Accept a socket and register it; returns None if it was refused (and closed)"""
+        client_ip = websocket.client.host if websocket.client else "unknown"
+        refusal = self._refusal(client_ip)
+        await websocket.accept(subprotocol=negotiate(websocket))
+        if refusal is not None:
+            metrics.incr("ws.connections_refused")
+            logger.warning(f"Refused {kind} connection: {refusal}")
+            try:
+                await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=refusal)
+            except Exception:
+                pass
+            return None
+
+        connection = Connection(websocket, kind, client_ip)
+        self._connections[connection.id] = connection
+        self._per_ip[client_ip] += 1
+        metrics.incr("ws.connections_opened")
+        return connection
+
+    def release(self, connection: Optional[Connection]) -> None:
+        """Forget a connection once its handler has returned"""
+        if connection is None or self._connections.pop(connection.id, None) is None:
+            return
+        self._per_ip[connection.client_ip] -= 1
+        if self._per_ip[connection.client_ip] <= 0:
+            del self._per_ip[connection.client_ip]
+        metrics.incr("ws.connections_closed")
+
+    def connections(self) -> List[Connection]:
+        return list(self._connections.values())
+
+    def start(self) -> None:
+        """Start the idle reaper (no-op when idle_timeout is 0)"""
+        if self.idle_timeout > 0 and self._reaper is None:
+            self._reaper = asyncio.ensure_future(self._reap_forever())
+
+    def stop(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+
+    async def _reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Error reaping idle connections: {e}")
+
+    async def reap(self) -> int:
+        """Close idle connections without work in flight; returns how many"""
+        idle = [
+            connection for connection in self.connections()
+            if not connection.closing
+            and connection.idle_seconds() >= self.idle_timeout
+            and connection.in_flight() == 0
+        ]
+        if not idle:
+            return 0
+        for connection in idle:
+            connection.closing = True
+        # A half-open peer never answers the close handshake; don't wait on them one by one
+        await asyncio.gather(*[self._close(connection) for connection in idle])
+        metrics.incr("ws.connections_reaped", len(idle))
+        logger.info(f"Closed {len(idle)} idle WebSocket connections")
+        return len(idle)
+
+    async def _close(self, connection: Connection) -> None:
+        try:
+            if connection.websocket.application_state != WebSocketState.DISCONNECTED:
+                await asyncio.wait_for(
+                    connection.websocket.close(code=CLOSE_IDLE, reason="Idle timeout"),
+                    timeout=5
+                )
+        except Exception as e:
+            logger.info(f"Closing idle connection {connection.id} failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Live connection counts and in-flight work, for /metrics"""
+        connections = self.connections()
+        by_kind = defaultdict(int)
+        in_flight = 0
+        busy = 0
+        for connection in connections:
+            by_kind[connection.kind] += 1
+            work = connection.in_flight()
+            in_flight += work
+            busy += 1 if work else 0
+        return {
+            "connections": len(connections),
+            "by_kind": dict(by_kind),
+            "client_ips": len(self._per_ip),
+            "busy_connections": busy,
+            "in_flight_requests": in_flight,
+            "max_connections": self.max_connections,
+            "max_per_ip": self.max_per_ip,
+            "idle_timeout_seconds": self.idle_timeout
+        }
+
+
+connection_manager = ConnectionManager(
+    max_connections=settings.WS_MAX_CONNECTIONS,
+    max_per_ip=settings.WS_MAX_CONNECTIONS_PER_IP,
+    idle_timeout=settings.WS_IDLE_TIMEOUT_SECONDS,
+    reap_interval=settings.WS_REAP_INTERVAL_SECONDS
+)
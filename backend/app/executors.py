@@ -0,0 +1,76 @@
+# File: backend/app/executors.py
+import sys
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from app.metrics import metrics
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Any = Any
+    typing.Callable = Callable
+
+
+class InstrumentedExecutor:
+    """Bounded thread pool for blocking work called from async code.
+
+    Reports queue depth and in-flight gauges plus wait (queued) and run
+    timings under the executor's name.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set_gauge(f"{self.name}.queue_depth", self._queued)
+        metrics.set_gauge(f"{self.name}.in_flight", self._running)
+
+    def _on_done(self, future) -> None:
+        # Jobs cancelled before starting never run _execute, so un-queue them here
+        if future.cancelled():
+            metrics.incr(f"{self.name}.cancelled")
+            with self._lock:
+                self._queued -= 1
+                self._publish()
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run fn(*args, **kwargs) in the pool and await its result"""
+        submitted = time.perf_counter()
+
+        def _execute():
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._publish()
+            metrics.observe(f"{self.name}.wait", started - submitted)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.observe(f"{self.name}.run", time.perf_counter() - started)
+                with self._lock:
+                    self._running -= 1
+                    self._publish()
+
+        with self._lock:
+            self._queued += 1
+            self._publish()
+        future = self._pool.submit(_execute)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop accepting work and release the worker threads"""
+        self._pool.shutdown(wait=wait)
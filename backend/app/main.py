@@ -1,10 +1,11 @@
 # File: backend/app/main.py
 import sys
+import asyncio
 from pathlib import Path
 import logging
-import json
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from api.routes import audio, qa, lectures
 
@@ -13,9 +14,11 @@ backend_dir = Path(__file__).parent.parent
 sys.path.append(str(backend_dir))
 
 # Import necessary components
-from audio.speech_to_text import SpeechToText
-from qa.pipeline import QAPipeline
-from audio.text_to_speech import TextToSpeech
+from app.config import settings
+from app.metrics import metrics
+from app.connections import connection_manager
+from app.registry import registry
+from app.ws_session import WebSocketSession
 
 # Fix for Python 3.8 compatibility with type annotations
 from typing import Dict, Any
@@ -68,23 +71,23 @@ app.include_router(qa.router, prefix="/api/qa", tags=["qa"])
 app.include_router(audio.router, prefix="/api/audio", tags=["audio"])
 app.include_router(lectures.router, prefix="/api/lectures", tags=["lectures"])
 
-# Initialize components for WebSocket
-stt = SpeechToText()
-qa_pipeline = QAPipeline()
-tts = TextToSpeech()
-
 # Simple test endpoint
 @app.websocket("/echo")
 async def websocket_echo(websocket: WebSocket):
-    await websocket.accept()
+    connection = await connection_manager.admit(websocket, "echo")
+    if connection is None:
+        return
     logger.info("Echo client connected")
     try:
         while True:
             data = await websocket.receive_text()
+            connection.touch()
             logger.info(f"Echo received: {data}")
             await websocket.send_text(f"Echo: {data}")
     except WebSocketDisconnect:
         logger.info("Echo client disconnected")
+    finally:
+        connection_manager.release(connection)
 
 # Add WebSocket endpoint
 @app.websocket("/ws")
@@ -93,127 +96,25 @@ async def websocket_endpoint(websocket: WebSocket):
     WebSocket endpoint for real-time communication with Unreal Engine.
     
     This function handles:
-    1. Receiving audio file paths from Unreal Engine
+    1. Receiving questions as text, whole audio files or streamed PCM
+       audio (partial and final transcripts are sent back)
     2. Converting speech to text
     3. Generating AI responses
     4. Sending text + audio back to Unreal Engine
     """
-    await websocket.accept()
-    logger.info("Client connected")
-
+    connection = await connection_manager.admit(websocket, "ws")
+    if connection is None:
+        return
     try:
-        while True:
-            # Receive data (can be text or JSON with audio path)
-            data = await websocket.receive()
-            
-            # Check if we received text or binary data
-            if "text" in data:
-                # Text message (JSON)
-                text_data = data["text"]
-                try:
-                    # Parse as JSON
-                    json_data = json.loads(text_data)
-                    logger.info(f"Received JSON data: {json_data}")
-                    
-                    # Check message type
-                    if json_data.get("type") == "text_input":
-                        # Handle text input
-                        user_text = json_data.get("content", "")
-                        logger.info(f"Received text message: {user_text}")
-                        
-                        if not user_text:
-                            await websocket.send_text(json.dumps({
-                                "type": "text",
-                                "content": "Error: Empty message"
-                            }))
-                            continue
-                        
-                        # Generate AI response using our QA pipeline
-                        logger.info("Generating AI response...")
-                        response = await qa_pipeline.get_answer(user_text)
-                        answer_text = response["answer"]
-                        audio_url = response["audio_url"]
-                        
-                        # Send response back to client
-                        response_data = {
-                            "type": "text",
-                            "question": user_text,
-                            "answer": answer_text,
-                            "audio_url": audio_url
-                        }
-                        
-                        await websocket.send_text(json.dumps(response_data))
-                        logger.info(f"Sent response to client: {answer_text[:50]}...")
-                        
-                    elif json_data.get("type") == "start_voice_recording":
-                        # Just send status back - actual recording happens in client
-                        await websocket.send_text(json.dumps({
-                            "type": "status",
-                            "content": "Voice recording started"
-                        }))
-                    
-                except json.JSONDecodeError:
-                    logger.error("Invalid JSON received")
-                    await websocket.send_text(json.dumps({
-                        "type": "text",
-                        "content": "Error: Invalid JSON format"
-                    }))
-                
-            else:
-                # Process as before with existing code
-                try:
-                    # For backward compatibility with the existing implementation
-                    data_text = await websocket.receive_text()
-                    logger.info(f"Received data: {data_text}")
-                    
-                    request = json.loads(data_text)
-                    
-                    # Check if this is a text input (from chat UI)
-                    if "text_input" in request:
-                        user_text = request["text_input"]
-                        logger.info(f"Received text input: {user_text}")
-                    else:
-                        # Process audio file
-                        audio_path = Path(request["audio_path"])
-                        logger.info(f"Received audio path: {audio_path}")
-                        
-                        # Convert Speech to Text
-                        user_text = await stt.convert(audio_path)
-                        logger.info(f"Recognized Text: {user_text}")
-
-                    # Retrieve AI Response
-                    response = await qa_pipeline.get_answer(user_text)
-                    answer_text = response["answer"]
-                    
-                    # Get audio URL from response
-                    audio_url = response["audio_url"]
-
-                    # Send AI response + audio URL back to client
-                    response_data = {
-                        "question": user_text,
-                        "answer": answer_text,
-                        "audio_url": audio_url
-                    }
-
-                    await websocket.send_text(json.dumps(response_data))
-                    logger.info(f"Sent response to client: {answer_text[:50]}...")
-                except Exception as e:
-                    logger.error(f"Error processing request: {e}")
-                    error_response = {
-                        "error": str(e),
-                        "message": "Error processing request"
-                    }
-                    await websocket.send_text(json.dumps(error_response))
-
-    except WebSocketDisconnect:
-        logger.info("Client disconnected")
-    except Exception as e:
-        logger.error(f"WebSocket error: {e}")
-        try:
-            await websocket.close()
-        except:
-            pass
-        logger.info("WebSocket connection closed due to error")
+        # Building the models (or waiting on the warmup doing it) must not block the loop
+        await WebSocketSession(
+            websocket,
+            await registry.aget("speech_to_text"),
+            await registry.aget("qa_pipeline"),
+            connection=connection
+        ).run()
+    finally:
+        connection_manager.release(connection)
 
 @app.get("/")
 async def root():
@@ -223,6 +124,25 @@ async def root():
         "chat_ui": "/static/chat_ui.html"
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Expose in-process counters, gauges and latency percentiles"""
+    return metrics.snapshot()
+
+@app.get("/connections")
+async def get_connections():
+    """List live WebSocket connections with their idle time and in-flight requests"""
+    return {
+        **connection_manager.stats(),
+        "items": [connection.describe() for connection in connection_manager.connections()]
+    }
+
+@app.get("/ready")
+async def readiness():
+    """Report per-component warmup status; 503 until every component is warm"""
+    status = registry.readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 @app.on_event("startup")
 async def startup_event():
     # Log application startup and directory setup
@@ -232,12 +152,26 @@ async def startup_event():
     logger.info("WebSocket endpoint available at /ws")
     logger.info("Echo WebSocket endpoint available at /echo")
     logger.info("Chat UI available at /static/chat_ui.html")
+
+    # Build and warm the shared components in the background so the socket binds
+    # immediately; /ready reports when they can serve traffic. Failures are retried.
+    app.state.warmup_task = asyncio.create_task(registry.warmup_all(
+        retry_delay=settings.WARMUP_RETRY_SECONDS,
+        max_retry_delay=settings.WARMUP_RETRY_MAX_SECONDS
+    ))
+    connection_manager.start()
+    logger.info("Readiness endpoint available at /ready")
     logger.info("Application startup complete")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     # Cleanup on shutdown
     logger.info("Application shutting down...")
+    warmup_task = getattr(app.state, "warmup_task", None)
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    connection_manager.stop()
+    registry.shutdown()
     try:
         # Cleanup temporary files
         for file in TEMP_DIR.glob("*.*"):
@@ -0,0 +1,80 @@
+# File: backend/app/metrics.py
+import sys
+import threading
+from collections import defaultdict, deque
+from typing import Callable, Dict, Any
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.Callable = Callable
+
+# Number of recent observations kept per timing for percentile estimates
+WINDOW_SIZE = 1024
+
+
+class Metrics:
+    """In-process counters, gauges and latency windows exposed at /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._timings = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+        self._sources = {}
+
+    def incr(self, name: str, value: int = 1) -> None:
+        """Increment a counter"""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record a duration in seconds"""
+        with self._lock:
+            self._timings[name].append(seconds * 1000)
+
+    def register_source(self, name: str, source: Callable[[], Dict[str, Any]]) -> None:
+        """Register a callable whose dict result is included in snapshots"""
+        with self._lock:
+            self._sources[name] = source
+
+    def _summarize(self, values) -> Dict[str, float]:
+        ordered = sorted(values)
+        if not ordered:
+            return {"count": 0}
+        return {
+            "count": len(ordered),
+            "p50_ms": round(ordered[len(ordered) // 2], 2),
+            "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2),
+            "max_ms": round(ordered[-1], 2)
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a JSON-serializable view of all metrics"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timings = {name: list(values) for name, values in self._timings.items()}
+            sources = dict(self._sources)
+
+        result = {
+            "counters": counters,
+            "gauges": gauges,
+            "timings": {name: self._summarize(values) for name, values in timings.items()}
+        }
+        for name, source in sources.items():
+            try:
+                result[name] = source()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
+
+
+metrics = Metrics()
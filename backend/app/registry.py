@@ -0,0 +1,281 @@
+# File: backend/app/registry.py
+import sys
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List
+from app.metrics import metrics
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Callable = Callable
+
+logger = logging.getLogger(__name__)
+
+
+def resident_memory_bytes() -> int:
+    """Current resident set size of this process (0 if it cannot be determined)"""
+    try:
+        # Linux: second field of statm is resident pages
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS, but still a useful upper bound
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+class ComponentRegistry:
+    """Owns the single process-wide instance of each heavy component.
+
+    Components are built lazily on first use, so importing a router no
+    longer loads models or opens vector store handles. Each construction is
+    timed along with the resident memory it added, and reported through
+    /metrics. warmup_all() builds and warms every component in the
+    background, retrying failures with backoff; readiness() reports which
+    ones can serve traffic. A component whose warmup failed also becomes
+    ready as soon as a request manages to build it.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._stats = {}
+        self._locks = {}
+        self._status = {}
+        metrics.register_source("components", self.stats)
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        """Declare how to build a component"""
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+        self._status[name] = {"state": "pending"}
+
+    def get(self, name: str) -> Any:
+        """Return the component, building it (and its dependencies) on first use"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        if name not in self._factories:
+            raise KeyError(f"Unknown component: {name}")
+
+        # One lock per component so independent components build in parallel;
+        # a factory may fetch the components it depends on
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+
+            logger.info(f"Building component: {name}")
+            rss_before = resident_memory_bytes()
+            started = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                logger.error(f"Error building component {name}: {str(e)}")
+                raise
+            seconds = time.perf_counter() - started
+            rss_after = resident_memory_bytes()
+
+            self._instances[name] = instance
+            if self._status[name]["state"] == "failed":
+                # Built on demand after a failed warmup (e.g. a dependency came back)
+                self._status[name] = {"state": "ready", "built_on_demand": True}
+                logger.info(f"Component {name} built after a failed warmup; marked ready")
+            self._stats[name] = {
+                "construction_seconds": round(seconds, 3),
+                "rss_delta_mb": round((rss_after - rss_before) / 2**20, 1),
+                "rss_after_mb": round(rss_after / 2**20, 1)
+            }
+            metrics.observe(f"components.{name}.construction", seconds)
+            logger.info(
+                f"Built {name} in {seconds:.2f}s "
+                f"(+{self._stats[name]['rss_delta_mb']} MB, RSS {self._stats[name]['rss_after_mb']} MB)"
+            )
+            return instance
+
+    async def aget(self, name: str) -> Any:
+        """get() for coroutines: a component still being built is awaited off the event loop"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get, name)
+
+    def is_built(self, name: str) -> bool:
+        return name in self._instances
+
+    async def warmup(self, name: str, retry_delay: float = 0, max_retry_delay: float = 300) -> None:
+        """Build a component off the event loop, then run its warmup() if it has one.
+
+        A failure is retried after retry_delay seconds, doubling up to
+        max_retry_delay, until it succeeds (no retries when retry_delay is 0).
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            self._status[name] = {"state": "warming", "attempt": attempt}
+            try:
+                instance = await self.aget(name)
+                if hasattr(instance, "warmup"):
+                    await instance.warmup()
+                break
+            except asyncio.CancelledError:
+                self._status[name] = {"state": "pending"}
+                raise
+            except Exception as e:
+                logger.error(f"Error warming up {name} (attempt {attempt}): {str(e)}")
+                metrics.incr(f"components.{name}.warmup_failures")
+                self._status[name] = {"state": "failed", "error": str(e), "attempt": attempt}
+                if not retry_delay:
+                    return
+                self._status[name]["retry_in_seconds"] = retry_delay
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, max_retry_delay)
+                if self.is_ready(name):
+                    # A request built it in the meantime
+                    return
+
+        seconds = time.perf_counter() - started
+        self._status[name] = {"state": "ready", "warmup_seconds": round(seconds, 3), "attempt": attempt}
+        metrics.observe(f"components.{name}.warmup", seconds)
+        logger.info(f"Component {name} ready after {seconds:.2f}s")
+
+    async def warmup_all(self, retry_delay: float = 0, max_retry_delay: float = 300) -> None:
+        """Warm every registered component concurrently"""
+        await asyncio.gather(*(
+            self.warmup(name, retry_delay, max_retry_delay) for name in self._factories
+        ))
+
+    def readiness(self) -> Dict[str, Any]:
+        """Per-component warmup state; ready only once every component is warm"""
+        components = {
+            name: {**self._status[name], **self._stats.get(name, {})}
+            for name in self._factories
+        }
+        return {
+            "ready": all(status["state"] == "ready" for status in self._status.values()),
+            "components": components
+        }
+
+    def is_ready(self, name: str) -> bool:
+        return self._status.get(name, {}).get("state") == "ready"
+
+    def build_all(self) -> None:
+        """Build every registered component"""
+        for name in self._factories:
+            self.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._factories)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "built": list(self._instances),
+            "pending": [name for name in self._factories if name not in self._instances],
+            "state": {name: status["state"] for name, status in self._status.items()},
+            "rss_mb": round(resident_memory_bytes() / 2**20, 1),
+            "construction": dict(self._stats)
+        }
+
+    def shutdown(self) -> None:
+        """Release worker pools of the components that were built"""
+        for name, instance in list(self._instances.items()):
+            try:
+                if hasattr(instance, "shutdown"):
+                    instance.shutdown()
+                elif hasattr(instance, "executor"):
+                    instance.executor.shutdown()
+            except Exception as e:
+                logger.error(f"Error shutting down {name}: {e}")
+
+
+def _build_rag_processor():
+    from rag.processor import RAGProcessor
+    return RAGProcessor()
+
+
+def _build_text_to_speech():
+    from audio.text_to_speech import TextToSpeech
+    return TextToSpeech()
+
+
+def _build_speech_to_text():
+    from audio.speech_to_text import SpeechToText
+    return SpeechToText()
+
+
+def _build_qa_pipeline():
+    from qa.pipeline import QAPipeline
+    return QAPipeline(
+        rag_processor=registry.get("rag_processor"),
+        text_to_speech=registry.get("text_to_speech")
+    )
+
+
+def _build_ingestion_queue():
+    from app.config import settings
+    from rag.ingestion import IngestionQueue, IngestionJobStore
+    return IngestionQueue(
+        registry.get("rag_processor"),
+        IngestionJobStore(settings.INGESTION_JOBS_PATH),
+        workers=settings.INGESTION_WORKERS,
+        max_attempts=settings.INGESTION_MAX_ATTEMPTS
+    )
+
+
+def _build_index_rebuilder():
+    from app.config import settings
+    from rag.rebuild import IndexRebuilder
+    return IndexRebuilder(
+        registry.get("rag_processor"),
+        smoke_queries=[q.strip() for q in settings.REBUILD_SMOKE_QUERIES.split("|") if q.strip()],
+        smoke_samples=settings.REBUILD_SMOKE_SAMPLES,
+        gc_delay=settings.REBUILD_GC_DELAY_SECONDS
+    )
+
+
+registry = ComponentRegistry()
+registry.register("rag_processor", _build_rag_processor)
+registry.register("text_to_speech", _build_text_to_speech)
+registry.register("speech_to_text", _build_speech_to_text)
+registry.register("qa_pipeline", _build_qa_pipeline)
+registry.register("ingestion_queue", _build_ingestion_queue)
+registry.register("index_rebuilder", _build_index_rebuilder)
+
+
+def get_rag_processor():
+    return registry.get("rag_processor")
+
+
+def get_text_to_speech():
+    return registry.get("text_to_speech")
+
+
+def get_speech_to_text():
+    return registry.get("speech_to_text")
+
+
+def get_qa_pipeline():
+    return registry.get("qa_pipeline")
+
+
+def get_ingestion_queue():
+    return registry.get("ingestion_queue")
+
+
+def get_index_rebuilder():
+    return registry.get("index_rebuilder")
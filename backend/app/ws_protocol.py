@@ -0,0 +1,109 @@
+# File: backend/app/ws_protocol.py
+import sys
+import json
+import logging
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Union
+from fastapi import WebSocket
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+    typing.Union = Union
+
+logger = logging.getLogger(__name__)
+
+# Sec-WebSocket-Protocol values a client may offer; without one the channel is JSON
+MSGPACK_SUBPROTOCOL = "vt.msgpack"
+JSON_SUBPROTOCOL = "vt.json"
+
+# Message field carrying inline binary audio in MessagePack frames
+AUDIO_FIELD = "audio"
+
+
+class ProtocolError(Exception):
+    """Raised when a frame cannot be decoded"""
+
+
+@lru_cache(maxsize=None)
+def _load_msgpack():
+    """The msgpack module, imported once (None if it is not installed)"""
+    try:
+        import msgpack
+        return msgpack
+    except ImportError:
+        logger.warning("msgpack is not installed; WebSocket clients will use JSON")
+        return None
+
+
+class JsonCodec:
+    """Messages as JSON text frames; audio travels in separate binary frames"""
+
+    subprotocol = None
+    binary = False
+
+    def encode(self, message: Dict[str, Any]) -> str:
+        return json.dumps(message)
+
+    def decode(self, frame: Union[str, bytes]) -> Dict[str, Any]:
+        try:
+            return json.loads(frame)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ProtocolError(f"Invalid JSON frame: {e}")
+
+
+class MsgpackCodec:
+    """Messages as MessagePack binary frames.
+
+    A frame is a map with the same fields as the JSON message (``type``,
+    ``request_id``, ...). Audio rides along as raw bytes in its ``audio``
+    field, so there is no base64, no separate binary frame and no second
+    HTTP request for the answer's audio.
+    """
+
+    subprotocol = MSGPACK_SUBPROTOCOL
+    binary = True
+
+    def __init__(self):
+        self._msgpack = _load_msgpack()
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return self._msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, frame: Union[str, bytes]) -> Dict[str, Any]:
+        if isinstance(frame, str):
+            # Text frames stay JSON on every channel
+            return JSON_CODEC.decode(frame)
+        try:
+            message = self._msgpack.unpackb(frame, raw=False)
+        except Exception as e:
+            raise ProtocolError(f"Invalid MessagePack frame: {str(e) or type(e).__name__}")
+        if not isinstance(message, dict):
+            raise ProtocolError("MessagePack frame must be a map")
+        return message
+
+
+JSON_CODEC = JsonCodec()
+
+
+def select_subprotocol(offered: List[str]) -> Optional[str]:
+    """The subprotocol to accept among those a client offered (None: plain JSON)"""
+    if MSGPACK_SUBPROTOCOL in offered and _load_msgpack() is not None:
+        return MSGPACK_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in offered:
+        return JSON_SUBPROTOCOL
+    return None
+
+
+def negotiate(websocket: WebSocket) -> Optional[str]:
+    """Subprotocol for a connecting socket, from its Sec-WebSocket-Protocol header"""
+    return select_subprotocol(websocket.scope.get("subprotocols") or [])
+
+
+def codec_for(subprotocol: Optional[str]):
+    """Codec for a negotiated subprotocol"""
+    return MsgpackCodec() if subprotocol == MSGPACK_SUBPROTOCOL else JSON_CODEC
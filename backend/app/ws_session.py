@@ -0,0 +1,638 @@
+# File: backend/app/ws_session.py
+import sys
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+from app.config import settings
+from app.metrics import metrics
+from app.ws_protocol import AUDIO_FIELD, ProtocolError, codec_for, negotiate
+from audio.streaming import StreamingTranscriber, WHISPER_SAMPLE_RATE
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.Optional = Optional
+
+logger = logging.getLogger(__name__)
+
+TEMP_DIR = Path("data/audio/temp")
+
+# Messages that must be handled in arrival order, before the next frame is read
+INLINE_TYPES = ("ping", "cancel", "audio_stream_start", "audio_stream_end", "audio_upload", "audio_chunk")
+
+# request_id of the message being handled; frames sent while handling it are tagged with it
+current_request_id = contextvars.ContextVar("ws_request_id", default=None)
+
+
+class WebSocketSession:
+    """Message handling and per-connection state for one /ws client.
+
+    Text frames carry JSON messages. Binary frames carry audio: raw PCM16
+    chunks while an ``audio_stream_start`` stream is open, otherwise a
+    complete audio file to transcribe and answer.
+
+    A message with a ``request_id`` is handled as its own task, so a slow
+    answer does not hold up later messages on the socket; at most
+    ``max_concurrent`` run at once. Every frame sent for it carries the
+    same ``request_id`` (responses may interleave and arrive out of order)
+    and a final ``{"type": "done"}`` frame marks its end. Questions without
+    a ``request_id`` are answered one at a time and in order, in a
+    background task under an internal id, so a ``cancel`` sent meanwhile is
+    still read; their frames stay untagged and no ``done`` is sent.
+
+    ``{"type": "cancel", "request_id": ...}`` cancels that request (without
+    a ``request_id``: every request of the connection). Cancellation
+    propagates through retrieval, the LLM call, TTS and STT, and the
+    request ends with a ``{"type": "cancelled"}`` frame. With ``supersede``
+    (per message, defaulting to WS_SUPERSEDE_PREVIOUS) a new question
+    cancels the ones still being answered.
+
+    A client offering the ``vt.msgpack`` subprotocol exchanges MessagePack
+    frames instead (see app.ws_protocol): audio is sent inline, in the
+    ``audio`` field of ``audio_upload``/``audio_chunk`` messages and of
+    answer and ``audio_segment`` frames. Text frames are JSON either way.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        stt,
+        qa_pipeline,
+        max_concurrent: Optional[int] = None,
+        supersede_previous: Optional[bool] = None,
+        connection=None
+    ):
+        self.websocket = websocket
+        self.subprotocol = negotiate(websocket)
+        self.codec = codec_for(self.subprotocol)
+        self.stt = stt
+        self.qa_pipeline = qa_pipeline
+        self.transcriber = None
+        self.stream_options = {}
+        self.max_concurrent = max(1, max_concurrent or settings.WS_MAX_CONCURRENT_REQUESTS)
+        self.requests = {}
+        self.upload_request_id = None
+        self.supersede_previous = (
+            settings.WS_SUPERSEDE_PREVIOUS if supersede_previous is None else supersede_previous
+        )
+        self._tasks = {}
+        self._cancelled = set()
+        # Internal ids of untagged questions; only one of them runs at a time
+        self._untagged = set()
+        self._untagged_lock = asyncio.Lock()
+        self._send_lock = asyncio.Lock()
+        # Registered with the connection manager (app.connections), if any
+        self.connection = connection
+        if connection is not None:
+            connection.in_flight = self.in_flight
+
+    def in_flight(self) -> int:
+        """Requests and streamed answers still running on this connection"""
+        return len(self._tasks)
+
+    async def send_json(self, message: Dict, request_id: Optional[str] = None) -> None:
+        """Send a message (a JSON text frame, or MessagePack on a binary channel)"""
+        async with self._send_lock:
+            await self._send_message(message, request_id)
+
+    async def send_bytes(self, data: bytes) -> None:
+        async with self._send_lock:
+            await self.websocket.send_bytes(data)
+
+    async def send_json_with_bytes(self, message: Dict, data: bytes) -> None:
+        """Send a message with audio: inline on a binary channel, otherwise as a
+        JSON frame and the binary frame it describes with nothing in between"""
+        async with self._send_lock:
+            if self.codec.binary:
+                await self._send_message({**message, AUDIO_FIELD: data})
+            else:
+                await self._send_message(message)
+                await self.websocket.send_bytes(data)
+
+    async def _send_message(self, message: Dict, request_id: Optional[str] = None) -> None:
+        request_id = request_id or current_request_id.get()
+        if request_id is not None:
+            message = {**message, "request_id": request_id}
+        frame = self.codec.encode(message)
+        if self.codec.binary:
+            await self.websocket.send_bytes(frame)
+        else:
+            await self.websocket.send_text(frame)
+
+    async def send_answer(self, message: Dict) -> None:
+        """Send an answer frame; on a binary channel its audio file travels inline"""
+        audio_file = self._audio_file(message.get("audio_url")) if self.codec.binary else None
+        if audio_file is not None:
+            await self.send_json_with_bytes(message, audio_file.read_bytes())
+        else:
+            await self.send_json(message)
+
+    def _audio_file(self, audio_url: Optional[str]) -> Optional[Path]:
+        """Local file behind a response audio URL (None if there is none)"""
+        if not audio_url:
+            return None
+        audio_file = self.qa_pipeline.text_to_speech.responses_dir / Path(audio_url).name
+        return audio_file if audio_file.exists() else None
+
+    async def dispatch(self, request_id: str, handler, *args) -> None:
+        """Run a request as a task, or refuse it if the connection is at its limit"""
+        if request_id in self.requests:
+            await self.send_json({
+                "type": "error",
+                "content": f"Request {request_id} is already in progress"
+            }, request_id=request_id)
+            return
+        if len(self.requests) >= self.max_concurrent:
+            metrics.incr("ws.requests_rejected")
+            await self.send_json({
+                "type": "error",
+                "content": f"Too many requests in progress (limit {self.max_concurrent})"
+            }, request_id=request_id)
+            await self.send_json({"type": "done"}, request_id=request_id)
+            return
+        task = self.spawn(self._run_request(request_id, handler, *args), request_id)
+        self.requests[request_id] = task
+        task.add_done_callback(lambda _: self.requests.pop(request_id, None))
+
+    def spawn(self, coroutine, request_id: Optional[str] = None) -> asyncio.Task:
+        """Start a task owned by this connection (cancelled when the client leaves)"""
+        task = asyncio.ensure_future(coroutine)
+        self._tasks[task] = request_id
+        task.add_done_callback(self._forget_task)
+        return task
+
+    def _forget_task(self, task: asyncio.Task) -> None:
+        request_id = self._tasks.pop(task, None)
+        if task in self._cancelled:
+            self._cancelled.discard(task)
+            # Reported here rather than in the task: one cancelled before it
+            # started never runs any of its code. Runs before dispatch()'s
+            # callback, so a request's own task is still in self.requests.
+            if task.cancelled() and request_id is not None:
+                metrics.incr("ws.requests_cancelled")
+                logger.info(f"Request {request_id} cancelled")
+                if request_id in self._untagged:
+                    # The client never saw this id: report it untagged, without "done"
+                    asyncio.ensure_future(self._send_cancelled(None, False))
+                else:
+                    final = self.requests.get(request_id) is task
+                    asyncio.ensure_future(self._send_cancelled(request_id, final))
+
+    async def _send_cancelled(self, request_id: Optional[str], final: bool) -> None:
+        try:
+            await self.send_json({"type": "cancelled"}, request_id=request_id)
+            if final:
+                await self.send_json({"type": "done"}, request_id=request_id)
+        except Exception as e:
+            logger.error(f"Error reporting cancelled request {request_id}: {e}")
+
+    def cancel(self, request_id: Optional[str] = None, keep: Optional[asyncio.Task] = None) -> int:
+        """Cancel the tasks of a request (every request for None); returns how many were cancelled"""
+        cancelled = 0
+        for task, task_request_id in list(self._tasks.items()):
+            if task is keep or task.done():
+                continue
+            if request_id is None or task_request_id == request_id:
+                self._cancelled.add(task)
+                task.cancel()
+                cancelled += 1
+        return cancelled
+
+    def supersede(self, options: Dict) -> None:
+        """Cancel unfinished answers when a new question arrives, if asked to"""
+        if not options.get("supersede", self.supersede_previous):
+            return
+        superseded = self.cancel(keep=asyncio.current_task())
+        if superseded:
+            metrics.incr("ws.requests_superseded", superseded)
+            logger.info(f"New question superseded {superseded} unfinished requests")
+
+    def run_untagged(self, options: Dict, handler, *args) -> None:
+        """Answer a question without a request_id in the background, after the untagged ones before it"""
+        # Cancel unfinished answers now rather than once the queue reaches this one
+        self.supersede(options)
+        request_id = f"untagged-{uuid.uuid4().hex[:8]}"
+        self._untagged.add(request_id)
+        task = self.spawn(self._run_untagged(request_id, handler, *args), request_id)
+        task.add_done_callback(lambda _: self._untagged.discard(request_id))
+
+    async def _run_untagged(self, request_id: str, handler, *args) -> None:
+        # current_request_id stays unset, so the frames sent go out untagged
+        async with self._untagged_lock:
+            metrics.incr("ws.requests")
+            started = time.perf_counter()
+            try:
+                await handler(*args)
+            except Exception as e:
+                logger.error(f"Error processing request {request_id}: {e}")
+                await self.send_json({
+                    "error": str(e),
+                    "message": "Error processing request"
+                })
+            finally:
+                metrics.observe("ws.request", time.perf_counter() - started)
+
+    async def _run_request(self, request_id: str, handler, *args) -> None:
+        # Tasks copy the context, so this only tags frames sent by this request
+        current_request_id.set(request_id)
+        metrics.incr("ws.requests")
+        started = time.perf_counter()
+        try:
+            await handler(*args)
+        except Exception as e:
+            logger.error(f"Error processing request {request_id}: {e}")
+            await self.send_json({
+                "error": str(e),
+                "message": "Error processing request"
+            })
+        finally:
+            metrics.observe("ws.request", time.perf_counter() - started)
+        await self.send_json({"type": "done"})
+
+    async def run(self) -> None:
+        """Accept the connection and process messages until the client leaves"""
+        if self.websocket.application_state == WebSocketState.CONNECTING:
+            await self.websocket.accept(subprotocol=self.subprotocol)
+        logger.info(f"Client connected ({self.subprotocol or 'json'})")
+
+        try:
+            while True:
+                # Receive data (can be text or binary)
+                data = await self.websocket.receive()
+                if data["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(data.get("code", 1000))
+                if self.connection is not None:
+                    self.connection.touch()
+
+                if data.get("text") is not None:
+                    await self.handle_text(data["text"])
+                elif data.get("bytes") is not None:
+                    if self.codec.binary:
+                        await self.handle_frame(data["bytes"])
+                    else:
+                        await self.receive_binary(data["bytes"])
+
+        except WebSocketDisconnect:
+            logger.info("Client disconnected")
+        except Exception as e:
+            logger.error(f"WebSocket error: {e}")
+            try:
+                await self.websocket.close()
+            except:
+                pass
+            logger.info("WebSocket connection closed due to error")
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            if self.transcriber is not None:
+                self.transcriber.close()
+
+    async def handle_text(self, text_data: str) -> None:
+        """Parse a JSON text frame and handle it inline or as a concurrent request"""
+        try:
+            # Parse as JSON
+            json_data = json.loads(text_data)
+        except json.JSONDecodeError:
+            logger.error("Invalid JSON received")
+            await self.send_json({
+                "type": "text",
+                "content": "Error: Invalid JSON format"
+            })
+            return
+
+        logger.info(f"Received JSON data: {json_data}")
+        await self.route(json_data)
+
+    async def handle_frame(self, frame: bytes) -> None:
+        """Decode a MessagePack frame and handle it like a JSON message"""
+        try:
+            message = self.codec.decode(frame)
+        except ProtocolError as e:
+            logger.error(str(e))
+            await self.send_json({
+                "type": "error",
+                "content": f"Error: {e}"
+            })
+            return
+
+        if message.get("type") != "audio_chunk":
+            logger.info(f"Received message: { {k: v for k, v in message.items() if k != AUDIO_FIELD} }")
+        await self.route(message)
+
+    async def route(self, json_data: Dict) -> None:
+        """Handle a message inline or, with a request_id, as a concurrent request"""
+        request_id = json_data.get("request_id") if isinstance(json_data, dict) else None
+        if request_id is None:
+            if self.is_question(json_data):
+                self.run_untagged(json_data, self.handle_message, json_data)
+            else:
+                await self.handle_message(json_data)
+            return
+
+        request_id = str(request_id)
+        inline = json_data.get("type") in INLINE_TYPES
+        if json_data.get("type") == "audio_upload" and AUDIO_FIELD in json_data:
+            # The audio is in the message itself: answering it is a request
+            inline = False
+        if inline:
+            token = current_request_id.set(request_id)
+            try:
+                await self.handle_message(json_data)
+            finally:
+                current_request_id.reset(token)
+        else:
+            await self.dispatch(request_id, self.handle_message, json_data)
+
+    @staticmethod
+    def is_question(json_data) -> bool:
+        """Whether a message asks for an answer (typed, legacy or an inline audio upload)"""
+        if not isinstance(json_data, dict):
+            return False
+        message_type = json_data.get("type")
+        return (
+            message_type == "text_input"
+            or (message_type is None and "text_input" in json_data)
+            or (message_type == "audio_upload" and AUDIO_FIELD in json_data)
+        )
+
+    async def handle_message(self, json_data: Dict) -> None:
+        """Handle one JSON message"""
+        message_type = json_data.get("type")
+
+        try:
+            if message_type == "ping":
+                await self.send_json({"type": "pong"})
+
+            elif message_type == "cancel":
+                # Tagged: cancel that request; untagged: cancel everything in progress
+                if not self.cancel(current_request_id.get()):
+                    await self.send_json({
+                        "type": "status",
+                        "content": "Nothing to cancel"
+                    })
+
+            elif message_type == "text_input":
+                await self.handle_text_input(json_data)
+
+            elif message_type == "start_voice_recording":
+                # Just send status back - actual recording happens in client
+                await self.send_json({
+                    "type": "status",
+                    "content": "Voice recording started"
+                })
+
+            elif message_type == "audio_stream_start":
+                await self.start_audio_stream(json_data)
+
+            elif message_type == "audio_stream_end":
+                await self.end_audio_stream()
+
+            elif message_type == "audio_upload":
+                if AUDIO_FIELD in json_data:
+                    await self.handle_upload(json_data[AUDIO_FIELD])
+                else:
+                    # The next binary frame is a complete audio file answered under this request_id
+                    self.upload_request_id = current_request_id.get()
+
+            elif message_type == "audio_chunk":
+                await self.handle_binary(json_data.get(AUDIO_FIELD) or b"")
+
+            elif "audio_path" in json_data:
+                # Server-side paths are not read: the audio itself has to be uploaded
+                await self.send_json({
+                    "type": "error",
+                    "content": "audio_path is not supported; send the audio as a binary frame "
+                               "(or in an audio_upload message)"
+                })
+
+            elif "text_input" in json_data:
+                await self.handle_legacy_request(json_data)
+
+        except Exception as e:
+            logger.error(f"Error processing request: {e}")
+            await self.send_json({
+                "error": str(e),
+                "message": "Error processing request"
+            })
+
+    async def handle_text_input(self, json_data: Dict) -> None:
+        """Answer a typed question"""
+        user_text = json_data.get("content", "")
+        logger.info(f"Received text message: {user_text}")
+
+        if not user_text:
+            await self.send_json({
+                "type": "text",
+                "content": "Error: Empty message"
+            })
+            return
+
+        await self.answer(user_text, json_data)
+
+    async def answer(self, user_text: str, options: Dict) -> None:
+        """Generate and send the answer to a question.
+
+        options may request token streaming ("stream"), per-sentence audio
+        ("speak_sentences"), binary audio delivery ("audio_delivery") and
+        cancelling unfinished answers ("supersede").
+        """
+        self.supersede(options)
+        if options.get("stream") or options.get("speak_sentences"):
+            # Forward tokens (and sentence audio) as they arrive, then the usual summary frame
+            await self.stream_answer(
+                user_text,
+                speak_sentences=bool(options.get("speak_sentences")),
+                audio_delivery=options.get("audio_delivery", "url")
+            )
+            return
+
+        # Generate AI response using our QA pipeline
+        logger.info("Generating AI response...")
+        response = await self.qa_pipeline.get_answer(user_text)
+        answer_text = response["answer"]
+
+        # Send response back to client
+        await self.send_answer({
+            "type": "text",
+            "question": user_text,
+            "answer": answer_text,
+            "audio_url": response["audio_url"]
+        })
+        logger.info(f"Sent response to client: {answer_text[:50]}...")
+
+    async def stream_answer(
+        self,
+        user_text: str,
+        speak_sentences: bool = False,
+        audio_delivery: str = "url"
+    ) -> None:
+        """Send {"type": "token"} frames while the answer is generated, then a final "text" frame.
+
+        With speak_sentences, ordered {"type": "audio_segment"} frames are sent as
+        each sentence's audio is ready. With audio_delivery="binary" every segment
+        frame is followed by a binary frame holding the mp3 bytes (on a
+        MessagePack channel the bytes are always inline in the frame).
+        """
+        logger.info("Streaming AI response...")
+        async for event in self.qa_pipeline.stream_answer(user_text, speak_sentences=speak_sentences):
+            if event["type"] == "token":
+                await self.send_json({
+                    "type": "token",
+                    "content": event["content"]
+                })
+            elif event["type"] == "audio_segment":
+                segment = {
+                    "type": "audio_segment",
+                    "index": event["index"],
+                    "text": event["text"],
+                    "audio_url": event["audio_url"]
+                }
+                if (audio_delivery == "binary" or self.codec.binary) and event["audio_file"]:
+                    audio_bytes = Path(event["audio_file"]).read_bytes()
+                    segment["size"] = len(audio_bytes)
+                    await self.send_json_with_bytes(segment, audio_bytes)
+                else:
+                    await self.send_json(segment)
+            else:
+                await self.send_answer({
+                    "type": "text",
+                    "question": user_text,
+                    "answer": event["answer"],
+                    "audio_url": event["audio_url"],
+                    "audio_segments": event.get("audio_segments"),
+                    "sources": event["sources"]
+                })
+                logger.info(f"Sent streamed response to client: {event['answer'][:50]}...")
+
+    async def start_audio_stream(self, json_data: Dict) -> None:
+        """Begin streaming recognition; following binary frames are PCM16 chunks"""
+        encoding = json_data.get("encoding", "pcm16")
+        if encoding != "pcm16":
+            await self.send_json({
+                "type": "error",
+                "content": f"Unsupported audio encoding: {encoding} (only pcm16 is supported)"
+            })
+            return
+
+        if self.transcriber is not None:
+            self.transcriber.close()
+
+        # Options such as "stream" apply to the answers of recognized utterances
+        self.stream_options = json_data
+        # Transcripts and answers of the stream are tagged with the request_id that opened it
+        request_id = current_request_id.get()
+        self.transcriber = StreamingTranscriber(
+            self.stt,
+            emit=functools.partial(self.send_json, request_id=request_id),
+            on_final=functools.partial(self.on_final_transcript, request_id) if json_data.get("answer", True) else None,
+            sample_rate=int(json_data.get("sample_rate", WHISPER_SAMPLE_RATE))
+        )
+        await self.send_json({
+            "type": "status",
+            "content": "Audio stream started"
+        })
+
+    async def end_audio_stream(self) -> None:
+        """Flush the stream: whatever speech is buffered becomes the final transcript"""
+        if self.transcriber is None:
+            return
+        transcriber, self.transcriber = self.transcriber, None
+        await transcriber.finish()
+        transcriber.close()
+        await self.send_json({
+            "type": "status",
+            "content": "Audio stream ended"
+        })
+
+    async def on_final_transcript(self, request_id: Optional[str], user_text: str) -> None:
+        logger.info(f"Recognized Text: {user_text}")
+        if request_id is None:
+            self.run_untagged(self.stream_options, self.answer, user_text, self.stream_options)
+            return
+        # Answer in the background so audio chunks keep being read meanwhile
+        self.spawn(self._answer_utterance(request_id, user_text, self.stream_options), request_id)
+
+    async def _answer_utterance(self, request_id: str, user_text: str, options: Dict) -> None:
+        current_request_id.set(request_id)
+        try:
+            await self.answer(user_text, options)
+        except Exception as e:
+            logger.error(f"Error answering streamed utterance: {e}")
+            await self.send_json({
+                "error": str(e),
+                "message": "Error processing request"
+            })
+
+    async def receive_binary(self, data: bytes) -> None:
+        """Route a binary frame: stream chunks inline, uploads as a (tagged or untagged) request"""
+        if self.transcriber is not None:
+            await self.handle_binary(data)
+        elif self.upload_request_id is not None:
+            request_id, self.upload_request_id = self.upload_request_id, None
+            await self.dispatch(request_id, self.handle_binary, data)
+        else:
+            self.run_untagged({}, self.handle_upload, data)
+
+    async def handle_binary(self, data: bytes) -> None:
+        """Feed a streamed audio chunk, or transcribe a complete uploaded audio file"""
+        if self.transcriber is not None:
+            try:
+                await self.transcriber.feed(data)
+            except Exception as e:
+                logger.error(f"Error processing audio stream: {e}")
+                await self.send_json({
+                    "error": str(e),
+                    "message": "Error processing audio stream"
+                })
+            return
+
+        await self.handle_upload(data)
+
+    async def handle_upload(self, data: bytes) -> None:
+        """Transcribe a complete uploaded audio file and answer it"""
+        temp_file = TEMP_DIR / f"ws_upload_{uuid.uuid4().hex}.wav"
+        try:
+            TEMP_DIR.mkdir(parents=True, exist_ok=True)
+            temp_file.write_bytes(data)
+            user_text = await self.stt.convert(temp_file)
+            logger.info(f"Recognized Text: {user_text}")
+            await self.send_json({"type": "final_transcript", "content": user_text})
+            if user_text:
+                await self.answer(user_text, {})
+        except Exception as e:
+            logger.error(f"Error processing request: {e}")
+            await self.send_json({
+                "error": str(e),
+                "message": "Error processing request"
+            })
+        finally:
+            if temp_file.exists():
+                temp_file.unlink()
+
+    async def handle_legacy_request(self, request: Dict) -> None:
+        """Original protocol: {"text_input": ...} without a type"""
+        user_text = request["text_input"]
+        logger.info(f"Received text input: {user_text}")
+
+        # Retrieve AI Response
+        self.supersede(request)
+        response = await self.qa_pipeline.get_answer(user_text)
+        answer_text = response["answer"]
+
+        # Send AI response + audio URL back to client
+        await self.send_answer({
+            "question": user_text,
+            "answer": answer_text,
+            "audio_url": response["audio_url"]
+        })
+        logger.info(f"Sent response to client: {answer_text[:50]}...")
@@ -1,41 +1,159 @@
 # File: backend/audio/speech_to_text.py
-from faster_whisper import WhisperModel
+import asyncio
 import logging
+import queue
+import threading
+import time
 from pathlib import Path
+from typing import Any
+import numpy as np
+from app.config import settings
+from app.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Whisper expects 16 kHz mono float32 samples
+WHISPER_SAMPLE_RATE = 16000
+
+
+class TranscriptionQueueFull(Exception):
+    """Raised when every transcription worker already has a full queue"""
+
+
+def _resolve(future: asyncio.Future, result: Any = None, error: Exception = None) -> None:
+    # Runs on the event loop thread; the caller may have given up in the meantime
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class TranscriptionWorker(threading.Thread):
+    """Thread that owns (or shares) a WhisperModel and drains its own bounded job queue.
+
+    CTranslate2 releases the GIL while decoding, so one thread per worker is
+    enough for transcriptions to run in parallel across cores.
+    """
+
+    def __init__(self, index: int, model: Any, queue_size: int):
+        super().__init__(name=f"stt-worker-{index}", daemon=True)
+        self.model = model
+        self.jobs = queue.Queue(maxsize=queue_size)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            audio, loop, future, submitted = job
+            metrics.set_gauge(f"stt.{self.name}.queue_depth", self.jobs.qsize())
+            if future.cancelled():
+                # The caller was cancelled while the job was queued
+                metrics.incr("stt.cancelled")
+                continue
+
+            started = time.perf_counter()
+            metrics.observe("stt.wait", started - submitted)
+            try:
+                text = self._transcribe(audio)
+                loop.call_soon_threadsafe(_resolve, future, text)
+            except Exception as e:
+                loop.call_soon_threadsafe(_resolve, future, None, e)
+            finally:
+                metrics.observe("stt.run", time.perf_counter() - started)
+
+    def _transcribe(self, audio: Any) -> str:
+        segments, _ = self.model.transcribe(
+            audio,
+            language="en",
+            beam_size=settings.WHISPER_BEAM_SIZE
+        )
+        # Segments are produced lazily, so decoding happens while joining
+        return " ".join([segment.text for segment in segments]).strip()
+
+
 class SpeechToText:
     def __init__(self):
         try:
-            # Simplified initialization with only required parameters
-            self.model = WhisperModel(
-                "tiny",  # Using tiny model for faster processing
-                device="cpu"
+            self.workers = []
+            num_workers = max(1, settings.WHISPER_NUM_WORKERS)
+            shared_model = None
+            if settings.WHISPER_SHARED_MODEL:
+                # One model instance that accepts num_workers concurrent transcriptions
+                shared_model = self._load_model(num_workers)
+
+            for index in range(num_workers):
+                model = shared_model or self._load_model(1)
+                worker = TranscriptionWorker(index, model, settings.WHISPER_QUEUE_SIZE)
+                worker.start()
+                self.workers.append(worker)
+
+            # Kept for callers that used the single model directly
+            self.model = self.workers[0].model
+            logger.info(
+                f"Speech to text model initialized successfully "
+                f"({settings.WHISPER_MODEL_SIZE}, {settings.WHISPER_COMPUTE_TYPE}, "
+                f"{num_workers} workers)"
             )
-            logger.info("Speech to text model initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing speech to text model: {str(e)}")
             raise
 
+    def _load_model(self, num_workers: int) -> Any:
+        # Imported here so importing this module does not load CTranslate2
+        from faster_whisper import WhisperModel
+        return WhisperModel(
+            settings.WHISPER_MODEL_SIZE,
+            device=settings.WHISPER_DEVICE,
+            compute_type=settings.WHISPER_COMPUTE_TYPE,
+            cpu_threads=settings.WHISPER_CPU_THREADS,
+            num_workers=num_workers
+        )
+
+    async def transcribe(self, audio: Any) -> str:
+        """Queue audio (a file path or 16 kHz float32 samples) on the least busy worker"""
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        worker = min(self.workers, key=lambda w: w.jobs.qsize())
+        try:
+            worker.jobs.put_nowait((audio, loop, future, time.perf_counter()))
+        except queue.Full:
+            metrics.incr("stt.rejected")
+            raise TranscriptionQueueFull("All transcription workers are busy, please retry")
+        metrics.set_gauge(f"stt.{worker.name}.queue_depth", worker.jobs.qsize())
+        return await future
+
+    async def warmup(self) -> None:
+        """Run a short silent clip through every worker so first requests skip lazy init"""
+        silence = np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32)
+        loop = asyncio.get_event_loop()
+        futures = []
+        for worker in self.workers:
+            future = loop.create_future()
+            worker.jobs.put((silence, loop, future, time.perf_counter()))
+            futures.append(future)
+        await asyncio.gather(*futures)
+
     async def convert(self, audio_file: Path) -> str:
         """Convert speech to text"""
         try:
             logger.info(f"Processing audio file: {audio_file}")
-            
-            # Transcribe audio
-            segments, _ = self.model.transcribe(
-                str(audio_file),
-                language="en"
-            )
-            
-            # Join segments
-            text = " ".join([segment.text for segment in segments])
-            text = text.strip()
-            
+
+            text = await self.transcribe(str(audio_file))
+
             logger.info(f"Successfully transcribed audio to: {text[:50]}...")
             return text
-            
+
+        except TranscriptionQueueFull:
+            logger.warning("Speech to text queue full, rejecting request")
+            raise
         except Exception as e:
             logger.error(f"Error in speech to text conversion: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def shutdown(self) -> None:
+        """Stop the worker threads once their queued jobs are done"""
+        for worker in self.workers:
+            worker.jobs.put(None)
@@ -0,0 +1,215 @@
+# File: backend/audio/streaming.py
+import sys
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Any
+import numpy as np
+from app.config import settings
+from app.metrics import metrics
+from audio.speech_to_text import TranscriptionQueueFull, WHISPER_SAMPLE_RATE
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.Optional = Optional
+    typing.Callable = Callable
+    typing.Awaitable = Awaitable
+
+logger = logging.getLogger(__name__)
+
+FRAME_MS = 30
+PREROLL_MS = 300
+
+
+class StreamingTranscriber:
+    """Incremental speech recognition over a stream of PCM chunks.
+
+    Audio is kept in a rolling buffer while an energy-based voice activity
+    detector tracks whether the user is speaking. While speech continues a
+    partial transcript of the buffer is emitted every ``partial_interval_ms``;
+    once ``endpoint_silence_ms`` of silence follows speech (or the utterance
+    hits ``max_utterance_ms``) the buffer is transcribed one last time and
+    emitted as the final transcript. That last decode runs in a background
+    task, so feed() returns at once and the caller keeps reading the socket;
+    finals are emitted in utterance order and no partial overtakes them.
+
+    Only 16-bit little-endian mono PCM is accepted; other sample rates are
+    resampled to 16 kHz, continuously across chunk boundaries.
+    """
+
+    def __init__(
+        self,
+        stt,
+        emit: Callable[[Dict], Awaitable[None]],
+        on_final: Optional[Callable[[str], Awaitable[None]]] = None,
+        sample_rate: int = WHISPER_SAMPLE_RATE
+    ):
+        self.stt = stt
+        self.emit = emit
+        self.on_final = on_final
+        self.sample_rate = sample_rate
+        self.energy_threshold = settings.STT_VAD_ENERGY_THRESHOLD
+        self.partial_interval_ms = settings.STT_PARTIAL_INTERVAL_MS
+        self.endpoint_silence_ms = settings.STT_ENDPOINT_SILENCE_MS
+        self.max_utterance_ms = settings.STT_MAX_UTTERANCE_MS
+
+        self._frame_size = WHISPER_SAMPLE_RATE * FRAME_MS // 1000
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._preroll = deque(maxlen=PREROLL_MS // FRAME_MS)
+        self._utterance = []
+        self._in_speech = False
+        self._speech_ms = 0
+        self._silence_ms = 0
+        self._since_partial_ms = 0
+        self._partial_task = None
+        self._final_task = None
+        self._leftover_byte = b""
+        # Resampler state: position of the next output sample, in input samples
+        # after the last sample of the previous chunk (which is kept)
+        self._resample_position = 0.0
+        self._last_sample = np.zeros(0, dtype=np.float32)
+
+    def _to_float(self, chunk: bytes) -> np.ndarray:
+        """Decode PCM16 bytes to float32 samples at 16 kHz"""
+        chunk = self._leftover_byte + chunk
+        if len(chunk) % 2:
+            self._leftover_byte, chunk = chunk[-1:], chunk[:-1]
+        else:
+            self._leftover_byte = b""
+        samples = np.frombuffer(chunk, dtype="<i2").astype(np.float32) / 32768.0
+        if self.sample_rate != WHISPER_SAMPLE_RATE and len(samples):
+            samples = self._resample(samples)
+        return samples
+
+    def _resample(self, samples: np.ndarray) -> np.ndarray:
+        """Linear interpolation to 16 kHz that continues where the previous chunk stopped.
+
+        The previous chunk's last sample is prepended and the fractional
+        position of the next output sample carried over, so chunk
+        boundaries neither drop samples nor introduce discontinuities.
+        """
+        step = self.sample_rate / WHISPER_SAMPLE_RATE
+        source = np.concatenate([self._last_sample, samples])
+        last_index = len(source) - 1
+        position = self._resample_position
+        count = int((last_index - position) // step) + 1 if position <= last_index else 0
+        positions = position + step * np.arange(count)
+        resampled = np.interp(positions, np.arange(len(source)), source).astype(np.float32)
+        # Re-anchor on the sample kept for the next chunk
+        self._resample_position = position + step * count - last_index
+        self._last_sample = source[-1:]
+        return resampled
+
+    async def feed(self, chunk: bytes) -> None:
+        """Add a chunk of audio, emitting partial/final transcripts as needed"""
+        self._pending = np.concatenate([self._pending, self._to_float(chunk)])
+        while len(self._pending) >= self._frame_size:
+            frame = self._pending[:self._frame_size]
+            self._pending = self._pending[self._frame_size:]
+            await self._process_frame(frame)
+
+    async def _process_frame(self, frame: np.ndarray) -> None:
+        is_speech = float(np.sqrt(np.mean(frame * frame))) >= self.energy_threshold
+
+        if not self._in_speech:
+            if not is_speech:
+                self._preroll.append(frame)
+                return
+            # Speech onset: keep a little audio from before the trigger
+            self._in_speech = True
+            self._utterance = list(self._preroll)
+            self._preroll.clear()
+            self._speech_ms = self._silence_ms = self._since_partial_ms = 0
+
+        self._utterance.append(frame)
+        self._speech_ms += FRAME_MS
+        self._since_partial_ms += FRAME_MS
+        self._silence_ms = 0 if is_speech else self._silence_ms + FRAME_MS
+
+        if self._silence_ms >= self.endpoint_silence_ms or self._speech_ms >= self.max_utterance_ms:
+            audio = self._end_utterance()
+            if audio is not None:
+                # Decoded in the background; chained so finals keep utterance order
+                self._final_task = asyncio.ensure_future(self._background_final(audio, self._final_task))
+        elif self._since_partial_ms >= self.partial_interval_ms:
+            self._since_partial_ms = 0
+            self._schedule_partial()
+
+    def _schedule_partial(self) -> None:
+        """Transcribe the current buffer in the background, skipping if one is already running"""
+        if self._partial_task is not None and not self._partial_task.done():
+            return
+        audio = np.concatenate(self._utterance)
+        self._partial_task = asyncio.ensure_future(self._emit_partial(audio))
+
+    async def _emit_partial(self, audio: np.ndarray) -> None:
+        try:
+            text = await self.stt.transcribe(audio)
+        except TranscriptionQueueFull:
+            # Partials are best effort; the final transcript is what matters
+            metrics.incr("stt.streaming.partials_skipped")
+            return
+        except Exception as e:
+            logger.error(f"Error in partial transcription: {e}")
+            return
+        if text:
+            # The final transcript of the previous utterance goes out first
+            await self._wait_for(self._final_task)
+            metrics.incr("stt.streaming.partials")
+            await self.emit({"type": "partial_transcript", "content": text})
+
+    def _end_utterance(self) -> Optional[np.ndarray]:
+        """Take the buffered utterance (None if empty) and reset the detector for the next one"""
+        utterance, self._utterance = self._utterance, []
+        self._in_speech = False
+        self._speech_ms = self._silence_ms = self._since_partial_ms = 0
+
+        # A stale partial must not arrive after the final transcript
+        if self._partial_task is not None and not self._partial_task.done():
+            self._partial_task.cancel()
+        self._partial_task = None
+        return np.concatenate(utterance) if utterance else None
+
+    @staticmethod
+    async def _wait_for(task: Optional[asyncio.Future]) -> None:
+        """Wait for a task to end without cancelling it if the waiter is cancelled"""
+        if task is not None and not task.done():
+            await asyncio.wait([task])
+
+    async def finish(self) -> Optional[str]:
+        """Transcribe whatever speech is buffered and emit it as the final transcript"""
+        audio = self._end_utterance()
+        if audio is None:
+            await self._wait_for(self._final_task)
+            return None
+        return await self._emit_final(audio, self._final_task)
+
+    async def _emit_final(self, audio: np.ndarray, previous: Optional[asyncio.Future] = None) -> str:
+        text = await self.stt.transcribe(audio)
+        await self._wait_for(previous)
+        metrics.incr("stt.streaming.finals")
+        await self.emit({"type": "final_transcript", "content": text})
+        if text and self.on_final is not None:
+            await self.on_final(text)
+        return text
+
+    async def _background_final(self, audio: np.ndarray, previous: Optional[asyncio.Future]) -> None:
+        try:
+            await self._emit_final(audio, previous)
+        except Exception as e:
+            logger.error(f"Error in final transcription: {e}")
+            await self.emit({
+                "error": str(e),
+                "message": "Error processing audio stream"
+            })
+
+    def close(self) -> None:
+        """Drop buffered audio and stop any background transcription"""
+        for task in (self._partial_task, self._final_task):
+            if task is not None:
+                task.cancel()
+        self._utterance = []
+        self._pending = np.zeros(0, dtype=np.float32)
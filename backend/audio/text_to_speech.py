@@ -1,80 +1,227 @@
 # File: backend/audio/text_to_speech.py
 from gtts import gTTS
 from pathlib import Path
+import asyncio
+import hashlib
+import os
 import uuid
 import logging
+import threading
 import time
-from datetime import datetime
+from typing import Dict
+from app.config import settings
+from app.executors import InstrumentedExecutor
+from app.metrics import metrics
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+TTS_ENGINE = "gtts"
+
+
+class SynthesisCancelled(Exception):
+    """Raised in the TTS worker when nobody waits for a synthesis any more"""
+
 class TextToSpeech:
     def __init__(self):
         """Initialize TextToSpeech with proper directory structure"""
         self.audio_dir = Path("data/audio")
         self.responses_dir = self.audio_dir / "responses"
         self.temp_dir = self.audio_dir / "temp"
-        
+
         # Create all necessary directories
         for directory in [self.audio_dir, self.responses_dir, self.temp_dir]:
             directory.mkdir(parents=True, exist_ok=True)
-            
+
+        # gTTS makes blocking network calls, so synthesis runs in its own pool
+        self.executor = InstrumentedExecutor("tts", settings.TTS_WORKERS)
+
+        # responses/ is a content-addressed cache: identical text is synthesized once
+        self.language = settings.TTS_LANGUAGE
+        self.voice = settings.TTS_VOICE
+        self.max_cache_bytes = settings.TTS_CACHE_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._cache_bytes = sum(
+            file.stat().st_size for file in self.responses_dir.glob("*.mp3")
+        )
+        metrics.register_source("tts_cache", self.stats)
+
         logger.info("TextToSpeech initialized with directories setup")
 
-    def _generate_unique_filename(self) -> str:
-        """Generate a unique filename for the audio response"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        return f"response_{timestamp}_{unique_id}.mp3"
+    def _cache_filename(self, text: str) -> str:
+        """Content-addressed filename for text under the current language/voice/engine"""
+        digest = hashlib.sha256(
+            "\0".join([TTS_ENGINE, self.language, self.voice, text]).encode("utf-8")
+        ).hexdigest()
+        return f"tts_{digest[:32]}.mp3"
+
+    def _synthesize(self, text: str, file_path: Path, cancelled: threading.Event = None) -> None:
+        """Blocking gTTS synthesis to file_path.
+
+        gTTS fetches long text in several requests; once `cancelled` is set
+        no further request is made and the partial file is deleted.
+        """
+        tts = gTTS(text=text, lang=self.language, tld=self.voice, slow=False)
+        # Write to a temp file first so readers never see a partial mp3
+        partial_file = self.temp_dir / f"{file_path.name}.{uuid.uuid4().hex[:8]}.part"
+        try:
+            with open(partial_file, "wb") as f:
+                for part in tts.stream():
+                    if cancelled is not None and cancelled.is_set():
+                        raise SynthesisCancelled(f"Synthesis of {file_path.name} cancelled")
+                    f.write(part)
+            if cancelled is not None and cancelled.is_set():
+                raise SynthesisCancelled(f"Synthesis of {file_path.name} cancelled")
+            os.replace(partial_file, file_path)
+        finally:
+            if partial_file.exists():
+                partial_file.unlink()
+
+        with self._lock:
+            self._cache_bytes += file_path.stat().st_size
+            over_budget = self._cache_bytes > self.max_cache_bytes
+        if over_budget:
+            self.evict(keep=file_path)
+
+    async def _convert_uncached(self, text: str, file_path: Path) -> Path:
+        """Synthesize text into its cache file in the TTS pool"""
+        cancelled = threading.Event()
+        try:
+            await self.executor.run(self._synthesize, text, file_path, cancelled)
+        except asyncio.CancelledError:
+            # A queued job is dropped by the pool; a running one stops at its next request
+            cancelled.set()
+            metrics.incr("tts.cancelled")
+            raise
+        return file_path
 
     async def convert(self, text: str) -> Path:
         """Convert text to speech using gTTS and return the file path"""
-        logger.info("Converting text to speech...")
-        
+        filename = self._cache_filename(text)
+        file_path = self.responses_dir / filename
+
+        if file_path.exists():
+            # Refresh mtime so LRU eviction keeps frequently used answers
+            try:
+                os.utime(file_path, None)
+                with self._lock:
+                    self.hits += 1
+                logger.info(f"Text to speech cache hit: {filename}")
+                return file_path
+            except FileNotFoundError:
+                # Evicted between the check and the touch; synthesize again
+                pass
+
+        # Identical concurrent requests share one synthesis, which is
+        # cancelled once every caller waiting for it has been cancelled
+        flight = self._inflight.get(filename)
+        if flight is not None:
+            with self._lock:
+                self.hits += 1
+        else:
+            logger.info("Converting text to speech...")
+            with self._lock:
+                self.misses += 1
+            task = asyncio.ensure_future(self._convert_uncached(text, file_path))
+            flight = {"task": task, "waiters": 0}
+            self._inflight[filename] = flight
+            task.add_done_callback(lambda _: self._forget(filename, task))
+
+        flight["waiters"] += 1
         try:
-            # Generate unique filename
-            filename = self._generate_unique_filename()
-            file_path = self.responses_dir / filename
-            
-            # Generate speech
-            tts = gTTS(text=text, lang='en', slow=False)
-            tts.save(str(file_path))
-            
+            await asyncio.shield(flight["task"])
             logger.info(f"Successfully created audio file: {filename}")
             return file_path
-            
+
+        except asyncio.CancelledError:
+            if flight["waiters"] == 1 and not flight["task"].done():
+                flight["task"].cancel()
+            raise
         except Exception as e:
             logger.error(f"Text to speech conversion failed: {str(e)}")
             raise Exception(f"Text to speech conversion failed: {str(e)}")
+        finally:
+            flight["waiters"] -= 1
+
+    def _forget(self, filename: str, task: asyncio.Future) -> None:
+        flight = self._inflight.get(filename)
+        if flight is not None and flight["task"] is task:
+            del self._inflight[filename]
+
+    async def warmup(self) -> None:
+        """Check synthesis end to end (a cache hit after the first run)"""
+        await self.convert("Hello")
+
+    def evict(self, keep: Path = None) -> int:
+        """Delete least recently used responses until the cache is under 90% of its byte budget"""
+        target = int(self.max_cache_bytes * 0.9)
+        files = []
+        for file in self.responses_dir.glob("*.mp3"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for _, size, file in files:
+            if total <= target:
+                break
+            if keep is not None and file == keep:
+                continue
+            try:
+                file.unlink()
+                total -= size
+                evicted += 1
+            except FileNotFoundError:
+                total -= size
+            except Exception as e:
+                logger.error(f"Error deleting response file {file}: {e}")
+
+        with self._lock:
+            self._cache_bytes = total
+        if evicted:
+            logger.info(f"Evicted {evicted} audio files from text to speech cache")
+        return evicted
+
+    def stats(self) -> Dict:
+        """Return cache hit/miss counters and disk usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "bytes": self._cache_bytes,
+                "max_bytes": self.max_cache_bytes
+            }
 
     async def cleanup_old_files(self, max_age_hours: int = 1):
-        """Clean up old audio files from both temp and responses directories"""
+        """Clean up old temp files and enforce the response cache byte budget"""
         try:
             current_time = time.time()
             max_age = max_age_hours * 3600
-            
+
             # Clean up temp directory
-            for file in self.temp_dir.glob("*.mp3"):
+            for file in self.temp_dir.glob("*.mp3*"):
                 if (current_time - file.stat().st_mtime) > max_age:
                     try:
                         file.unlink()
                         logger.info(f"Cleaned up temp file: {file}")
                     except Exception as e:
                         logger.error(f"Error deleting temp file {file}: {e}")
-            
-            # Clean up responses directory
-            for file in self.responses_dir.glob("*.mp3"):
-                if (current_time - file.stat().st_mtime) > max_age:
-                    try:
-                        file.unlink()
-                        logger.info(f"Cleaned up response file: {file}")
-                    except Exception as e:
-                        logger.error(f"Error deleting response file {file}: {e}")
-                        
+
+            # Responses are a cache: evict by LRU under the byte budget, not by age
+            self.evict()
+
             logger.info("Cleanup completed")
-            
+
         except Exception as e:
             logger.error(f"Error during cleanup: {str(e)}")
             raise Exception(f"Cleanup failed: {str(e)}")
@@ -86,4 +233,4 @@ class TextToSpeech:
                 file_path.unlink()
                 logger.info(f"Removed file: {file_path}")
         except Exception as e:
-            logger.error(f"Error removing file {file_path}: {e}")
\ No newline at end of file
+            logger.error(f"Error removing file {file_path}: {e}")
@@ -0,0 +1,90 @@
+# File: backend/audio/tts_pipeline.py
+import asyncio
+import logging
+import re
+from typing import AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Sentence end: terminal punctuation, optional closing quotes/brackets, then whitespace
+SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n{2,}")
+
+
+class SentenceSplitter:
+    """Incrementally splits streamed text into sentences.
+
+    Fragments shorter than ``min_length`` are held back and merged with the
+    next sentence so abbreviations and list markers don't become their own
+    audio segments.
+    """
+
+    def __init__(self, min_length: int = 20):
+        self.min_length = min_length
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text and return any sentences that are now complete"""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_length:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Return whatever text remains once the stream has ended"""
+        tail = self._buffer.strip()
+        self._buffer = ""
+        return tail or None
+
+
+class SpeechPipeline:
+    """Synthesizes sentences concurrently and yields their audio in order.
+
+    Sentences are submitted as soon as they are complete; at most
+    ``max_parallel`` syntheses run at once, and ``segments()`` yields each
+    result in submission order as soon as it (and all earlier ones) finish.
+    """
+
+    def __init__(self, text_to_speech, max_parallel: int = 3):
+        self.text_to_speech = text_to_speech
+        self._semaphore = asyncio.Semaphore(max_parallel)
+        self._pending = asyncio.Queue()
+        self._tasks = []
+
+    async def _synthesize(self, sentence: str):
+        async with self._semaphore:
+            return await self.text_to_speech.convert(sentence)
+
+    def submit(self, sentence: str) -> None:
+        """Start synthesizing a sentence"""
+        task = asyncio.ensure_future(self._synthesize(sentence))
+        self._tasks.append(task)
+        self._pending.put_nowait((len(self._tasks) - 1, sentence, task))
+
+    def close(self) -> None:
+        """Signal that no more sentences will be submitted"""
+        self._pending.put_nowait(None)
+
+    def cancel(self) -> None:
+        """Cancel any synthesis that has not finished yet"""
+        for task in self._tasks:
+            task.cancel()
+
+    async def segments(self) -> AsyncIterator[Dict]:
+        """Yield {"index", "text", "audio_file"} for each sentence, in order"""
+        while True:
+            item = await self._pending.get()
+            if item is None:
+                return
+            index, sentence, task = item
+            try:
+                audio_file = await task
+            except Exception as e:
+                logger.error(f"Error synthesizing sentence {index}: {e}")
+                audio_file = None
+            yield {"index": index, "text": sentence, "audio_file": audio_file}
@@ -0,0 +1,213 @@
+# File: backend/qa/answer_cache.py
+import sys
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Any
+from app.config import settings
+from app.metrics import metrics
+from qa.coalescing import normalize_question
+from rag.corpus import corpus_version
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.Optional = Optional
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryAnswerCache:
+    """LRU answer store with a per-entry TTL"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if time.time() - created > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, version: int, value: Dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def purge_other_versions(self, version: int) -> None:
+        # Keys are prefixed with the corpus version they were computed against
+        prefix = f"{version}:"
+        with self._lock:
+            for key in [key for key in self._entries if not key.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteAnswerCache:
+    """Persistent answer store so warm answers survive restarts"""
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, "
+            "version INTEGER NOT NULL, "
+            "value TEXT NOT NULL, "
+            "created REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            now = time.time()
+            if now - created > self.ttl_seconds:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return json.loads(value)
+
+    def set(self, key: str, version: int, value: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, version, value, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, version, json.dumps(value), now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN ("
+                "SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def purge_other_versions(self, version: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE version != ?", (version,))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+
+class AnswerCache:
+    """Exact-match cache of full answer results.
+
+    Keys combine the normalized question with the corpus version, so any
+    lecture ingest or vector store clear invalidates every cached answer.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._version = corpus_version.current()
+        metrics.register_source("answer_cache", self.stats)
+
+    def _key(self, question: str) -> str:
+        version = corpus_version.current()
+        if version != self._version:
+            # The corpus changed: drop answers computed against the old one
+            logger.info(f"Corpus changed (version {self._version} -> {version}), invalidating answer cache")
+            self.backend.purge_other_versions(version)
+            self._version = version
+        return f"{version}:{normalize_question(question)}"
+
+    def get(self, question: str) -> Optional[Dict]:
+        """Return the cached result for a question, if any"""
+        value = self.backend.get(self._key(question))
+        if value is None:
+            self.misses += 1
+            metrics.incr("answer_cache.misses")
+            return None
+        self.hits += 1
+        metrics.incr("answer_cache.hits")
+        return value
+
+    def set(self, question: str, result: Dict, version: Optional[int] = None) -> None:
+        """Store a result computed for a question.
+
+        version is the corpus version the computation started from: if the
+        corpus changed while it ran, the result may be based on the old
+        lectures and is not stored under the new version.
+        """
+        key = self._key(question)
+        if version is not None and version != self._version:
+            metrics.incr("answer_cache.stale_skipped")
+            logger.info(f"Not caching answer computed against corpus version {version} (now {self._version})")
+            return
+        self.backend.set(key, self._version, result)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.backend),
+            "corpus_version": self._version
+        }
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Process-wide answer cache configured by settings (None when disabled)"""
+    global _answer_cache
+    backend_name = settings.ANSWER_CACHE_BACKEND.lower()
+    if backend_name == "none":
+        return None
+
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            if backend_name == "sqlite":
+                backend = SqliteAnswerCache(
+                    settings.ANSWER_CACHE_PATH,
+                    settings.ANSWER_CACHE_MAX_ENTRIES,
+                    settings.ANSWER_CACHE_TTL_SECONDS
+                )
+            elif backend_name == "memory":
+                backend = InMemoryAnswerCache(
+                    settings.ANSWER_CACHE_MAX_ENTRIES,
+                    settings.ANSWER_CACHE_TTL_SECONDS
+                )
+            else:
+                raise ValueError(f"Unknown answer cache backend: {backend_name}")
+            _answer_cache = AnswerCache(backend)
+            logger.info(f"Answer cache initialized ({backend_name})")
+        return _answer_cache
@@ -0,0 +1,72 @@
+# File: backend/qa/coalescing.py
+import sys
+import asyncio
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict
+
+from app.metrics import metrics
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.Callable = Callable
+    typing.Awaitable = Awaitable
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for exact-match keys: case, whitespace and trailing punctuation"""
+    text = re.sub(r"\s+", " ", question.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation.
+
+    The first caller (the leader) starts the computation as a separate task;
+    callers arriving while it is in flight await the same task. A caller that
+    is cancelled only stops waiting: the shared task is cancelled once every
+    caller waiting on it has gone.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return fn()'s result, sharing it with concurrent callers of the same key"""
+        flight = self._flights.get(key)
+        if flight is None:
+            metrics.incr(f"{self.name}.leaders")
+            task = asyncio.ensure_future(fn())
+            flight = {"task": task, "waiters": 0}
+            self._flights[key] = flight
+            metrics.set_gauge(f"{self.name}.in_flight", len(self._flights))
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            metrics.incr(f"{self.name}.coalesced")
+            logger.info(f"Coalesced request onto in-flight computation: {key[:50]}")
+
+        flight["waiters"] += 1
+        try:
+            return await asyncio.shield(flight["task"])
+        except asyncio.CancelledError:
+            if flight["waiters"] == 1 and not flight["task"].done():
+                flight["task"].cancel()
+            raise
+        finally:
+            flight["waiters"] -= 1
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        flight = self._flights.get(key)
+        if flight is not None and flight["task"] is task:
+            del self._flights[key]
+            metrics.set_gauge(f"{self.name}.in_flight", len(self._flights))
+
+    def in_flight(self) -> int:
+        """Number of distinct keys currently being computed"""
+        return len(self._flights)
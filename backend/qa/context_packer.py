@@ -0,0 +1,215 @@
+# File: backend/qa/context_packer.py
+import sys
+import logging
+import math
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+from qa.prompts import ANSWER_TEMPLATE
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+
+logger = logging.getLogger(__name__)
+
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+
+# Rough characters per token when tiktoken is unavailable
+APPROX_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(model: str):
+    """tiktoken encoding for a model, loaded once per process (None if unavailable)"""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed; estimating prompt tokens from length")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer for {model} ({str(e)}); estimating prompt tokens from length")
+        return None
+
+
+class TokenCounter:
+    """Counts tokens with the LLM's tokenizer, memoizing counts of repeated texts"""
+
+    def __init__(self, model: str, cache_size: int = 4096):
+        self.encoding = _load_encoding(model)
+        # Retrieved chunks recur across questions; their counts are cached
+        self.count = lru_cache(maxsize=cache_size)(self.measure)
+
+    def measure(self, text: str) -> int:
+        """Token count without caching (for one-off texts such as whole prompts)"""
+        if self.encoding is None:
+            return math.ceil(len(text) / APPROX_CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of text within max_tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is None:
+            return text[:max_tokens * APPROX_CHARS_PER_TOKEN]
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+
+
+def overlap_length(earlier: str, later: str, min_chars: int = MIN_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of earlier that is also a prefix of later"""
+    head = later[:min_chars]
+    if len(head) < min_chars:
+        return 0
+    start = 0
+    while True:
+        position = earlier.find(head, start)
+        if position == -1:
+            return 0
+        # The first match leaves the longest suffix
+        if later.startswith(earlier[position:]):
+            return len(earlier) - position
+        start = position + 1
+
+
+class ContextPacker:
+    """Fills ANSWER_TEMPLATE with retrieved chunks up to a token budget.
+
+    Chunks are taken in relevance order. Text a chunk shares with an
+    already selected neighbour of the same lecture (the splitter's overlap)
+    is cut, and contiguous chunks are rendered as one passage. A chunk that
+    does not fit the remaining budget is skipped in favour of smaller, less
+    relevant ones; only the most relevant chunk is ever truncated. Each
+    chunk is charged for its passage header as well, so the rendered prompt
+    normally fits at the first measurement.
+    """
+
+    def __init__(self, counter: TokenCounter, budget: int, template: str = ANSWER_TEMPLATE):
+        self.counter = counter
+        self.budget = budget
+        self.template = template
+
+    def _header_tokens(self, doc: Dict) -> int:
+        """Tokens a passage adds around its text: the blank line before it and its [source] line.
+
+        Charged to every chunk, although contiguous chunks share one header,
+        so selection errs on the side of fitting.
+        """
+        source = (doc.get("metadata") or {}).get("source", "unknown")
+        return self.counter.count(f"\n\n[{source}]\n")
+
+    def _select(self, docs: List[Dict], available: int, stats: Dict) -> List[Dict]:
+        pieces = []
+        seen = set()
+        used = 0
+        for rank, doc in enumerate(docs):
+            original = doc["content"]
+            if original in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(original)
+
+            metadata = doc.get("metadata") or {}
+            lecture, chunk = metadata.get("lecture_id"), metadata.get("chunk_id")
+            start, end = 0, len(original)
+            if lecture is not None and chunk is not None:
+                for piece in pieces:
+                    if piece["lecture"] != lecture:
+                        continue
+                    if piece["chunk"] == chunk - 1:
+                        start = overlap_length(piece["original"], original)
+                    elif piece["chunk"] == chunk + 1:
+                        end = len(original) - overlap_length(original, piece["original"])
+            text = original[start:max(start, end)]
+            stats["overlap_chars"] += len(original) - len(text)
+            if not text.strip():
+                continue
+
+            header = self._header_tokens(doc)
+            tokens = self.counter.count(text) + header
+            if used + tokens > available:
+                if pieces:
+                    stats["dropped"] += 1
+                    continue
+                text = self.counter.truncate(text, available - header)
+                tokens = self.counter.count(text) + header
+                stats["truncated"] = True
+            pieces.append({
+                "rank": rank,
+                "lecture": lecture,
+                "chunk": chunk,
+                "original": original,
+                "text": text,
+                "trimmed_start": start > 0,
+                "trimmed_end": end < len(original),
+                "tokens": tokens,
+                "doc": doc
+            })
+            used += tokens
+        return pieces
+
+    def _render(self, pieces: List[Dict]) -> str:
+        """Join contiguous chunks into passages, most relevant passage first"""
+        ordered = sorted(
+            pieces,
+            key=lambda piece: (str(piece["lecture"]), piece["chunk"] if piece["chunk"] is not None else -1)
+        )
+        passages = []
+        for piece in ordered:
+            last = passages[-1] if passages else None
+            if (last is not None and piece["lecture"] is not None and piece["chunk"] is not None
+                    and last["lecture"] == piece["lecture"] and last["chunk"] == piece["chunk"] - 1):
+                # Where the overlap was cut, the pieces continue each other directly
+                separator = "" if piece["trimmed_start"] or last["trimmed_end"] else "\n"
+                last["text"] += separator + piece["text"]
+                last["chunk"] = piece["chunk"]
+                last["trimmed_end"] = piece["trimmed_end"]
+                last["rank"] = min(last["rank"], piece["rank"])
+            else:
+                passages.append({
+                    "lecture": piece["lecture"],
+                    "chunk": piece["chunk"],
+                    "rank": piece["rank"],
+                    "trimmed_end": piece["trimmed_end"],
+                    "source": (piece["doc"].get("metadata") or {}).get("source", "unknown"),
+                    "text": piece["text"]
+                })
+        passages.sort(key=lambda passage: passage["rank"])
+        return "\n\n".join(f"[{passage['source']}]\n{passage['text'].strip()}" for passage in passages)
+
+    def pack(self, question: str, docs: List[Dict]) -> Dict[str, Any]:
+        """Build the prompt for a question; returns it with the chunks used and token statistics"""
+        stats = {"duplicates": 0, "dropped": 0, "overlap_chars": 0, "truncated": False}
+        base_tokens = self.counter.measure(self.template.format(context="", question=question))
+        pieces = self._select(docs, self.budget - base_tokens, stats)
+
+        prompt = self.template.format(context=self._render(pieces), question=question)
+        prompt_tokens = self.counter.measure(prompt)
+        # Tokens can merge differently across joined texts; if the prompt still
+        # overshoots, drop enough of the least relevant chunks to cover the excess
+        while prompt_tokens > self.budget and len(pieces) > 1:
+            excess = prompt_tokens - self.budget
+            while excess > 0 and len(pieces) > 1:
+                piece = max(pieces, key=lambda piece: piece["rank"])
+                pieces.remove(piece)
+                stats["dropped"] += 1
+                excess -= piece["tokens"]
+            prompt = self.template.format(context=self._render(pieces), question=question)
+            prompt_tokens = self.counter.measure(prompt)
+
+        unpacked_tokens = base_tokens + sum(self.counter.count(doc["content"]) for doc in docs)
+        return {
+            "prompt": prompt,
+            "docs": [piece["doc"] for piece in sorted(pieces, key=lambda piece: piece["rank"])],
+            "prompt_tokens": prompt_tokens,
+            "tokens_saved": max(0, unpacked_tokens - prompt_tokens),
+            **stats
+        }
@@ -1,13 +1,22 @@
 # File: backend/qa/pipeline.py
 import sys
-from typing import Dict, Optional, List, Any
+from typing import Dict, Optional, List, Any, AsyncIterator, Tuple
 from langchain.chat_models import ChatOpenAI
-from langchain.schema import SystemMessage, HumanMessage, AIMessage
+from langchain.schema import HumanMessage, AIMessage
 from app.config import settings
 from rag.processor import RAGProcessor
 from audio.text_to_speech import TextToSpeech
+from audio.tts_pipeline import SentenceSplitter, SpeechPipeline
+from qa.coalescing import SingleFlight, normalize_question
+from qa.answer_cache import get_answer_cache
+from qa.semantic_cache import get_semantic_cache
+from qa.context_packer import ContextPacker, TokenCounter
+from rag.corpus import corpus_version
+from app.metrics import metrics
 from pathlib import Path
+import asyncio
 import logging
+import time
 
 # Fix for Python 3.8 compatibility with type annotations
 if sys.version_info < (3, 9):
@@ -16,14 +25,30 @@ if sys.version_info < (3, 9):
     typing.Any = Any
     typing.List = List
     typing.Optional = Optional
+    typing.Tuple = Tuple
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+NO_CONTEXT_ANSWER = "I don't have enough information in my knowledge base to answer this question. Please make sure lecture content has been loaded."
+ERROR_ANSWER = "I encountered an error while processing your question. Please try again."
+
+# Shared by every pipeline in the process so identical concurrent questions
+# from HTTP and WebSocket clients run retrieval, LLM and TTS only once
+question_flights = SingleFlight("qa.single_flight")
+
 class QAPipeline:
-    def __init__(self):
-        """Initialize the QA Pipeline with OpenAI, RAG, and TTS components"""
+    def __init__(
+        self,
+        rag_processor: Optional[RAGProcessor] = None,
+        text_to_speech: Optional[TextToSpeech] = None
+    ):
+        """Initialize the QA Pipeline with OpenAI, RAG, and TTS components.
+
+        Shared RAG and TTS instances can be passed in (see app.registry);
+        otherwise the pipeline builds its own.
+        """
         logger.info("Initializing QA Pipeline...")
         
         # Verify OpenAI API key
@@ -33,12 +58,20 @@ class QAPipeline:
         
         try:
             # Initialize components
-            self.rag_processor = RAGProcessor()
-            self.text_to_speech = TextToSpeech()
+            self.rag_processor = rag_processor or RAGProcessor()
+            self.text_to_speech = text_to_speech or TextToSpeech()
+            self.answer_cache = get_answer_cache()
+            self.semantic_cache = get_semantic_cache()
+            
+            # Prompts are packed to a token budget with the LLM's own tokenizer
+            self.context_packer = ContextPacker(
+                TokenCounter(settings.LLM_MODEL),
+                budget=settings.CONTEXT_TOKEN_BUDGET
+            )
             
             # Initialize OpenAI LLM
             self.llm = ChatOpenAI(
-                model_name="gpt-3.5-turbo",
+                model_name=settings.LLM_MODEL,
                 temperature=0.7,
                 openai_api_key=settings.OPENAI_API_KEY,
                 request_timeout=30
@@ -49,69 +82,328 @@ class QAPipeline:
             logger.error(f"Error initializing QA Pipeline: {str(e)}")
             raise
 
+    async def warmup(self) -> None:
+        """Open the LLM client connection with a one-token request"""
+        if settings.WARMUP_LLM:
+            await self.llm.agenerate([[HumanMessage(content="ping")]], max_tokens=1)
+
+    def _build_messages(self, question: str, context_docs: List[Dict]) -> Tuple[List, List[Dict]]:
+        """Build the chat messages for a question and its retrieved context.
+
+        Returns the messages and the chunks that made it into the prompt.
+        """
+        packed = self.context_packer.pack(question, context_docs)
+        metrics.incr("qa.prompt_tokens", packed["prompt_tokens"])
+        metrics.incr("qa.prompt_tokens_saved", packed["tokens_saved"])
+        metrics.set_gauge("qa.last_prompt_tokens", packed["prompt_tokens"])
+        logger.info(
+            f"Packed {len(packed['docs'])} of {len(context_docs)} chunks into {packed['prompt_tokens']} tokens "
+            f"({packed['overlap_chars']} overlapping chars cut, {packed['dropped']} chunks over budget)"
+        )
+        
+        # ANSWER_TEMPLATE carries the teaching-assistant instructions itself
+        return [HumanMessage(content=packed["prompt"])], packed["docs"]
+
+    async def _synthesize(self, answer: str) -> Optional[str]:
+        """Generate the audio response and return its URL (None on failure)"""
+        try:
+            audio_file = await self.text_to_speech.convert(answer)
+            # Ensure proper URL format for static file serving
+            audio_url = self._audio_url(audio_file)
+            logger.info(f"Generated audio response: {audio_file}")
+            return audio_url
+        except Exception as audio_error:
+            logger.error(f"Error generating audio: {audio_error}")
+            return None
+
+    def _build_result(
+        self,
+        question: str,
+        answer: str,
+        context_docs: List[Dict],
+        audio_url: Optional[str]
+    ) -> Dict:
+        """Prepare response with metadata and audio URL"""
+        return {
+            "question": question,
+            "answer": answer,
+            "sources": [doc["metadata"].get("source", "unknown") for doc in context_docs],
+            "confidence_score": self._calculate_confidence(context_docs, answer),
+            "audio_url": audio_url
+        }
+
+    def _fallback_result(self, question: str, answer: str) -> Dict:
+        """Response used when no answer could be generated"""
+        return {
+            "question": question,
+            "answer": answer,
+            "confidence_score": 0.0,
+            "sources": [],
+            "audio_url": None
+        }
+
     async def get_answer(self, question: str) -> Dict:
-        """Process question and generate answer using RAG and OpenAI with audio response"""
+        """Process question and generate answer using RAG and OpenAI with audio response.
+
+        Answers are served from the answer cache when possible, and concurrent
+        calls with the same normalized question share one computation.
+        """
+        result = await self._get_cached_answer(question)
+        if result is None:
+            result = await question_flights.do(
+                normalize_question(question),
+                lambda: self._compute_and_cache(question)
+            )
+        # Each caller gets its own copy carrying its own phrasing of the question
+        return {**result, "question": question}
+
+    async def _ensure_audio(self, result: Dict) -> Dict:
+        """Re-synthesize a cached result's audio if its file was evicted"""
+        audio_url = result.get("audio_url")
+        if audio_url and not (self.text_to_speech.responses_dir / Path(audio_url).name).exists():
+            # TTS files are content-addressed, so this recreates the same URL
+            return {**result, "audio_url": await self._synthesize(result["answer"])}
+        return result
+
+    async def _get_cached_answer(self, question: str) -> Optional[Dict]:
+        """Look up an exact-match cached result"""
+        if self.answer_cache is None:
+            return None
+        version = corpus_version.current()
+        result = self.answer_cache.get(question)
+        if result is None:
+            return None
+
+        refreshed = await self._ensure_audio(result)
+        if refreshed is not result:
+            self.answer_cache.set(question, refreshed, version)
+        return refreshed
+
+    def _cache_answer(
+        self,
+        question: str,
+        result: Dict,
+        query_embedding: Optional[List[float]] = None,
+        llm_seconds: float = 0.0,
+        version: Optional[int] = None
+    ) -> None:
+        # Failed generations are not worth remembering; version is the corpus
+        # version read before computing, so answers racing an ingest are dropped
+        if result["answer"] == ERROR_ANSWER:
+            return
+        if self.answer_cache is not None:
+            self.answer_cache.set(question, result, version)
+        # Only answers grounded in lecture content are reused for similar questions
+        if self.semantic_cache is not None and query_embedding is not None and result["sources"]:
+            self.semantic_cache.add(question, query_embedding, result, llm_seconds, version)
+
+    async def _compute_and_cache(self, question: str) -> Dict:
+        """Answer a question that missed the exact-match cache"""
+        version = corpus_version.current()
+        query_embedding = None
+        if self.semantic_cache is not None:
+            try:
+                # The same embedding is reused by retrieval on a miss
+                query_embedding = await self.rag_processor.embed_query(question)
+                similar = self.semantic_cache.lookup(question, query_embedding)
+                if similar is not None:
+                    result = await self._ensure_audio(similar)
+                    self._cache_answer(question, result, version=version)
+                    return result
+            except Exception as e:
+                logger.error(f"Error in semantic cache lookup: {str(e)}")
+
+        timings = {}
+        result = await self._compute_answer(question, query_embedding, timings)
+        self._cache_answer(question, result, query_embedding, timings.get("llm", 0.0), version)
+        return result
+
+    async def _compute_answer(
+        self,
+        question: str,
+        query_embedding: Optional[List[float]] = None,
+        timings: Optional[Dict] = None
+    ) -> Dict:
+        """Run retrieval, LLM generation and TTS for a question"""
         logger.info(f"Processing question: {question}")
         
         try:
             # Get relevant context from RAG
-            context_docs = await self.rag_processor.find_relevant_context(question)
+            context_docs = await self.rag_processor.find_relevant_context(
+                question,
+                num_chunks=settings.CONTEXT_CANDIDATE_CHUNKS,
+                query_embedding=query_embedding
+            )
             
             # Handle case where no relevant content is found
             if not context_docs:
                 logger.warning("No relevant context found in knowledge base")
-                return {
-                    "question": question,
-                    "answer": "I don't have enough information in my knowledge base to answer this question. Please make sure lecture content has been loaded.",
-                    "confidence_score": 0.0,
-                    "sources": [],
-                    "audio_url": None
-                }
-
-            # Join context
-            context = "\n".join([doc["content"] for doc in context_docs])
-            
-            # Create messages using proper LangChain message types
-            messages = [
-                SystemMessage(content="You are a helpful teaching assistant. Use the provided context to answer questions accurately and educationally."),
-                HumanMessage(content=f"Using this context:\n{context}\n\nAnswer this question: {question}")
-            ]
+                return self._fallback_result(question, NO_CONTEXT_ANSWER)
+
+            messages, context_docs = self._build_messages(question, context_docs)
 
             # Generate text response
+            llm_started = time.perf_counter()
             response = await self.llm.agenerate([messages])
             answer = response.generations[0][0].text
+            llm_seconds = time.perf_counter() - llm_started
+            metrics.observe("qa.llm", llm_seconds)
+            if timings is not None:
+                timings["llm"] = llm_seconds
 
             # Generate audio response
-            try:
-                audio_file = await self.text_to_speech.convert(answer)
-                # Ensure proper URL format for static file serving
-                audio_url = f"/api/audio/responses/{audio_file.name}"
-                logger.info(f"Generated audio response: {audio_file}")
-            except Exception as audio_error:
-                logger.error(f"Error generating audio: {audio_error}")
-                audio_url = None
-
-            # Prepare response with metadata and audio URL
-            result = {
-                "question": question,
-                "answer": answer,
-                "sources": [doc["metadata"].get("source", "unknown") for doc in context_docs],
-                "confidence_score": self._calculate_confidence(context_docs, answer),
-                "audio_url": audio_url
-            }
+            audio_url = await self._synthesize(answer)
+
+            result = self._build_result(question, answer, context_docs, audio_url)
             
             logger.info(f"Successfully generated answer with audio URL: {audio_url}")
             return result
 
+        except asyncio.CancelledError:
+            # Every caller gave up; the LLM request and any TTS job are abandoned
+            metrics.incr("qa.cancelled")
+            logger.info(f"Answer cancelled: {question[:50]}")
+            raise
         except Exception as e:
             logger.error(f"Error in get_answer: {str(e)}", exc_info=True)
-            return {
-                "question": question,
-                "answer": "I encountered an error while processing your question. Please try again.",
-                "confidence_score": 0.0,
-                "sources": [],
-                "audio_url": None
-            }
+            return self._fallback_result(question, ERROR_ANSWER)
+
+    def _audio_url(self, audio_file: Path) -> str:
+        """URL under which a generated audio file is served"""
+        return f"/api/audio/responses/{audio_file.name}"
+
+    async def _stream_tokens(self, messages: List, parts: List[str]) -> AsyncIterator[Dict]:
+        """Yield token events from the LLM, collecting the text into parts"""
+        async for chunk in self.llm.astream(messages):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield {"type": "token", "content": chunk.content}
+
+    async def _stream_tokens_with_speech(
+        self,
+        messages: List,
+        parts: List[str],
+        segments: List[Optional[str]]
+    ) -> AsyncIterator[Dict]:
+        """Yield token events interleaved with per-sentence audio segments.
+
+        Each completed sentence is handed to a SpeechPipeline while the LLM
+        keeps generating, and its audio is emitted (in sentence order) as soon
+        as it is ready, so playback can start before the answer is finished.
+        """
+        splitter = SentenceSplitter()
+        speech = SpeechPipeline(self.text_to_speech, settings.TTS_PIPELINE_PARALLELISM)
+        events = asyncio.Queue()
+        done = object()
+
+        async def generate():
+            try:
+                async for event in self._stream_tokens(messages, parts):
+                    await events.put(event)
+                    for sentence in splitter.feed(event["content"]):
+                        speech.submit(sentence)
+                tail = splitter.flush()
+                if tail:
+                    speech.submit(tail)
+            finally:
+                speech.close()
+                await events.put(done)
+
+        async def deliver():
+            try:
+                async for segment in speech.segments():
+                    audio_file = segment["audio_file"]
+                    audio_url = self._audio_url(audio_file) if audio_file else None
+                    segments.append(audio_url)
+                    await events.put({
+                        "type": "audio_segment",
+                        "index": segment["index"],
+                        "text": segment["text"],
+                        "audio_url": audio_url,
+                        "audio_file": str(audio_file) if audio_file else None
+                    })
+            finally:
+                await events.put(done)
+
+        producers = [asyncio.ensure_future(generate()), asyncio.ensure_future(deliver())]
+        try:
+            finished = 0
+            while finished < len(producers):
+                event = await events.get()
+                if event is done:
+                    finished += 1
+                else:
+                    yield event
+            # Surface any error raised by the LLM stream
+            await asyncio.gather(*producers)
+        finally:
+            for producer in producers:
+                producer.cancel()
+            speech.cancel()
+
+    async def stream_answer(self, question: str, speak_sentences: bool = False) -> AsyncIterator[Dict]:
+        """Stream the answer as it is generated.
+
+        Yields {"type": "token", "content": ...} events as LLM tokens arrive,
+        followed by one {"type": "answer", ...} event carrying the same fields
+        as get_answer (including the audio URL of the full answer).
+
+        With speak_sentences, each sentence is synthesized as soon as it is
+        complete and {"type": "audio_segment", "index", "text", "audio_url"}
+        events are interleaved in sentence order; the final event then lists
+        the segment URLs in "audio_segments" instead of one full-answer file.
+        """
+        logger.info(f"Streaming answer for question: {question}")
+        
+        try:
+            if not speak_sentences:
+                cached = await self._get_cached_answer(question)
+                if cached is not None:
+                    yield {"type": "token", "content": cached["answer"]}
+                    yield {"type": "answer", **cached, "question": question}
+                    return
+
+            version = corpus_version.current()
+            context_docs = await self.rag_processor.find_relevant_context(
+                question,
+                num_chunks=settings.CONTEXT_CANDIDATE_CHUNKS
+            )
+            
+            if not context_docs:
+                logger.warning("No relevant context found in knowledge base")
+                yield {"type": "answer", **self._fallback_result(question, NO_CONTEXT_ANSWER)}
+                return
+
+            messages, context_docs = self._build_messages(question, context_docs)
+
+            # Forward tokens to the caller as soon as the LLM produces them
+            parts = []
+            if speak_sentences:
+                segments = []
+                async for event in self._stream_tokens_with_speech(messages, parts, segments):
+                    yield event
+                answer = "".join(parts)
+                result = self._build_result(question, answer, context_docs, None)
+                result["audio_segments"] = segments
+                yield {"type": "answer", **result}
+                return
+
+            async for event in self._stream_tokens(messages, parts):
+                yield event
+            answer = "".join(parts)
+
+            audio_url = await self._synthesize(answer)
+            result = self._build_result(question, answer, context_docs, audio_url)
+            self._cache_answer(question, result, version=version)
+            yield {"type": "answer", **result}
+
+        except asyncio.CancelledError:
+            metrics.incr("qa.cancelled")
+            logger.info(f"Streamed answer cancelled: {question[:50]}")
+            raise
+        except Exception as e:
+            logger.error(f"Error in stream_answer: {str(e)}", exc_info=True)
+            yield {"type": "answer", **self._fallback_result(question, ERROR_ANSWER)}
 
     def _calculate_confidence(self, context_docs: list, answer: str) -> float:
         """Calculate a confidence score based on context and answer"""
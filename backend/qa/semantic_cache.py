@@ -0,0 +1,175 @@
+# File: backend/qa/semantic_cache.py
+import sys
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+import numpy as np
+from app.config import settings
+from app.metrics import metrics
+from rag.corpus import corpus_version
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Reuses answers to past questions whose embeddings are close enough.
+
+    Recently answered questions are kept as rows of a small normalized
+    embedding matrix; a lookup is one matrix-vector product. Entries belong
+    to the corpus version they were answered against and are dropped when it
+    changes. Every hit is appended to an audit log (both questions and their
+    similarity) so false hits can be reviewed and the threshold tuned.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, audit_log_path: Optional[str] = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.audit_log_path = Path(audit_log_path) if audit_log_path else None
+        self.hits = 0
+        self.misses = 0
+        self.saved_llm_seconds = 0.0
+        self._lock = threading.Lock()
+        self._reset(corpus_version.current())
+        metrics.register_source("semantic_cache", self.stats)
+
+    def _reset(self, version: int) -> None:
+        self._version = version
+        self._matrix = None
+        self._entries = []
+        self._last_used = np.zeros(self.max_entries)
+
+    def _normalize(self, embedding: Any) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _check_version(self) -> None:
+        version = corpus_version.current()
+        if version != self._version:
+            logger.info(f"Corpus changed (version {self._version} -> {version}), clearing semantic cache")
+            self._reset(version)
+
+    def lookup(self, question: str, embedding: Any) -> Optional[Dict]:
+        """Return the cached result of the most similar past question above the threshold"""
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version()
+            count = len(self._entries)
+            if count == 0 or self._matrix is None or query.shape[0] != self._matrix.shape[1]:
+                self.misses += 1
+                metrics.incr("semantic_cache.misses")
+                return None
+
+            similarities = self._matrix[:count] @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                metrics.incr("semantic_cache.misses")
+                return None
+
+            entry = self._entries[best]
+            self._last_used[best] = time.time()
+            self.hits += 1
+            self.saved_llm_seconds += entry["llm_seconds"]
+            metrics.incr("semantic_cache.hits")
+
+        self._audit(question, entry["question"], similarity)
+        logger.info(f"Semantic cache hit ({similarity:.3f}): '{question}' ~ '{entry['question']}'")
+        return entry["result"]
+
+    def add(
+        self,
+        question: str,
+        embedding: Any,
+        result: Dict,
+        llm_seconds: float = 0.0,
+        version: Optional[int] = None
+    ) -> None:
+        """Remember the answer to a question, evicting the least recently used entry when full.
+
+        version is the corpus version the answer was computed against; it is
+        not remembered if the corpus has changed since.
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version()
+            if version is not None and version != self._version:
+                metrics.incr("semantic_cache.stale_skipped")
+                return
+            if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+                self._reset(self._version)
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            if len(self._entries) < self.max_entries:
+                slot = len(self._entries)
+                self._entries.append(None)
+            else:
+                slot = int(np.argmin(self._last_used))
+
+            self._matrix[slot] = vector
+            self._entries[slot] = {
+                "question": question,
+                "result": result,
+                "llm_seconds": llm_seconds
+            }
+            self._last_used[slot] = time.time()
+
+    def _audit(self, question: str, matched_question: str, similarity: float) -> None:
+        """Append a hit to the audit log for false-hit review"""
+        if self.audit_log_path is None:
+            return
+        try:
+            self.audit_log_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.audit_log_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps({
+                    "timestamp": time.time(),
+                    "question": question,
+                    "matched_question": matched_question,
+                    "similarity": round(similarity, 4),
+                    "corpus_version": self._version
+                }) + "\n")
+        except Exception as e:
+            logger.error(f"Error writing semantic cache audit log: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "saved_llm_seconds": round(self.saved_llm_seconds, 3),
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "corpus_version": self._version
+            }
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Process-wide semantic cache configured by settings (None when disabled)"""
+    global _semantic_cache
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticCache(
+                settings.SEMANTIC_CACHE_THRESHOLD,
+                settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                settings.SEMANTIC_CACHE_AUDIT_LOG
+            )
+        return _semantic_cache
@@ -0,0 +1,54 @@
+# File: backend/rag/corpus.py
+import logging
+import os
+import threading
+from pathlib import Path
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusVersion:
+    """Persistent counter bumped every time the indexed lecture corpus changes.
+
+    Caches key their entries on the current version, so anything cached
+    before an ingest or a clear is never served afterwards. The value lives
+    in a small file so every component (and process) sharing the data
+    directory sees the same version.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._version = 0
+
+    def current(self) -> int:
+        """Return the current version, re-reading the file only when it changed"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+        if mtime != self._mtime:
+            try:
+                self._version = int(self.path.read_text().strip() or 0)
+                self._mtime = mtime
+            except (ValueError, FileNotFoundError):
+                pass
+        return self._version
+
+    def bump(self) -> int:
+        """Mark the corpus as changed and return the new version"""
+        with self._lock:
+            version = self.current() + 1
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.path.with_suffix(".tmp")
+            tmp_file.write_text(str(version))
+            os.replace(tmp_file, self.path)
+            self._version = version
+            self._mtime = os.stat(self.path).st_mtime_ns
+        logger.info(f"Corpus version is now {version}")
+        return version
+
+
+corpus_version = CorpusVersion(settings.CORPUS_VERSION_PATH)
@@ -0,0 +1,198 @@
+# File: backend/rag/embedding_cache.py
+import sys
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from a local disk cache.
+
+    Vectors are keyed on a hash of the model name plus the text and stored as
+    float32 blobs in SQLite. The least recently used entries are evicted once
+    the cache grows past ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache_path: str,
+        model_name: Optional[str] = None,
+        max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(
+            embeddings, "model", embeddings.__class__.__name__
+        )
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        try:
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, "
+                "vector BLOB NOT NULL, "
+                "nbytes INTEGER NOT NULL, "
+                "last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used "
+                "ON embeddings (last_used)"
+            )
+            self._conn.commit()
+            self._total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(nbytes), 0) FROM embeddings"
+            ).fetchone()[0]
+            logger.info(
+                f"Embedding cache ready at {cache_path} "
+                f"({self._total_bytes / 1024 / 1024:.1f} MB used)"
+            )
+        except Exception as e:
+            logger.error(f"Error initializing embedding cache: {str(e)}")
+            raise
+
+    def _key(self, text: str) -> str:
+        """Build the cache key for a text under the current model"""
+        digest = hashlib.sha256()
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Fetch cached vectors and refresh their LRU timestamps"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique_keys), _LOOKUP_BATCH):
+                batch = unique_keys[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, entries: Dict[str, np.ndarray]) -> None:
+        """Write new vectors to disk and evict old ones over the size cap"""
+        now = time.time()
+        rows = []
+        for key, vector in entries.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, nbytes, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._total_bytes += sum(row[2] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is under 90% of its cap"""
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        cursor = self._conn.execute(
+            "SELECT key, nbytes FROM embeddings ORDER BY last_used ASC"
+        )
+        stale = []
+        for key, nbytes in cursor:
+            if self._total_bytes <= target:
+                break
+            stale.append((key,))
+            self._total_bytes -= nbytes
+            evicted += 1
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+        logger.info(f"Evicted {evicted} entries from embedding cache")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, only calling the backend for texts not already cached"""
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = {
+                key: np.asarray(vector, dtype=np.float32)
+                for key, vector in zip(missing.keys(), vectors)
+            }
+            self._store(computed)
+            cached.update(computed)
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query, serving it from the cache when possible"""
+        key = self._key(text)
+        cached = self._lookup([key])
+        if key in cached:
+            with self._lock:
+                self.hits += 1
+            return cached[key].tolist()
+
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        self._store({key: vector})
+        with self._lock:
+            self.misses += 1
+        return vector.tolist()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and disk usage"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
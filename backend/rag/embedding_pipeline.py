@@ -0,0 +1,176 @@
+# File: backend/rag/embedding_pipeline.py
+import sys
+import asyncio
+import copy
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+from langchain.embeddings.base import Embeddings
+from app.executors import InstrumentedExecutor
+from app.metrics import metrics
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+    typing.Callable = Callable
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 30.0
+
+
+class EmbeddingPipeline:
+    """Embeds chunks in concurrent batches and writes them to the index in buffered flushes.
+
+    Batches are embedded with up to `concurrency` requests in flight, each
+    retried with jittered exponential backoff (rate limits, timeouts).
+    Results are consumed in chunk order and buffered; the buffer is written
+    to the vector store once it holds `flush_chunks` chunks or `flush_interval`
+    seconds have passed. Because writes are in order, every flush leaves a
+    contiguous prefix of the chunks indexed, which callers can checkpoint.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        vector_store: Any,
+        batch_size: int,
+        concurrency: int,
+        max_retries: int,
+        flush_chunks: int,
+        flush_interval: float
+    ):
+        self.embeddings = embeddings
+        self.vector_store = vector_store
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(0, max_retries)
+        self.flush_chunks = max(1, flush_chunks)
+        self.flush_interval = flush_interval
+        # Shared by all ingests, so the total number of embedding requests in flight is bounded
+        self.embed_executor = InstrumentedExecutor("embedding", self.concurrency)
+        # Single writer: index writes are serialized
+        self.write_executor = InstrumentedExecutor("index_writer", 1)
+
+    def retarget(self, embeddings: Embeddings, vector_store: Any) -> "EmbeddingPipeline":
+        """A pipeline writing to another index that shares this one's worker pools"""
+        pipeline = copy.copy(self)
+        pipeline.embeddings = embeddings
+        pipeline.vector_store = vector_store
+        return pipeline
+
+    async def _embed_batch(self, texts: List[str], stats: Dict) -> List[List[float]]:
+        """Embed one batch, retrying with jittered exponential backoff"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.embed_executor.run(self.embeddings.embed_documents, texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(2 ** attempt, MAX_BACKOFF_SECONDS) * (0.5 + random.random() / 2)
+                stats["retries"] += 1
+                metrics.incr("embedding.retries")
+                logger.warning(f"Embedding batch failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def run(
+        self,
+        texts: List[str],
+        metadatas: List[Dict],
+        ids: Optional[List[str]] = None,
+        start: int = 0,
+        on_flush: Optional[Callable[[int], None]] = None
+    ) -> Dict[str, Any]:
+        """Embed and index texts[start:]; on_flush(position) is called after every write.
+
+        Returns throughput statistics for the run.
+        """
+        started = time.perf_counter()
+        stats = {"chunks": 0, "batches": 0, "flushes": 0, "retries": 0, "write_seconds": 0.0}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def embed(begin: int, end: int) -> List[List[float]]:
+            async with semaphore:
+                return await self._embed_batch(texts[begin:end], stats)
+
+        bounds = [
+            (begin, min(begin + self.batch_size, len(texts)))
+            for begin in range(start, len(texts), self.batch_size)
+        ]
+        tasks = [asyncio.ensure_future(embed(begin, end)) for begin, end in bounds]
+
+        position = start
+        buffer = {"texts": [], "vectors": [], "metadatas": [], "ids": []}
+        last_flush = time.perf_counter()
+
+        async def flush() -> None:
+            nonlocal position, last_flush
+            count = len(buffer["texts"])
+            last_flush = time.perf_counter()
+            if count == 0:
+                return
+            write_started = time.perf_counter()
+            await self.write_executor.run(
+                self.vector_store.add_embeddings,
+                buffer["texts"],
+                buffer["vectors"],
+                buffer["metadatas"],
+                buffer["ids"] if ids is not None else None
+            )
+            stats["write_seconds"] += time.perf_counter() - write_started
+            stats["flushes"] += 1
+            position += count
+            for values in buffer.values():
+                values.clear()
+            if on_flush is not None:
+                on_flush(position)
+
+        try:
+            for (begin, end), task in zip(bounds, tasks):
+                # Later batches keep embedding while earlier ones are awaited
+                try:
+                    vectors = await task
+                except Exception:
+                    # Index what was already embedded so a retry resumes after it
+                    await flush()
+                    raise
+                stats["batches"] += 1
+                stats["chunks"] += end - begin
+                metrics.incr("embedding.chunks", end - begin)
+                buffer["texts"].extend(texts[begin:end])
+                buffer["vectors"].extend(vectors)
+                buffer["metadatas"].extend(metadatas[begin:end])
+                if ids is not None:
+                    buffer["ids"].extend(ids[begin:end])
+
+                if (len(buffer["texts"]) >= self.flush_chunks
+                        or time.perf_counter() - last_flush >= self.flush_interval):
+                    await flush()
+            await flush()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # Collect every outcome, so batches that failed after the first
+            # error don't log "Task exception was never retrieved"
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        seconds = time.perf_counter() - started
+        stats["seconds"] = round(seconds, 3)
+        stats["write_seconds"] = round(stats["write_seconds"], 3)
+        stats["chunks_per_second"] = round(stats["chunks"] / seconds, 1) if seconds > 0 else 0.0
+        metrics.set_gauge("embedding.chunks_per_second", stats["chunks_per_second"])
+        logger.info(
+            f"Embedded {stats['chunks']} chunks in {stats['batches']} batches, "
+            f"{stats['flushes']} flushes, {stats['chunks_per_second']} chunks/s"
+        )
+        return stats
+
+    def shutdown(self) -> None:
+        self.embed_executor.shutdown()
+        self.write_executor.shutdown()
@@ -0,0 +1,179 @@
+# File: backend/rag/embedding_providers.py
+import sys
+import hashlib
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from app.config import settings
+from rag.lexical_index import tokenize
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.List = List
+    typing.Optional = Optional
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("openai", "local", "hashing")
+
+
+class EmbeddingMismatch(Exception):
+    """Raised when a query embedding comes from a different provider than the index"""
+
+
+class QueryEmbedding(list):
+    """A query vector tagged with the provider that produced it"""
+
+    def __init__(self, values, provider: str):
+        super().__init__(values)
+        self.provider = provider
+
+
+def check_query_provider(embedding, index_provider: Optional[str]) -> None:
+    """Refuse a query vector tagged with a provider other than the one that built the index"""
+    provider = getattr(embedding, "provider", None)
+    if provider is not None and index_provider is not None and provider != index_provider:
+        raise EmbeddingMismatch(
+            f"Query was embedded with {provider} but the index was built with {index_provider}"
+        )
+
+
+def provider_id(provider: str, model: str) -> str:
+    """Identifies the vector space an index was built in, e.g. "local:all-MiniLM-L6-v2" """
+    return f"{provider}:{model}"
+
+
+def default_embedding_model(provider: str) -> str:
+    """Model used by a provider when none is given"""
+    if provider == "local":
+        return settings.LOCAL_EMBEDDING_MODEL
+    if provider == "hashing":
+        return f"hashing-{settings.HASHING_EMBEDDING_DIM}"
+    return settings.EMBEDDING_MODEL
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashing vectorizer: deterministic, dependency-free and instant.
+
+    Word unigrams and bigrams are hashed into `dim` signed buckets with
+    log-scaled counts. There is no semantic generalization, so it suits
+    tests and offline development rather than production retrieval. The
+    model name is "hashing-<dim>".
+    """
+
+    def __init__(self, model: str):
+        try:
+            self.dim = int(model.rsplit("-", 1)[1])
+        except (IndexError, ValueError):
+            raise ValueError(f"Hashing embedding model must look like 'hashing-<dim>', got {model!r}")
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = tokenize(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts = {}
+        for feature in features:
+            # Stable across processes, unlike hash()
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            bucket = value % self.dim
+            counts[bucket] = counts.get(bucket, 0.0) + (1.0 if value >> 63 else -1.0)
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for bucket, count in counts.items():
+            vector[bucket] = math.copysign(math.log1p(abs(count)), count)
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class LocalEmbeddings(Embeddings):
+    """Sentence-transformers model run on the local CPU.
+
+    The model is loaded on first use. Documents are encoded in batches of
+    `batch_size`, with up to `threads` batches in flight (the model runs
+    outside the GIL), so no request leaves the machine.
+    """
+
+    def __init__(self, model: str, batch_size: int, threads: int, device: str = "cpu"):
+        self.model_name = model
+        self.batch_size = max(1, batch_size)
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="local_embedding")
+
+    def _load_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        # Imported lazily: only needed when EMBEDDING_PROVIDER=local
+                        try:
+                            from sentence_transformers import SentenceTransformer
+                        except ImportError as e:
+                            raise ImportError(
+                                "EMBEDDING_PROVIDER=local needs sentence-transformers: "
+                                "pip install -r requirements-local-embeddings.txt"
+                            ) from e
+                        logger.info(f"Loading local embedding model {self.model_name} on {self.device}")
+                        self._model = SentenceTransformer(self.model_name, device=self.device)
+                    except Exception as e:
+                        logger.error(f"Error loading local embedding model: {str(e)}")
+                        raise
+        return self._model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._load_model().encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) <= self.batch_size:
+            return self._encode(texts)
+        self._load_model()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        vectors = []
+        for batch_vectors in self._pool.map(self._encode, batches):
+            vectors.extend(batch_vectors)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+
+def create_provider_embeddings(provider: str, model: str) -> Embeddings:
+    """Embeddings client for a provider ("openai", "local" or "hashing")"""
+    if provider == "openai":
+        from langchain.embeddings.openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(
+            model=model,
+            openai_api_key=settings.OPENAI_API_KEY
+        )
+    if provider == "local":
+        return LocalEmbeddings(
+            model,
+            batch_size=settings.LOCAL_EMBEDDING_BATCH_SIZE,
+            threads=settings.LOCAL_EMBEDDING_THREADS,
+            device=settings.LOCAL_EMBEDDING_DEVICE
+        )
+    if provider == "hashing":
+        return HashingEmbeddings(model)
+    raise ValueError(f"Unknown embedding provider: {provider}")
@@ -1,9 +1,21 @@
 # File: backend/rag/embeddings.py
-from langchain.embeddings.openai import OpenAIEmbeddings
 from app.config import settings
+from rag.embedding_cache import CachedEmbeddings
+from rag.embedding_providers import create_provider_embeddings, default_embedding_model, provider_id
 
-def get_embeddings():
-    """Get embeddings instance"""
-    return OpenAIEmbeddings(
-        openai_api_key=settings.OPENAI_API_KEY
-    )
\ No newline at end of file
+def get_embeddings(model: str = None, provider: str = None):
+    """Get embeddings instance for a provider and model (defaults from settings), wrapped in the disk cache when enabled"""
+    provider = (provider or settings.EMBEDDING_PROVIDER).lower()
+    model = model or default_embedding_model(provider)
+    embeddings = create_provider_embeddings(provider, model)
+    # Hashing is cheaper than a cache lookup
+    if not settings.EMBEDDING_CACHE_ENABLED or provider == "hashing":
+        return embeddings
+
+    return CachedEmbeddings(
+        embeddings,
+        cache_path=settings.EMBEDDING_CACHE_PATH,
+        # OpenAI entries keep their original key (the bare model name)
+        model_name=model if provider == "openai" else provider_id(provider, model),
+        max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES
+    )
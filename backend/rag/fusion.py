@@ -0,0 +1,33 @@
+# File: backend/rag/fusion.py
+import sys
+from typing import Dict, List
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.List = List
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict]], k: int = 60) -> List[Dict]:
+    """Merge ranked result lists with reciprocal rank fusion.
+
+    A chunk scores sum(1 / (k + rank)) over the lists it appears in, so
+    only ranks matter: BM25 and cosine scores never need to be comparable.
+    Chunks are matched across lists by source and text.
+    """
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = ((doc.get("metadata") or {}).get("source"), doc["content"])
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [
+        {
+            "content": docs[key]["content"],
+            "metadata": docs[key]["metadata"],
+            "score": round(scores[key], 5)
+        }
+        for key in sorted(scores, key=scores.get, reverse=True)
+    ]
@@ -0,0 +1,170 @@
+# File: backend/rag/generations.py
+import sys
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from app.config import settings
+from rag.embedding_providers import default_embedding_model
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+
+logger = logging.getLogger(__name__)
+
+POINTER_FILE = "CURRENT"
+GENERATIONS_DIR = "generations"
+GENERATION_FILE = "generation.json"
+# Entries of the root directory that belong to the generation layout, not to an index
+LAYOUT_FILES = {GENERATIONS_DIR, POINTER_FILE, f"{POINTER_FILE}.tmp"}
+
+
+def index_root(backend: Optional[str] = None) -> str:
+    """Directory holding the index (and its generations) for a vector store backend"""
+    backend = (backend or settings.VECTOR_STORE_BACKEND).lower()
+    return settings.NUMPY_INDEX_PATH if backend == "numpy" else settings.VECTOR_STORE_PATH
+
+
+def default_index_config() -> Dict[str, Any]:
+    """Index configuration from settings (used for a new, empty index)"""
+    provider = settings.EMBEDDING_PROVIDER.lower()
+    return {
+        "backend": settings.VECTOR_STORE_BACKEND.lower(),
+        "embedding_provider": provider,
+        "embedding_model": default_embedding_model(provider),
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP
+    }
+
+
+class IndexGenerations:
+    """Generations of the vector index, and which one readers use.
+
+    Each rebuild writes a complete index into its own directory under
+    ``<root>/generations``, with a ``generation.json`` describing how it was
+    built (embedding model, chunker). The ``CURRENT`` pointer file names the
+    generation readers use; it is replaced atomically, so switching is a
+    single rename and a reader sees either the old or the new index, never
+    a partial one. Without a pointer the index lives directly in the root
+    (the layout from before generations existed).
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._current = None
+
+    @property
+    def pointer_file(self) -> Path:
+        return self.root / POINTER_FILE
+
+    def current(self) -> Optional[str]:
+        """Name of the active generation (None for the root layout), re-read only when the pointer changed"""
+        try:
+            mtime = os.stat(self.pointer_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._mtime:
+            try:
+                self._current = self.pointer_file.read_text().strip() or None
+                self._mtime = mtime
+            except FileNotFoundError:
+                pass
+        return self._current
+
+    def path(self, name: Optional[str]) -> Path:
+        """Directory of a generation (the root itself for None)"""
+        return self.root if name is None else self.root / GENERATIONS_DIR / name
+
+    def has_config(self, name: Optional[str]) -> bool:
+        return (self.path(name) / GENERATION_FILE).exists()
+
+    def config(self, name: Optional[str]) -> Dict[str, Any]:
+        """How a generation was built (settings for an index that does not exist yet)"""
+        config = default_index_config()
+        recorded = {}
+        if self.has_config(name):
+            recorded = json.loads((self.path(name) / GENERATION_FILE).read_text())
+        elif name is None and self.root.is_dir():
+            if any(path.name not in LAYOUT_FILES for path in self.root.iterdir()):
+                recorded = {"embedding_model": settings.EMBEDDING_MODEL}
+        if recorded and "embedding_provider" not in recorded:
+            # Indexes built before providers were recorded used OpenAI
+            recorded["embedding_provider"] = "openai"
+        config.update(recorded)
+        return config
+
+    def create(self, config: Dict[str, Any]) -> str:
+        """Create an empty generation directory and return its name"""
+        name = f"gen-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        path = self.path(name)
+        path.mkdir(parents=True, exist_ok=False)
+        self.write_config(name, {**config, "name": name, "created_at": time.time()})
+        logger.info(f"Created index generation {name}")
+        return name
+
+    def write_config(self, name: Optional[str], config: Dict[str, Any]) -> None:
+        generation_file = self.path(name) / GENERATION_FILE
+        tmp_file = generation_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(config, indent=2))
+        os.replace(tmp_file, generation_file)
+
+    def activate(self, name: str) -> None:
+        """Point readers at a generation (atomic replace of the pointer file)"""
+        if not self.path(name).is_dir():
+            raise ValueError(f"Unknown index generation: {name}")
+        with self._lock:
+            tmp_file = self.pointer_file.with_suffix(".tmp")
+            tmp_file.write_text(name)
+            os.replace(tmp_file, self.pointer_file)
+        logger.info(f"Index generation {name} is now current")
+
+    def discard(self, name: str) -> None:
+        """Delete a generation that never became current (e.g. a failed rebuild)"""
+        if name == self.current():
+            raise ValueError(f"Refusing to delete the current index generation {name}")
+        self._remove(self.path(name))
+
+    def garbage_collect(self, keep: Optional[List[str]] = None) -> List[str]:
+        """Delete every generation except the current one and `keep`; returns what was removed"""
+        current = self.current()
+        keep_names = {current, *(keep or [])}
+        removed = []
+        generations_dir = self.root / GENERATIONS_DIR
+        if generations_dir.is_dir():
+            for path in generations_dir.iterdir():
+                if path.name not in keep_names and self._remove(path):
+                    removed.append(path.name)
+
+        # Once a generation is current, the index files in the root are the old generation
+        if current is not None and self.root.is_dir():
+            legacy = [path for path in self.root.iterdir() if path.name not in LAYOUT_FILES]
+            if legacy and all([self._remove(path) for path in legacy]):
+                removed.append("(root)")
+
+        if removed:
+            logger.info(f"Garbage-collected index generations: {', '.join(removed)}")
+        return removed
+
+    def _remove(self, path: Path) -> bool:
+        try:
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+            return True
+        except OSError as e:
+            # e.g. files still mapped or open on Windows; the next collection retries
+            logger.error(f"Error removing old index generation {path}: {str(e)}")
+            return False
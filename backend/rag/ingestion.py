@@ -0,0 +1,377 @@
+# File: backend/rag/ingestion.py
+import sys
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+from app.executors import InstrumentedExecutor
+from app.metrics import metrics
+from database.session import SessionLocal
+from database.models.lecture import Lecture
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+JOB_COLUMNS = [
+    "id", "lecture_id", "status", "total_chunks", "embedded_chunks", "attempts",
+    "error", "failures", "created_at", "started_at", "finished_at",
+    "chunking_seconds", "embedding_seconds", "kind", "deleted_chunks"
+]
+
+# Columns added after the table was first created: name -> definition
+ADDED_COLUMNS = {
+    "kind": "TEXT NOT NULL DEFAULT 'create'",
+    "deleted_chunks": "INTEGER NOT NULL DEFAULT 0"
+}
+
+
+class IngestionJobStore:
+    """SQLite table of ingestion jobs, so progress survives restarts"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, "
+            "lecture_id INTEGER NOT NULL, "
+            "status TEXT NOT NULL, "
+            "total_chunks INTEGER, "
+            "embedded_chunks INTEGER NOT NULL DEFAULT 0, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT, "
+            "failures TEXT NOT NULL DEFAULT '[]', "
+            "created_at REAL NOT NULL, "
+            "started_at REAL, "
+            "finished_at REAL, "
+            "chunking_seconds REAL NOT NULL DEFAULT 0, "
+            "embedding_seconds REAL NOT NULL DEFAULT 0)"
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in ADDED_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+        self._conn.commit()
+
+    def _row_to_job(self, row) -> Dict:
+        job = dict(zip(JOB_COLUMNS, row))
+        job["failures"] = json.loads(job["failures"])
+        return job
+
+    def create(self, lecture_id: int, kind: str = "create") -> Dict:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, lecture_id, status, created_at, kind) VALUES (?, ?, ?, ?, ?)",
+                (job_id, lecture_id, QUEUED, time.time(), kind)
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if "failures" in fields:
+            fields["failures"] = json.dumps(fields["failures"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+            self._conn.commit()
+
+    def unfinished(self) -> List[Dict]:
+        """Jobs that were queued or interrupted mid-run"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+
+def _load_lecture_content(lecture_id: int) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        lecture = db.query(Lecture).filter(Lecture.id == lecture_id).first()
+        return lecture.content if lecture else None
+    finally:
+        db.close()
+
+
+class IngestionQueue:
+    """Background queue that chunks, embeds and indexes lectures.
+
+    A fixed number of worker tasks drain the queue; chunks go through the
+    RAG processor's batched embedding pipeline, never the query retrieval
+    pool. Each run diffs the lecture's chunk ids against the index, so only
+    new or changed chunks are embedded and stale ones are deleted. The same
+    diff makes a retry (automatic, or after a restart) resume from the last
+    indexed chunk instead of starting over; progress is checkpointed after
+    every index flush.
+    """
+
+    def __init__(
+        self,
+        rag_processor,
+        store: IngestionJobStore,
+        workers: int,
+        max_attempts: int
+    ):
+        self.rag_processor = rag_processor
+        self.store = store
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.executor = InstrumentedExecutor("ingestion", self.workers)
+        self._queue = None
+        self._tasks = []
+        self._running = 0
+        # One run per lecture at a time, so an older run can't re-add chunks a newer one removed;
+        # lecture_id -> {"lock", "users"}, dropped once no run holds or waits for it
+        self._lecture_locks = {}
+
+    def start(self) -> None:
+        """Start the worker tasks and re-queue jobs left unfinished by a previous run"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.ensure_future(self._worker(index))
+            for index in range(self.workers)
+        ]
+        for job in self.store.unfinished():
+            logger.info(f"Resuming ingestion job {job['id']} at chunk {job['embedded_chunks']}")
+            self.store.update(job["id"], status=QUEUED)
+            self._queue.put_nowait(job["id"])
+        self._publish()
+
+    async def warmup(self) -> None:
+        self.start()
+
+    def _publish(self) -> None:
+        metrics.set_gauge("ingestion.queued", self._queue.qsize() if self._queue else 0)
+        metrics.set_gauge("ingestion.running", self._running)
+
+    async def submit(self, lecture_id: int, kind: str = "create") -> Dict:
+        """Queue a lecture for (re-)indexing and return its job"""
+        self.start()
+        job = self.store.create(lecture_id, kind)
+        self._queue.put_nowait(job["id"])
+        self._publish()
+        logger.info(f"Queued ingestion job {job['id']} for lecture {lecture_id}")
+        return job
+
+    async def retry(self, job_id: str) -> Optional[Dict]:
+        """Re-queue a failed job; it resumes from its last embedded chunk"""
+        job = self.store.get(job_id)
+        if job is None or job["status"] != FAILED:
+            return job
+        self.start()
+        self.store.update(job_id, status=QUEUED, error=None, attempts=0)
+        self._queue.put_nowait(job_id)
+        self._publish()
+        return self.store.get(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._running += 1
+            self._publish()
+            try:
+                job = self.store.get(job_id)
+                if job is not None:
+                    async with self._lecture_lock(job["lecture_id"]):
+                        await self._run(job_id)
+            except Exception as e:
+                # _run records its own failures; this only guards the worker loop
+                logger.error(f"Ingestion worker {index} error: {str(e)}")
+            finally:
+                self._running -= 1
+                self._publish()
+                self._queue.task_done()
+
+    @asynccontextmanager
+    async def _lecture_lock(self, lecture_id: int):
+        """Hold the lecture's lock; the lock is forgotten when its last user is done"""
+        entry = self._lecture_locks.get(lecture_id)
+        if entry is None:
+            entry = self._lecture_locks[lecture_id] = {"lock": asyncio.Lock(), "users": 0}
+        entry["users"] += 1
+        try:
+            async with entry["lock"]:
+                yield
+        finally:
+            entry["users"] -= 1
+            if entry["users"] == 0:
+                del self._lecture_locks[lecture_id]
+
+    async def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None or job["status"] not in (QUEUED, RUNNING):
+            return
+
+        attempt = job["attempts"] + 1
+        position = job["embedded_chunks"]
+        self.store.update(
+            job_id,
+            status=RUNNING,
+            attempts=attempt,
+            started_at=job["started_at"] or time.time()
+        )
+
+        try:
+            content = await self.executor.run(_load_lecture_content, job["lecture_id"])
+            if content is None:
+                # Nothing to retry: the lecture row is gone
+                self.store.update(job_id, status=FAILED, error="Lecture not found", finished_at=time.time())
+                return
+
+            started = time.perf_counter()
+            chunks, metadatas, ids = await self.executor.run(
+                self.rag_processor.split_lecture,
+                job["lecture_id"],
+                content
+            )
+            # Only chunks missing from the index are embedded: this is what makes
+            # retries resume and lecture edits cost a handful of embeddings
+            pending, stale = await self.executor.run(
+                self.rag_processor.diff_lecture,
+                job["lecture_id"],
+                ids
+            )
+            position = len(chunks) - len(pending)
+            self.store.update(
+                job_id,
+                total_chunks=len(chunks),
+                embedded_chunks=position,
+                chunking_seconds=round(time.perf_counter() - started, 3)
+            )
+
+            previous_seconds = job["embedding_seconds"]
+            started = time.perf_counter()
+            reused = position
+
+            def checkpoint(flushed: int) -> None:
+                nonlocal position
+                metrics.incr("ingestion.chunks", reused + flushed - position)
+                position = reused + flushed
+                self.store.update(
+                    job_id,
+                    embedded_chunks=position,
+                    embedding_seconds=round(previous_seconds + time.perf_counter() - started, 3)
+                )
+
+            if pending:
+                await self.rag_processor.ingest_chunks(
+                    [chunks[i] for i in pending],
+                    [metadatas[i] for i in pending],
+                    ids=[ids[i] for i in pending],
+                    on_flush=checkpoint
+                )
+            # Stale chunks go last so the lecture is never missing from search
+            deleted = 0
+            if stale:
+                deleted = await self.executor.run(self.rag_processor.vector_store.delete, stale)
+
+            self.store.update(
+                job_id,
+                status=COMPLETED,
+                error=None,
+                deleted_chunks=job["deleted_chunks"] + deleted,
+                finished_at=time.time()
+            )
+            metrics.incr("ingestion.completed")
+            logger.info(
+                f"Ingestion job {job_id} completed: lecture {job['lecture_id']}, "
+                f"{len(chunks)} chunks, {len(pending)} embedded, {deleted} removed"
+            )
+
+        except asyncio.CancelledError:
+            # Shutdown mid-run: left as running so the next start resumes it
+            raise
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed at chunk {position}: {str(e)}")
+            failures = job["failures"] + [{
+                "attempt": attempt,
+                "chunk": position,
+                "error": str(e),
+                "at": time.time()
+            }]
+            if attempt < self.max_attempts:
+                delay = 2 ** attempt
+                self.store.update(job_id, status=QUEUED, error=str(e), failures=failures)
+                asyncio.get_event_loop().call_later(delay, self._queue.put_nowait, job_id)
+                logger.info(f"Retrying ingestion job {job_id} in {delay}s")
+            else:
+                self.store.update(
+                    job_id,
+                    status=FAILED,
+                    error=str(e),
+                    failures=failures,
+                    finished_at=time.time()
+                )
+                metrics.incr("ingestion.failed")
+
+    def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self.executor.shutdown()
+
+
+def job_summary(job: Dict) -> Dict:
+    """Shape a job record for API responses"""
+    total = job["total_chunks"]
+    finished = job["finished_at"] or time.time()
+    return {
+        "id": job["id"],
+        "lecture_id": job["lecture_id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "total_chunks": total,
+        "embedded_chunks": job["embedded_chunks"],
+        "deleted_chunks": job["deleted_chunks"],
+        "progress": job["embedded_chunks"] / total if total else 0.0,
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "failures": job["failures"],
+        "timings": {
+            "queued_seconds": round((job["started_at"] or finished) - job["created_at"], 3),
+            "chunking_seconds": job["chunking_seconds"],
+            "embedding_seconds": job["embedding_seconds"],
+            "chunks_per_second": round(
+                job["embedded_chunks"] / job["embedding_seconds"], 1
+            ) if job["embedding_seconds"] else 0.0,
+            "total_seconds": round(finished - job["created_at"], 3)
+        },
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"]
+    }
@@ -0,0 +1,221 @@
+# File: backend/rag/lexical_index.py
+import sys
+import heapq
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+    typing.Tuple = Tuple
+    typing.Iterable = Iterable
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_FILE = "lexical.sqlite3"
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Query terms skipped when scoring: function words, and terms found in more
+# than MAX_DF_RATIO of the chunks. Their BM25 weight is close to zero while
+# their postings are the longest, so they dominate the cost of a query.
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i in is it its "
+    "of on or that the their there these this to was were what when where which "
+    "who why will with you".split()
+)
+MAX_DF_RATIO = 0.5
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; keeps names, numbers and years ("Dijkstra", "1989") intact"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk text, kept next to the vector store.
+
+    Term postings (term -> chunk -> term frequency) and chunk lengths are
+    persisted in SQLite as chunks are indexed and loaded into memory on
+    open, so a lexical query is a few dictionary lookups with no embedding
+    call. Chunk text and metadata are stored too, so lexical results can be
+    served on their own when the embedding backend is unavailable.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "id TEXT PRIMARY KEY, "
+                "content TEXT NOT NULL, "
+                "metadata TEXT NOT NULL, "
+                "length INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "term TEXT NOT NULL, "
+                "chunk_id TEXT NOT NULL, "
+                "tf INTEGER NOT NULL, "
+                "PRIMARY KEY (term, chunk_id)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id)")
+            self._conn.commit()
+            self._load()
+        except Exception as e:
+            logger.error(f"Error opening lexical index: {str(e)}")
+            raise
+
+    def _load(self) -> None:
+        # Changes only when another connection commits (see refresh())
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._postings = defaultdict(dict)
+        self._chunks = {}
+        self._total_length = 0
+        for chunk_id, content, metadata, length in self._conn.execute(
+            "SELECT id, content, metadata, length FROM chunks"
+        ):
+            self._chunks[chunk_id] = (content, json.loads(metadata), length)
+            self._total_length += length
+        for term, chunk_id, tf in self._conn.execute("SELECT term, chunk_id, tf FROM postings"):
+            self._postings[term][chunk_id] = tf
+
+    def refresh(self) -> bool:
+        """Reload from SQLite if another connection (e.g. another process) changed the index"""
+        with self._lock:
+            if self._conn.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+                return False
+            self._load()
+        logger.info(f"Lexical index reloaded: {len(self._chunks)} chunks")
+        return True
+
+    def count(self) -> int:
+        return len(self._chunks)
+
+    def ids(self) -> set:
+        with self._lock:
+            return set(self._chunks)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict]] = None) -> None:
+        """Index chunks; a chunk already indexed under the same id is replaced"""
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            self._remove(ids)
+            chunk_rows, posting_rows = [], []
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                terms = Counter(tokenize(text))
+                length = sum(terms.values())
+                self._chunks[chunk_id] = (text, metadata, length)
+                self._total_length += length
+                for term, tf in terms.items():
+                    self._postings[term][chunk_id] = tf
+                    posting_rows.append((term, chunk_id, tf))
+                chunk_rows.append((chunk_id, text, json.dumps(metadata), length))
+            self._conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", chunk_rows)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", posting_rows)
+            self._conn.commit()
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            self._remove(ids)
+            self._conn.commit()
+
+    def _remove(self, ids: List[str]) -> None:
+        """Drop chunks from memory and SQLite (caller holds the lock and commits)"""
+        known = [chunk_id for chunk_id in ids if chunk_id in self._chunks]
+        for chunk_id in known:
+            content, _, length = self._chunks.pop(chunk_id)
+            self._total_length -= length
+            for term in set(tokenize(content)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[term]
+        if known:
+            rows = [(chunk_id,) for chunk_id in known]
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", rows)
+            self._conn.executemany("DELETE FROM postings WHERE chunk_id = ?", rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM postings")
+            self._conn.commit()
+            self._load()
+
+    def sync(self, chunks: Iterable[Tuple[str, str, Dict]]) -> None:
+        """Make the index hold exactly the given (id, text, metadata) chunks"""
+        chunks = list(chunks)
+        wanted = {chunk_id for chunk_id, _, _ in chunks}
+        existing = self.ids()
+        stale = [chunk_id for chunk_id in existing if chunk_id not in wanted]
+        missing = [chunk for chunk in chunks if chunk[0] not in existing]
+        if stale:
+            self.delete(stale)
+        if missing:
+            self.add(
+                [chunk_id for chunk_id, _, _ in missing],
+                [text for _, text, _ in missing],
+                [metadata for _, _, metadata in missing]
+            )
+        logger.info(f"Lexical index synced: {len(missing)} chunks added, {len(stale)} removed")
+
+    def _query_terms(self, query: str) -> List[str]:
+        """Distinct query terms worth scoring (all of them if none would be left)"""
+        terms = set(tokenize(query))
+        kept = [term for term in terms if term not in STOPWORDS]
+        total = len(self._chunks)
+        selective = [term for term in kept if len(self._postings.get(term, ())) <= MAX_DF_RATIO * total]
+        return selective or kept or list(terms)
+
+    def search(self, query: str, k: int = 3) -> List[Dict]:
+        """Return the k chunks with the highest BM25 score for the query"""
+        # Copy what the query needs under the lock; score without it
+        with self._lock:
+            chunks = self._chunks
+            total = len(chunks)
+            terms = self._query_terms(query)
+            if not total or not terms:
+                return []
+            average_length = self._total_length / total
+            postings_by_term = [
+                dict(self._postings[term]) for term in terms if self._postings.get(term)
+            ]
+
+        scores = defaultdict(float)
+        for postings in postings_by_term:
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                chunk = chunks.get(chunk_id)
+                if chunk is None:
+                    # Deleted since the snapshot
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * chunk[2] / average_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        results = []
+        for chunk_id, score in top:
+            chunk = chunks.get(chunk_id)
+            if chunk is not None:
+                results.append({
+                    "content": chunk[0],
+                    "metadata": chunk[1],
+                    "score": round(score, 4)
+                })
+        return results
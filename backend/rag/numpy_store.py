@@ -0,0 +1,392 @@
+# File: backend/rag/numpy_store.py
+import sys
+import json
+import logging
+import os
+import random
+import threading
+from pathlib import Path
+from typing import List, Dict, Optional, Any
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from rag.corpus import corpus_version
+from rag.lexical_index import LexicalIndex, LEXICAL_INDEX_FILE
+from rag.embedding_providers import check_query_provider
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+METADATA_FILE = "metadata.jsonl"
+HEADER_FILE = "header.json"
+# Row numbers of deleted chunks, appended on delete and folded into the sidecar by compact()
+DELETED_FILE = "deleted.rows"
+MIN_CAPACITY = 1024
+
+
+class NumpyVectorStore:
+    """Brute-force vector index backed by a single memory-mapped float32 matrix.
+
+    Rows are L2-normalized on insert so a query is one matrix-vector product
+    followed by an argpartition top-k. Chunk text and metadata live in a
+    JSON-lines sidecar that is loaded into memory on startup. Deleted chunks
+    are tombstoned (masked out of searches) rather than compacted, so rows
+    never move and the mapped file is never replaced under readers. A
+    delete only appends the row numbers to a small tombstone file;
+    compact() (scripts/compact_numpy_index.py) folds them into the sidecar.
+    """
+
+    def __init__(self, embeddings: Embeddings, persist_directory: str, embedding_provider: Optional[str] = None):
+        """Open (or create) the index stored in persist_directory"""
+        try:
+            self.embeddings = embeddings
+            self.embedding_provider = embedding_provider
+            self.path = Path(persist_directory)
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._lock = threading.Lock()
+            self._version = corpus_version.current()
+            self._load()
+            # BM25 postings for the same chunks; built from the vectors' sidecar if missing
+            self.lexical = LexicalIndex(str(self.path / LEXICAL_INDEX_FILE))
+            if self.lexical.count() != self.count():
+                self.lexical.sync(
+                    (record["id"], record["content"], record["metadata"])
+                    for record in self._records
+                    if not record.get("deleted")
+                )
+            logger.info(f"NumPy vector store initialized with {self._count} vectors")
+        except Exception as e:
+            logger.error(f"Error initializing NumPy vector store: {str(e)}")
+            raise
+
+    def _load(self) -> None:
+        """Load header, metadata sidecar and map the vector file"""
+        header_file = self.path / HEADER_FILE
+        header = {}
+        self._header_mtime = None
+        if header_file.exists():
+            self._header_mtime = os.stat(header_file).st_mtime_ns
+            header = json.loads(header_file.read_text())
+
+        self._dim = header.get("dim")
+        self._count = header.get("count", 0)
+        self._capacity = header.get("capacity", 0)
+        self._matrix = None
+        self._records = []
+
+        metadata_file = self.path / METADATA_FILE
+        if metadata_file.exists():
+            with metadata_file.open("r", encoding="utf-8") as f:
+                for line in f:
+                    if len(self._records) >= self._count:
+                        break
+                    self._records.append(json.loads(line))
+
+        # Rows written without an id get one from their (never changing) row number
+        for row, record in enumerate(self._records):
+            record.setdefault("id", f"legacy_{row}")
+        for row in self._read_tombstones():
+            if row < len(self._records):
+                self._records[row]["deleted"] = True
+        self._deleted = np.array(
+            [record.get("deleted", False) for record in self._records],
+            dtype=bool
+        )
+        self._deleted_count = int(self._deleted.sum())
+        self._rows = {
+            record["id"]: row
+            for row, record in enumerate(self._records)
+            if not record.get("deleted")
+        }
+
+        if self._dim and self._capacity:
+            self._matrix = np.memmap(
+                self.path / VECTORS_FILE,
+                dtype=np.float32,
+                mode="r+",
+                shape=(self._capacity, self._dim)
+            )
+
+    def _read_tombstones(self) -> List[int]:
+        """Rows deleted since the sidecar was last compacted"""
+        deleted_file = self.path / DELETED_FILE
+        if not deleted_file.exists():
+            return []
+        rows = []
+        with deleted_file.open("r", encoding="utf-8") as f:
+            for line in f:
+                # A line torn by a crash mid-append is ignored; that delete is lost
+                if line.strip().isdigit():
+                    rows.append(int(line))
+        return rows
+
+    def _write_header(self) -> None:
+        """Atomically write the header so readers never see a partial count.
+
+        Every write rewrites it, so other processes can tell from its mtime
+        whether the files they loaded are stale.
+        """
+        header_file = self.path / HEADER_FILE
+        tmp_file = header_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps({
+            "dim": self._dim,
+            "count": self._count,
+            "capacity": self._capacity
+        }))
+        os.replace(tmp_file, header_file)
+        self._header_mtime = os.stat(header_file).st_mtime_ns
+
+    def _ensure_capacity(self, needed: int) -> None:
+        """Grow the memory-mapped file so it can hold `needed` rows"""
+        if needed <= self._capacity:
+            return
+
+        new_capacity = max(needed, self._capacity * 2, MIN_CAPACITY)
+        vectors_file = self.path / VECTORS_FILE
+        if self._matrix is not None:
+            self._matrix.flush()
+        with vectors_file.open("ab") as f:
+            f.truncate(new_capacity * self._dim * 4)
+        # Swap in the larger mapping; searches still holding the old one keep
+        # a valid view of the rows they know about until they drop it
+        self._matrix = np.memmap(
+            vectors_file,
+            dtype=np.float32,
+            mode="r+",
+            shape=(new_capacity, self._dim)
+        )
+        self._capacity = new_capacity
+
+    def count(self) -> int:
+        """Number of stored (not deleted) chunks"""
+        self._check_corpus()
+        return self._count - self._deleted_count
+
+    def _check_corpus(self) -> None:
+        """Reload the index if the corpus changed outside this object (another worker or an offline ingest)"""
+        version = corpus_version.current()
+        if version == self._version:
+            return
+        self._version = version
+        header_file = self.path / HEADER_FILE
+        header_mtime = os.stat(header_file).st_mtime_ns if header_file.exists() else None
+        if header_mtime != self._header_mtime:
+            with self._lock:
+                self._load()
+            logger.info(f"NumPy vector store reloaded with {self._count} vectors")
+        self.lexical.refresh()
+
+    def ids_for_lecture(self, lecture_id: int) -> set:
+        """Ids of the live chunks indexed for a lecture"""
+        return {
+            chunk_id for chunk_id, row in list(self._rows.items())
+            if self._records[row]["metadata"].get("lecture_id") == lecture_id
+        }
+
+    def sample_texts(self, k: int) -> List[str]:
+        """Text of up to k randomly chosen live chunks"""
+        rows = list(self._rows.values())
+        return [self._records[row]["content"] for row in random.sample(rows, min(k, len(rows)))]
+
+    def add_texts(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict]] = None
+    ) -> None:
+        """Embed texts and add them to the index"""
+        try:
+            vectors = self.embeddings.embed_documents(texts)
+            self.add_embeddings(texts, vectors, metadatas)
+        except Exception as e:
+            logger.error(f"Error adding texts to vector store: {str(e)}")
+            raise
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: Any,
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None
+    ) -> None:
+        """Add texts with precomputed embeddings to the index.
+
+        Chunks whose id is already indexed are skipped, so re-adding a batch
+        (e.g. a retried ingest) does not create duplicates.
+        """
+        metadatas = metadatas or [{} for _ in texts]
+        if ids is not None:
+            keep = [i for i, chunk_id in enumerate(ids) if chunk_id not in self._rows]
+            texts = [texts[i] for i in keep]
+            embeddings = [embeddings[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            ids = [ids[i] for i in keep]
+        if not texts:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match index dimension {self._dim}"
+                )
+
+            start = self._count
+            self._ensure_capacity(start + len(texts))
+            self._matrix[start:start + len(texts)] = vectors
+            self._matrix.flush()
+
+            ids = ids or [f"legacy_{start + i}" for i in range(len(texts))]
+            records = [
+                {"id": chunk_id, "content": text, "metadata": metadata}
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            with (self.path / METADATA_FILE).open("a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+
+            # Extend the tombstone mask before publishing the new count to readers
+            self._deleted = np.concatenate([self._deleted, np.zeros(len(records), dtype=bool)])
+            self._records.extend(records)
+            for row, chunk_id in enumerate(ids, start):
+                self._rows[chunk_id] = row
+            self._count = start + len(texts)
+            self._write_header()
+        self.lexical.add(ids, texts, metadatas)
+        self._version = corpus_version.bump()
+
+        logger.info(f"Added {len(texts)} texts to vector store")
+
+    def delete(self, ids: List[str]) -> int:
+        """Tombstone chunks by id; returns how many were deleted"""
+        try:
+            with self._lock:
+                rows = [self._rows.pop(chunk_id) for chunk_id in ids if chunk_id in self._rows]
+                if not rows:
+                    return 0
+                for row in rows:
+                    self._records[row]["deleted"] = True
+                    self._matrix[row] = 0
+                self._matrix.flush()
+                self._deleted[rows] = True
+                self._deleted_count += len(rows)
+
+                # Append-only: the cost of a delete doesn't grow with the corpus
+                with (self.path / DELETED_FILE).open("a", encoding="utf-8") as f:
+                    for row in rows:
+                        f.write(f"{row}\n")
+                self._write_header()
+            self.lexical.delete(ids)
+            self._version = corpus_version.bump()
+            logger.info(f"Deleted {len(rows)} chunks from vector store")
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error deleting from vector store: {str(e)}")
+            raise
+
+    def compact(self) -> int:
+        """Fold the tombstone file into the sidecar; returns how many tombstones it held.
+
+        Rewrites the whole sidecar, so it is meant for maintenance windows
+        rather than the request path. Rows keep their numbers.
+        """
+        try:
+            with self._lock:
+                tombstones = self._read_tombstones()
+                if not tombstones:
+                    return 0
+                # Start from what is on disk, including other processes' writes
+                self._load()
+                metadata_file = self.path / METADATA_FILE
+                tmp_file = metadata_file.with_suffix(".tmp")
+                with tmp_file.open("w", encoding="utf-8") as f:
+                    for record in self._records:
+                        f.write(json.dumps(record) + "\n")
+                os.replace(tmp_file, metadata_file)
+                # Replaying tombstones is idempotent, so a crash before this line is harmless
+                (self.path / DELETED_FILE).unlink()
+                self._write_header()
+            logger.info(f"Compacted {len(tombstones)} tombstones into the vector store sidecar")
+            return len(tombstones)
+        except Exception as e:
+            logger.error(f"Error compacting vector store: {str(e)}")
+            raise
+
+    def search_by_vector(self, embedding: Any, k: int = 3) -> List[Dict]:
+        """Return the k chunks with the highest cosine similarity to embedding"""
+        check_query_provider(embedding, self.embedding_provider)
+        self._check_corpus()
+        # A consistent snapshot; the product itself runs without the lock
+        with self._lock:
+            count = self._count
+            deleted_count = self._deleted_count
+            matrix = self._matrix
+            deleted = self._deleted
+            records = self._records
+        if count - deleted_count <= 0 or matrix is None:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = matrix[:count] @ query
+        if deleted_count:
+            scores = np.where(deleted[:count], -np.inf, scores)
+
+        k = min(k, count - deleted_count)
+        if k < count:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(count)
+        top = top[np.argsort(scores[top])[::-1]]
+
+        return [
+            {
+                "content": records[i]["content"],
+                "metadata": records[i]["metadata"]
+            }
+            for i in top
+        ]
+
+    def search(self, query: str, k: int = 3) -> List[Dict]:
+        """Embed the query and search the index"""
+        try:
+            return self.search_by_vector(self.embeddings.embed_query(query), k=k)
+        except Exception as e:
+            logger.error(f"Error in similarity search: {str(e)}")
+            raise
+
+    async def similarity_search(
+        self,
+        query: str,
+        k: int = 3
+    ) -> List[Dict]:
+        """Search for similar texts"""
+        return self.search(query, k=k)
+
+    def clear(self) -> None:
+        """Clear vector store"""
+        try:
+            with self._lock:
+                # Searches holding the old mapping finish on it; it is unmapped once they drop it
+                self._matrix = None
+                for name in (VECTORS_FILE, METADATA_FILE, HEADER_FILE, DELETED_FILE):
+                    file = self.path / name
+                    if file.exists():
+                        file.unlink()
+                self._load()
+            self.lexical.clear()
+            self._version = corpus_version.bump()
+            logger.info("Vector store cleared successfully")
+        except Exception as e:
+            logger.error(f"Error clearing vector store: {str(e)}")
+            raise
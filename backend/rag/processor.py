@@ -1,12 +1,23 @@
 # File: backend/rag/processor.py
 import logging
 import sys
-from typing import Dict, Any, List
-from langchain.embeddings import OpenAIEmbeddings
+from typing import Dict, Any, List, Optional, Tuple
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import Chroma
 from app.config import settings
+from app.executors import InstrumentedExecutor
+from app.metrics import metrics
+from rag.embeddings import get_embeddings
+from rag.vector_store import create_vector_store
+from rag.embedding_pipeline import EmbeddingPipeline
+from rag.generations import IndexGenerations, index_root
+from rag.fusion import reciprocal_rank_fusion
+from rag.embedding_providers import EmbeddingMismatch, QueryEmbedding, provider_id
+from collections import Counter
+import asyncio
+import hashlib
 import os
+import threading
+import time
 
 # Fix for Python 3.8 compatibility with type annotations
 if sys.version_info < (3, 9):
@@ -14,31 +25,61 @@ if sys.version_info < (3, 9):
     typing.Dict = Dict
     typing.Any = Any
     typing.List = List
+    typing.Optional = Optional
+    typing.Tuple = Tuple
 
 logger = logging.getLogger(__name__)
 
+def create_text_splitter(
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None
+) -> RecursiveCharacterTextSplitter:
+    """The lecture chunking configuration (shared with the bulk loader's worker processes)"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size or settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+        length_function=len,
+    )
+
+def chunk_records(lecture_id: int, chunks: List[str]) -> Tuple[List[Dict], List[str]]:
+    """Metadata and stable ids for a lecture's chunks.
+
+    Ids hash the lecture id and chunk text (plus an occurrence number for
+    repeated text), so the same content always maps to the same ids.
+    """
+    metadatas = [{
+        "lecture_id": lecture_id,
+        "chunk_id": i,
+        "source": f"lecture_{lecture_id}"
+    } for i in range(len(chunks))]
+
+    seen = Counter()
+    ids = []
+    for chunk in chunks:
+        digest = hashlib.sha256(f"{lecture_id}\0{chunk}\0{seen[chunk]}".encode("utf-8")).hexdigest()
+        seen[chunk] += 1
+        ids.append(f"lecture_{lecture_id}_{digest[:32]}")
+    return metadatas, ids
+
+class EmbeddingUnavailable(Exception):
+    """Raised instead of calling an embedding backend that recently failed or timed out"""
+
 class RAGProcessor:
     def __init__(self):
         logger.info("Initializing RAG Processor...")
         try:
-            self.embeddings = OpenAIEmbeddings(
-                openai_api_key=settings.OPENAI_API_KEY
-            )
+            # Dedicated pool so query embedding and search never block the event loop
+            self.executor = InstrumentedExecutor("retrieval", settings.RETRIEVAL_WORKERS)
             
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-            )
-            
-            # Make sure the vector store directory exists
-            os.makedirs(settings.VECTOR_STORE_PATH, exist_ok=True)
-            
-            # Initialize vector store
-            self.vector_store = Chroma(
-                persist_directory=settings.VECTOR_STORE_PATH,
-                embedding_function=self.embeddings
-            )
+            # The index is versioned in generations; readers follow the CURRENT pointer
+            self.generations = IndexGenerations(index_root())
+            self.generation = None
+            self.index_config = None
+            self.vector_store = None
+            self.embedding_pipeline = None
+            self._swap_lock = threading.Lock()
+            self._embedding_retry_at = 0.0
+            self.refresh_generation()
             
             logger.info("RAG Processor initialized successfully")
             
@@ -46,58 +87,284 @@ class RAGProcessor:
             logger.error(f"Error initializing RAG Processor: {str(e)}")
             raise
 
+    def open_generation(self, name: Optional[str]) -> Tuple[Dict[str, Any], Any, RecursiveCharacterTextSplitter, Any]:
+        """Build the config, embeddings, chunker and vector store of an index generation"""
+        config = self.generations.config(name)
+        
+        provider = settings.EMBEDDING_PROVIDER.lower()
+        if config["embedding_provider"] != provider:
+            # Queries must be embedded in the index's vector space: switch with a rebuild
+            logger.warning(
+                f"Index generation {name or '(root)'} was built with {config['embedding_provider']}; "
+                f"EMBEDDING_PROVIDER={provider} applies once the index is rebuilt with it"
+            )
+        embeddings = get_embeddings(config["embedding_model"], config["embedding_provider"])
+        text_splitter = create_text_splitter(config["chunk_size"], config["chunk_overlap"])
+        
+        # Make sure the index directory exists
+        path = self.generations.path(name)
+        os.makedirs(path, exist_ok=True)
+        if not self.generations.has_config(name):
+            # Record what builds this index, so queries from other providers can be refused
+            self.generations.write_config(name, config)
+        
+        # Initialize vector store (backend selected by settings.VECTOR_STORE_BACKEND)
+        vector_store = create_vector_store(
+            embeddings,
+            persist_directory=str(path),
+            embedding_provider=provider_id(config["embedding_provider"], config["embedding_model"])
+        )
+        return config, embeddings, text_splitter, vector_store
+
+    def refresh_generation(self) -> bool:
+        """Switch to the current index generation if the pointer moved (blocking).
+
+        Returns True if the processor switched. In-flight searches finish on
+        the objects they already hold; the old generation's files are removed
+        only later by garbage collection.
+        """
+        name = self.generations.current()
+        if self.vector_store is not None and name == self.generation:
+            return False
+        with self._swap_lock:
+            if self.vector_store is not None and name == self.generation:
+                return False
+            config, embeddings, text_splitter, vector_store = self.open_generation(name)
+            
+            # Ingest path: batched concurrent embedding with buffered index writes
+            if self.embedding_pipeline is None:
+                embedding_pipeline = EmbeddingPipeline(
+                    embeddings,
+                    vector_store,
+                    batch_size=settings.EMBEDDING_BATCH_SIZE,
+                    concurrency=settings.EMBEDDING_CONCURRENCY,
+                    max_retries=settings.EMBEDDING_MAX_RETRIES,
+                    flush_chunks=settings.INDEX_FLUSH_CHUNKS,
+                    flush_interval=settings.INDEX_FLUSH_INTERVAL_SECONDS
+                )
+            else:
+                embedding_pipeline = self.embedding_pipeline.retarget(embeddings, vector_store)
+            
+            # Plain attribute assignments: each reader sees the old or the new index
+            self.embeddings = embeddings
+            self.text_splitter = text_splitter
+            self.vector_store = vector_store
+            self.embedding_pipeline = embedding_pipeline
+            self.index_config = config
+            self.generation = name
+            
+            if hasattr(embeddings, "stats"):
+                metrics.register_source("embedding_cache", embeddings.stats)
+            logger.info(
+                f"Using index generation {name or '(root)'}: {vector_store.embedding_provider}, "
+                f"chunks {config['chunk_size']}/{config['chunk_overlap']}, {vector_store.count()} vectors"
+            )
+        return True
+
+    def split_lecture(self, lecture_id: int, content: str) -> Tuple[List[str], List[Dict], List[str]]:
+        """Split lecture content into chunks, their metadata and stable chunk ids"""
+        self.refresh_generation()
+        chunks = self.text_splitter.split_text(content)
+        metadatas, ids = chunk_records(lecture_id, chunks)
+        return chunks, metadatas, ids
+
+    def diff_lecture(
+        self,
+        lecture_id: int,
+        ids: List[str],
+        vector_store: Any = None
+    ) -> Tuple[List[int], List[str]]:
+        """Compare a lecture's chunk ids with what is indexed for it (blocking).
+
+        Returns the positions of chunks missing from the index (new or
+        changed text) and the ids of indexed chunks the lecture no longer has.
+        vector_store defaults to the current generation's store.
+        """
+        indexed = (vector_store or self.vector_store).ids_for_lecture(lecture_id)
+        current = set(ids)
+        pending = [i for i, chunk_id in enumerate(ids) if chunk_id not in indexed]
+        stale = [chunk_id for chunk_id in indexed if chunk_id not in current]
+        return pending, stale
+
+    async def ingest_chunks(
+        self,
+        chunks: List[str],
+        metadatas: List[Dict],
+        ids: Optional[List[str]] = None,
+        start: int = 0,
+        on_flush=None
+    ) -> Dict[str, Any]:
+        """Embed and index chunks[start:] through the batched embedding pipeline"""
+        return await self.embedding_pipeline.run(
+            chunks,
+            metadatas,
+            ids=ids,
+            start=start,
+            on_flush=on_flush
+        )
+
+    def shutdown(self) -> None:
+        self.executor.shutdown()
+        self.embedding_pipeline.shutdown()
+
     def process_lecture(self, lecture_id: int, content: str) -> None:
-        """Process lecture content and store in vector store"""
+        """Process lecture content and store in vector store (incrementally if already indexed)"""
         try:
             # Split text into chunks
-            chunks = self.text_splitter.split_text(content)
+            chunks, metadatas, ids = self.split_lecture(lecture_id, content)
+            pending, stale = self.diff_lecture(lecture_id, ids)
             
-            # Prepare documents
-            metadatas = [{
-                "lecture_id": lecture_id,
-                "chunk_id": i,
-                "source": f"lecture_{lecture_id}"
-            } for i in range(len(chunks))]
+            # Embed only new or changed chunks (the store persists its own changes)
+            vector_store = self.vector_store
+            if pending:
+                texts = [chunks[i] for i in pending]
+                vector_store.add_embeddings(
+                    texts,
+                    vector_store.embeddings.embed_documents(texts),
+                    [metadatas[i] for i in pending],
+                    [ids[i] for i in pending]
+                )
+            if stale:
+                vector_store.delete(stale)
             
-            # Add to vector store
-            self.vector_store.add_texts(
-                texts=chunks,
-                metadatas=metadatas
+            logger.info(
+                f"Successfully processed lecture {lecture_id}: {len(chunks)} chunks, "
+                f"{len(pending)} embedded, {len(stale)} removed"
             )
             
-            # Persist changes
-            self.vector_store.persist()
-            
-            logger.info(f"Successfully processed lecture {lecture_id} with {len(chunks)} chunks")
-            
         except Exception as e:
             logger.error(f"Error processing lecture: {str(e)}")
             raise
 
-    async def find_relevant_context(self, question: str, num_chunks: int = 3):
-        """Find relevant context for a question"""
+    async def warmup(self) -> None:
+        """Open the embedding client (or load the local model) and page the vector index into memory"""
+        vector_store = self.vector_store
+        try:
+            # No query timeout here: a local model may take a while to load
+            embedding = await self.executor.run(vector_store.embeddings.embed_query, "warmup")
+        except Exception:
+            if settings.RETRIEVAL_MODE.lower() == "dense":
+                raise
+            # Questions can still be answered from the BM25 index
+            logger.warning("Embedding backend unavailable at startup, serving lexical retrieval")
+            return
+        if vector_store.count() > 0:
+            await self.executor.run(vector_store.search_by_vector, embedding, k=1)
+
+    async def _follow_generation(self) -> None:
+        """Switch to a rebuilt index (a stat of the pointer file unless it changed)"""
+        if self.generations.current() != self.generation:
+            await self.executor.run(self.refresh_generation)
+
+    async def embed_query(self, question: str) -> List[float]:
+        """Embed a question in the retrieval pool (served from the embedding cache when possible).
+
+        In hybrid and lexical modes a failed or timed-out call puts the
+        embedding backend on a cooldown, during which this raises
+        EmbeddingUnavailable at once and retrieval stays lexical-only.
+        """
+        await self._follow_generation()
+        if time.monotonic() < self._embedding_retry_at:
+            raise EmbeddingUnavailable("Embedding backend is cooling down after a failure")
+        # The store carries the embeddings that built it, so vector and tag always agree
+        vector_store = self.vector_store
+        try:
+            vector = await asyncio.wait_for(
+                self.executor.run(vector_store.embeddings.embed_query, question),
+                timeout=settings.RETRIEVAL_EMBED_TIMEOUT_SECONDS
+            )
+            return QueryEmbedding(vector, vector_store.embedding_provider)
+        except Exception as e:
+            metrics.incr("retrieval.embedding_failures")
+            if settings.RETRIEVAL_MODE.lower() != "dense":
+                self._embedding_retry_at = time.monotonic() + settings.RETRIEVAL_DENSE_COOLDOWN_SECONDS
+                logger.warning(
+                    f"Query embedding failed ({type(e).__name__}: {str(e)}); lexical-only retrieval "
+                    f"for {settings.RETRIEVAL_DENSE_COOLDOWN_SECONDS:.0f}s"
+                )
+            raise
+
+    async def _dense_search(
+        self,
+        vector_store: Any,
+        question: str,
+        k: int,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict]:
+        """Vector similarity search in the retrieval pool"""
+        if query_embedding is not None:
+            try:
+                return await self.executor.run(vector_store.search_by_vector, query_embedding, k=k)
+            except EmbeddingMismatch as e:
+                # Embedded for the previous generation just before a switch
+                metrics.incr("retrieval.embedding_mismatch")
+                logger.warning(f"{str(e)}; re-embedding question")
+        return await self.executor.run(vector_store.search, question, k=k)
+
+    async def _hybrid_dense_search(
+        self,
+        vector_store,
+        question: str,
+        k: int,
+        query_embedding: Optional[List[float]] = None
+    ) -> Optional[List[Dict]]:
+        """Dense half of hybrid retrieval; None if the question cannot be embedded or searched"""
+        try:
+            if query_embedding is None:
+                query_embedding = await self.embed_query(question)
+            return await self._dense_search(vector_store, question, k, query_embedding)
+        except Exception as e:
+            metrics.incr("retrieval.lexical_fallback")
+            logger.warning(f"Dense retrieval unavailable ({type(e).__name__}), using BM25 only")
+            return None
+
+    async def find_relevant_context(
+        self,
+        question: str,
+        num_chunks: int = 3,
+        query_embedding: Optional[List[float]] = None
+    ):
+        """Find relevant context for a question, reusing query_embedding if it was already computed.
+
+        In hybrid mode (the default) the BM25 and vector rankings are merged
+        with reciprocal rank fusion. If the question cannot be embedded (the
+        backend is slow, down or cooling down) the BM25 ranking is used alone.
+        """
         try:
-            # Check if there's any data in the vector store
-            collection = self.vector_store._collection
-            if collection.count() == 0:
+            await self._follow_generation()
+            vector_store = self.vector_store
+            
+            # Check if there's any data in the vector store (cached count, no I/O)
+            if vector_store.count() == 0:
                 logger.warning("Vector store is empty - no lectures loaded")
                 return []
-                
-            # Perform similarity search
-            results = self.vector_store.similarity_search(
-                question,
-                k=num_chunks
-            )
             
-            # Format results
-            context_docs = [{
-                "content": doc.page_content,
-                "metadata": doc.metadata
-            } for doc in results]
+            mode = settings.RETRIEVAL_MODE.lower()
+            if mode == "dense":
+                context_docs = await self._dense_search(vector_store, question, num_chunks, query_embedding)
+            else:
+                candidates = max(num_chunks, settings.RETRIEVAL_CANDIDATES)
+                lexical_search = self.executor.run(vector_store.lexical.search, question, candidates)
+                if mode == "lexical":
+                    lexical_docs, dense_docs = await lexical_search, None
+                else:
+                    # BM25 runs while the question is embedded and searched
+                    lexical_docs, dense_docs = await asyncio.gather(
+                        lexical_search,
+                        self._hybrid_dense_search(vector_store, question, candidates, query_embedding)
+                    )
+                
+                if dense_docs is None:
+                    context_docs = lexical_docs[:num_chunks]
+                else:
+                    context_docs = reciprocal_rank_fusion(
+                        [dense_docs, lexical_docs],
+                        k=settings.RETRIEVAL_RRF_K
+                    )[:num_chunks]
             
             logger.info(f"Found {len(context_docs)} relevant chunks for question")
             return context_docs
             
         except Exception as e:
             logger.error(f"Error finding relevant context: {str(e)}")
-            raise
\ No newline at end of file
+            raise
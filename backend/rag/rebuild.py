@@ -0,0 +1,279 @@
+# File: backend/rag/rebuild.py
+import sys
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from app.metrics import metrics
+from database.session import SessionLocal
+from database.models.lecture import Lecture
+from rag.corpus import corpus_version
+
+# Fix for Python 3.8 compatibility with type annotations
+if sys.version_info < (3, 9):
+    import typing
+    typing.Dict = Dict
+    typing.Any = Any
+    typing.List = List
+    typing.Optional = Optional
+
+logger = logging.getLogger(__name__)
+
+IDLE = "idle"
+BUILDING = "building"
+CATCHING_UP = "catching_up"
+VALIDATING = "validating"
+COMPLETED = "completed"
+FAILED = "failed"
+
+ACTIVE_STATES = (BUILDING, CATCHING_UP, VALIDATING)
+
+
+class RebuildInProgress(Exception):
+    """Raised when a rebuild is requested while another one is running"""
+
+
+def _load_lectures(since: Optional[datetime] = None) -> List[Dict]:
+    """Id and content of every lecture (or those changed since a time)"""
+    db = SessionLocal()
+    try:
+        query = db.query(Lecture.id, Lecture.content)
+        if since is not None:
+            query = query.filter(Lecture.updated_at >= since)
+        return [{"id": row.id, "content": row.content or ""} for row in query.all()]
+    finally:
+        db.close()
+
+
+class IndexRebuilder:
+    """Blue/green rebuilds of the vector index.
+
+    A rebuild never touches the index readers are using: every lecture is
+    chunked and embedded (optionally with a different chunker or embedding
+    model) into a new generation directory. Lectures edited while it was
+    building are then re-synced, the new index is validated with smoke
+    queries, and only then does the CURRENT pointer switch to it. The old
+    generation is garbage-collected after a grace period, once in-flight
+    searches have finished with it. A failed rebuild deletes its own
+    directory and leaves the current index untouched.
+    """
+
+    def __init__(self, rag_processor, smoke_queries: List[str], smoke_samples: int, gc_delay: float):
+        self.rag_processor = rag_processor
+        self.generations = rag_processor.generations
+        self.smoke_queries = smoke_queries
+        self.smoke_samples = max(0, smoke_samples)
+        self.gc_delay = gc_delay
+        self._task = None
+        self._gc_task = None
+        self._status = {"state": IDLE}
+        metrics.register_source("index_rebuild", self.status)
+
+    def status(self) -> Dict[str, Any]:
+        return {**self._status, "current_generation": self.generations.current()}
+
+    def is_running(self) -> bool:
+        return self._status["state"] in ACTIVE_STATES
+
+    async def start(
+        self,
+        embedding_provider: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Start a rebuild in the background; settings not given are kept from the current index"""
+        # Imported here so the lecture routes can import RebuildInProgress without LangChain
+        from rag.embedding_providers import PROVIDERS, default_embedding_model
+
+        if self.is_running():
+            raise RebuildInProgress("An index rebuild is already running")
+
+        config = dict(self.rag_processor.index_config)
+        for name in ("name", "created_at", "chunks", "lectures"):
+            config.pop(name, None)
+        if embedding_provider:
+            provider = embedding_provider.lower()
+            if provider not in PROVIDERS:
+                raise ValueError(f"Unknown embedding provider: {embedding_provider}")
+            if provider != config["embedding_provider"]:
+                config["embedding_model"] = default_embedding_model(provider)
+            config["embedding_provider"] = provider
+        if embedding_model:
+            config["embedding_model"] = embedding_model
+        if chunk_size:
+            config["chunk_size"] = chunk_size
+        if chunk_overlap is not None:
+            config["chunk_overlap"] = chunk_overlap
+        if config["chunk_overlap"] >= config["chunk_size"]:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+        self._status = {
+            "state": BUILDING,
+            "generation": None,
+            "config": config,
+            "lectures": 0,
+            "total_chunks": 0,
+            "embedded_chunks": 0,
+            "caught_up_lectures": 0,
+            "validation": None,
+            "error": None,
+            "started_at": time.time(),
+            "finished_at": None
+        }
+        self._task = asyncio.ensure_future(self._rebuild(config))
+        return self.status()
+
+    async def _sync_lectures(
+        self,
+        lectures: List[Dict],
+        vector_store,
+        text_splitter,
+        pipeline,
+        chunk_counts: Dict[int, int]
+    ) -> int:
+        """Bring lectures up to date in a (not yet current) store; returns chunks indexed"""
+        from rag.processor import chunk_records
+
+        processor = self.rag_processor
+        texts, metadatas, ids, stale = [], [], [], []
+        for lecture in lectures:
+            chunks = await processor.executor.run(text_splitter.split_text, lecture["content"])
+            chunk_counts[lecture["id"]] = len(chunks)
+            lecture_metadatas, lecture_ids = chunk_records(lecture["id"], chunks)
+            pending, lecture_stale = await processor.executor.run(
+                processor.diff_lecture, lecture["id"], lecture_ids, vector_store
+            )
+            for i in pending:
+                texts.append(chunks[i])
+                metadatas.append(lecture_metadatas[i])
+                ids.append(lecture_ids[i])
+            stale.extend(lecture_stale)
+        self._status["total_chunks"] += len(texts)
+
+        def checkpoint(position: int) -> None:
+            self._status["embedded_chunks"] = embedded + position
+
+        embedded = self._status["embedded_chunks"]
+        if texts:
+            await pipeline.run(texts, metadatas, ids=ids, on_flush=checkpoint)
+        if stale:
+            await processor.executor.run(vector_store.delete, stale)
+        return len(texts)
+
+    def _validate(self, vector_store, embeddings, expected: int) -> Dict[str, Any]:
+        """Smoke-test a built index (blocking); raises if it is not fit to serve"""
+        if vector_store.count() != expected:
+            raise RuntimeError(
+                f"New index holds {vector_store.count()} chunks, expected {expected}"
+            )
+        if vector_store.lexical.count() != expected:
+            raise RuntimeError(
+                f"New lexical index holds {vector_store.lexical.count()} chunks, expected {expected}"
+            )
+
+        # Every sampled chunk must come back as a top hit for its own text
+        sample = vector_store.sample_texts(self.smoke_samples)
+        missed = 0
+        for text in sample:
+            results = vector_store.search_by_vector(embeddings.embed_query(text), k=3)
+            if not any(result["content"] == text for result in results):
+                missed += 1
+        if missed:
+            raise RuntimeError(f"{missed} of {len(sample)} sampled chunks did not retrieve themselves")
+
+        empty = [
+            question for question in self.smoke_queries
+            if expected and not vector_store.search(question, k=3)
+        ]
+        if empty:
+            raise RuntimeError(f"Smoke queries returned no results: {empty}")
+
+        return {
+            "chunks": vector_store.count(),
+            "sampled_chunks": len(sample),
+            "smoke_queries": len(self.smoke_queries)
+        }
+
+    async def _rebuild(self, config: Dict[str, Any]) -> None:
+        processor = self.rag_processor
+        started = time.perf_counter()
+        name = None
+        try:
+            name = self.generations.create(config)
+            self._status["generation"] = name
+            config, embeddings, text_splitter, vector_store = await processor.executor.run(
+                processor.open_generation, name
+            )
+            pipeline = processor.embedding_pipeline.retarget(embeddings, vector_store)
+            chunk_counts = {}
+
+            # Build: every lecture as of now, without touching the live index
+            build_started = datetime.utcnow()
+            lectures = await processor.executor.run(_load_lectures)
+            self._status["lectures"] = len(lectures)
+            await self._sync_lectures(lectures, vector_store, text_splitter, pipeline, chunk_counts)
+
+            # Catch up: lectures created or edited while the build ran
+            self._status["state"] = CATCHING_UP
+            catch_up_started = datetime.utcnow()
+            changed = await processor.executor.run(_load_lectures, build_started)
+            await self._sync_lectures(changed, vector_store, text_splitter, pipeline, chunk_counts)
+            self._status["caught_up_lectures"] = len(changed)
+
+            self._status["state"] = VALIDATING
+            validation = await processor.executor.run(
+                self._validate, vector_store, embeddings, sum(chunk_counts.values())
+            )
+            self._status["validation"] = validation
+
+            # Swap: one atomic rename of the pointer file, then readers follow it
+            self.generations.write_config(name, {
+                **config,
+                "chunks": vector_store.count(),
+                "lectures": len(lectures)
+            })
+            self.generations.activate(name)
+            await processor.executor.run(processor.refresh_generation)
+            corpus_version.bump()
+
+            # Edits that raced the swap were indexed into the old generation
+            changed = await processor.executor.run(_load_lectures, catch_up_started)
+            await self._sync_lectures(changed, vector_store, text_splitter, pipeline, chunk_counts)
+            self._status["caught_up_lectures"] += len(changed)
+
+            seconds = time.perf_counter() - started
+            self._status.update(state=COMPLETED, finished_at=time.time(), seconds=round(seconds, 3))
+            metrics.observe("index.rebuild", seconds)
+            logger.info(
+                f"Index rebuild {name} completed in {seconds:.1f}s: {len(lectures)} lectures, "
+                f"{vector_store.count()} chunks"
+            )
+            self._gc_task = asyncio.ensure_future(self._collect_later(name))
+
+        except asyncio.CancelledError:
+            if name is not None and self.generations.current() != name:
+                self.generations.discard(name)
+            self._status.update(state=FAILED, error="Cancelled", finished_at=time.time())
+            raise
+        except Exception as e:
+            logger.error(f"Index rebuild failed: {str(e)}")
+            # Readers never saw the new generation; drop it and keep serving the current one
+            if name is not None and self.generations.current() != name:
+                self.generations.discard(name)
+            self._status.update(state=FAILED, error=str(e), finished_at=time.time())
+            metrics.incr("index.rebuild_failed")
+
+    async def _collect_later(self, name: str) -> None:
+        """Remove old generations once searches that started before the swap are done"""
+        await asyncio.sleep(self.gc_delay)
+        # A rebuild started in the meantime owns its (not yet current) generation
+        keep = [self._status["generation"]] if self.is_running() else []
+        removed = await self.rag_processor.executor.run(self.generations.garbage_collect, keep)
+        logger.info(f"Garbage collection after rebuild {name} removed {len(removed)} old generations")
+
+    def shutdown(self) -> None:
+        for task in (self._task, self._gc_task):
+            if task is not None and not task.done():
+                task.cancel()
@@ -1,9 +1,15 @@
 # File: backend/rag/vector_store.py
 import sys
+import uuid
 from typing import List, Dict, Optional, Any
 from langchain.vectorstores import Chroma
 from langchain.embeddings.base import Embeddings
 from app.config import settings
+from rag.numpy_store import NumpyVectorStore
+from rag.corpus import corpus_version
+from rag.lexical_index import LexicalIndex, LEXICAL_INDEX_FILE
+from rag.embedding_providers import check_query_provider
+import os
 import logging
 
 # Fix for Python 3.8 compatibility with type annotations
@@ -17,14 +23,30 @@ if sys.version_info < (3, 9):
 logger = logging.getLogger(__name__)
 
 class VectorStore:
-    def __init__(self, embeddings: Embeddings):
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        persist_directory: Optional[str] = None,
+        embedding_provider: Optional[str] = None
+    ):
         """Initialize vector store with embeddings"""
         try:
             self.embeddings = embeddings
+            self.embedding_provider = embedding_provider
+            self.persist_directory = persist_directory or settings.VECTOR_STORE_PATH
             self.store = Chroma(
-                persist_directory=settings.VECTOR_STORE_PATH,
+                persist_directory=self.persist_directory,
                 embedding_function=embeddings
             )
+            # Cached so queries don't hit the collection; updated on every write
+            # and re-read when another process moves the corpus version
+            self._version = corpus_version.current()
+            self._count = self.store._collection.count()
+            # BM25 postings for the same chunks; built from the collection if missing
+            self.lexical = LexicalIndex(os.path.join(self.persist_directory, LEXICAL_INDEX_FILE))
+            if self.lexical.count() != self._count:
+                chunks = self.store._collection.get(include=["documents", "metadatas"])
+                self.lexical.sync(zip(chunks["ids"], chunks["documents"], chunks["metadatas"]))
             logger.info("Vector store initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing vector store: {str(e)}")
@@ -37,19 +59,98 @@ class VectorStore:
     ) -> None:
         """Add texts to vector store"""
         try:
-            self.store.add_texts(texts, metadatas)
+            ids = self.store.add_texts(texts, metadatas)
             self.store.persist()
+            self._count += len(texts)
+            self.lexical.add(ids, texts, metadatas)
+            self._version = corpus_version.bump()
             logger.info(f"Added {len(texts)} texts to vector store")
         except Exception as e:
             logger.error(f"Error adding texts to vector store: {str(e)}")
             raise
 
-    async def similarity_search(
-        self, 
-        query: str, 
-        k: int = 3
-    ) -> List[Dict]:
-        """Search for similar texts"""
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: Any,
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None
+    ) -> None:
+        """Add texts with precomputed embeddings to vector store.
+
+        With ids the write is an upsert, so re-adding a batch (e.g. a retried
+        ingest) does not create duplicates.
+        """
+        try:
+            if ids is None:
+                ids = [str(uuid.uuid4()) for _ in texts]
+                self.store._collection.add(
+                    ids=ids,
+                    embeddings=[list(map(float, vector)) for vector in embeddings],
+                    documents=texts,
+                    metadatas=metadatas
+                )
+                self._count += len(texts)
+            else:
+                self.store._collection.upsert(
+                    ids=ids,
+                    embeddings=[list(map(float, vector)) for vector in embeddings],
+                    documents=texts,
+                    metadatas=metadatas
+                )
+                self._count = self.store._collection.count()
+            self.store.persist()
+            self.lexical.add(ids, texts, metadatas)
+            self._version = corpus_version.bump()
+            logger.info(f"Added {len(texts)} texts to vector store")
+        except Exception as e:
+            logger.error(f"Error adding texts to vector store: {str(e)}")
+            raise
+
+    def ids_for_lecture(self, lecture_id: int) -> set:
+        """Ids of the chunks indexed for a lecture"""
+        result = self.store._collection.get(where={"lecture_id": lecture_id}, include=[])
+        return set(result["ids"])
+
+    def sample_texts(self, k: int) -> List[str]:
+        """Text of up to k indexed chunks"""
+        if k <= 0:
+            return []
+        return self.store._collection.get(limit=k, include=["documents"])["documents"]
+
+    def delete(self, ids: List[str]) -> int:
+        """Delete chunks by id; returns how many were deleted"""
+        if not ids:
+            return 0
+        try:
+            before = self._count
+            self.store._collection.delete(ids=list(ids))
+            self.store.persist()
+            self._count = self.store._collection.count()
+            self.lexical.delete(ids)
+            self._version = corpus_version.bump()
+            logger.info(f"Deleted {before - self._count} chunks from vector store")
+            return before - self._count
+        except Exception as e:
+            logger.error(f"Error deleting from vector store: {str(e)}")
+            raise
+
+    def count(self) -> int:
+        """Number of stored chunks"""
+        self._check_corpus()
+        return self._count
+
+    def _check_corpus(self) -> None:
+        """Re-read cached state if the corpus changed outside this object (another worker or an offline ingest)"""
+        version = corpus_version.current()
+        if version == self._version:
+            return
+        self._version = version
+        self._count = self.store._collection.count()
+        self.lexical.refresh()
+
+    def search(self, query: str, k: int = 3) -> List[Dict]:
+        """Search for similar texts (blocking)"""
         try:
             docs = self.store.similarity_search(query, k=k)
             return [
@@ -63,15 +164,68 @@ class VectorStore:
             logger.error(f"Error in similarity search: {str(e)}")
             raise
 
+    def search_by_vector(self, embedding: Any, k: int = 3) -> List[Dict]:
+        """Search for texts similar to a precomputed query embedding (blocking)"""
+        check_query_provider(embedding, self.embedding_provider)
+        try:
+            docs = self.store.similarity_search_by_vector(list(map(float, embedding)), k=k)
+            return [
+                {
+                    "content": doc.page_content,
+                    "metadata": doc.metadata
+                }
+                for doc in docs
+            ]
+        except Exception as e:
+            logger.error(f"Error in similarity search: {str(e)}")
+            raise
+
+    async def similarity_search(
+        self, 
+        query: str, 
+        k: int = 3
+    ) -> List[Dict]:
+        """Search for similar texts"""
+        return self.search(query, k=k)
+
     def clear(self) -> None:
         """Clear vector store"""
         try:
             self.store.delete_collection()
             self.store = Chroma(
-                persist_directory=settings.VECTOR_STORE_PATH,
+                persist_directory=self.persist_directory,
                 embedding_function=self.embeddings
             )
+            self._count = 0
+            self.lexical.clear()
+            self._version = corpus_version.bump()
             logger.info("Vector store cleared successfully")
         except Exception as e:
             logger.error(f"Error clearing vector store: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+def create_vector_store(
+    embeddings: Embeddings,
+    backend: Optional[str] = None,
+    persist_directory: Optional[str] = None,
+    embedding_provider: Optional[str] = None
+):
+    """Create the vector store backend selected in settings ("chroma" or "numpy").
+
+    embedding_provider identifies the vector space the index was built in;
+    query vectors tagged with another provider are refused.
+    """
+    backend = (backend or settings.VECTOR_STORE_BACKEND).lower()
+    if backend == "chroma":
+        return VectorStore(
+            embeddings,
+            persist_directory=persist_directory,
+            embedding_provider=embedding_provider
+        )
+    if backend == "numpy":
+        return NumpyVectorStore(
+            embeddings,
+            persist_directory=persist_directory or settings.NUMPY_INDEX_PATH,
+            embedding_provider=embedding_provider
+        )
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# File: backend/scripts/benchmark_vector_store.py
+import sys
+import time
+import argparse
+import logging
+import tempfile
+from pathlib import Path
+import numpy as np
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from langchain.embeddings.base import Embeddings
+from rag.vector_store import create_vector_store
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# Chroma rejects larger add() batches
+CHROMA_BATCH = 5000
+
+
+class RandomEmbeddings(Embeddings):
+    """Deterministic random embeddings so the benchmark measures the index, not the network"""
+
+    def __init__(self, dim: int, seed: int = 0):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+
+    def embed_documents(self, texts):
+        return self.rng.standard_normal((len(texts), self.dim), dtype=np.float32).tolist()
+
+    def embed_query(self, text):
+        return self.rng.standard_normal(self.dim, dtype=np.float32).tolist()
+
+
+def fill_store(store, size: int, dim: int, backend: str):
+    """Load `size` random vectors into the store in batches"""
+    rng = np.random.default_rng(1)
+    batch = CHROMA_BATCH if backend == "chroma" else 100_000
+    for start in range(0, size, batch):
+        n = min(batch, size - start)
+        vectors = rng.standard_normal((n, dim), dtype=np.float32)
+        texts = [f"chunk {start + i}" for i in range(n)]
+        metadatas = [{"lecture_id": 0, "chunk_id": start + i, "source": "benchmark"} for i in range(n)]
+        store.add_embeddings(texts, vectors, metadatas)
+
+
+def measure(store, queries: int, k: int):
+    """Run queries and return (p50, p99) latency in milliseconds"""
+    timings = []
+    for i in range(queries):
+        start = time.perf_counter()
+        store.search(f"query {i}", k=k)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def run_benchmark(sizes, backends, dim: int, queries: int, k: int):
+    print(f"{'backend':<8} {'chunks':>10} {'load s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for size in sizes:
+        for backend in backends:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                try:
+                    store = create_vector_store(
+                        RandomEmbeddings(dim),
+                        backend=backend,
+                        persist_directory=tmp_dir
+                    )
+                    start = time.perf_counter()
+                    fill_store(store, size, dim, backend)
+                    load_time = time.perf_counter() - start
+
+                    # Warm up page cache / HNSW before timing
+                    measure(store, min(queries, 10), k)
+                    p50, p99 = measure(store, queries, k)
+                    print(f"{backend:<8} {size:>10,} {load_time:>9.1f} {p50:>9.2f} {p99:>9.2f}")
+                except Exception as e:
+                    print(f"{backend:<8} {size:>10,} failed: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare query latency of vector store backends")
+    parser.add_argument("--sizes", type=str, default="10000,100000,1000000",
+                        help="Comma-separated corpus sizes (number of chunks)")
+    parser.add_argument("--backends", type=str, default="numpy,chroma",
+                        help="Comma-separated backends to benchmark")
+    parser.add_argument("--dim", type=int, default=1536,
+                        help="Embedding dimension (1536 matches text-embedding-ada-002)")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="Number of timed queries per run")
+    parser.add_argument("--k", type=int, default=3,
+                        help="Number of results per query")
+    args = parser.parse_args()
+
+    run_benchmark(
+        [int(size) for size in args.sizes.split(",")],
+        [backend.strip() for backend in args.backends.split(",")],
+        args.dim,
+        args.queries,
+        args.k
+    )
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# File: backend/scripts/bulk_ingest.py
+import sys
+import os
+import re
+import time
+import asyncio
+import argparse
+import logging
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from database import SessionLocal, Lecture
+from rag.processor import RAGProcessor, create_text_splitter, chunk_records
+from app.metrics import metrics
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+LECTURE_EXTENSIONS = (".txt", ".md")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize unicode, line endings and runs of blank lines so equal content chunks identically"""
+    text = unicodedata.normalize("NFC", text)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def prepare_file(path: str, root: str, chunk_size: int, chunk_overlap: int) -> dict:
+    """Read, normalize and chunk one lecture file (runs in a worker process)"""
+    started = time.perf_counter()
+    content = normalize_text(Path(path).read_text(encoding="utf-8", errors="replace"))
+    chunks = create_text_splitter(chunk_size, chunk_overlap).split_text(content)
+    return {
+        "path": path,
+        # The path relative to the corpus root identifies the lecture across runs
+        "title": Path(path).relative_to(root).with_suffix("").as_posix(),
+        "content": content,
+        "chunks": chunks,
+        "seconds": time.perf_counter() - started
+    }
+
+
+def find_lecture_files(root: Path) -> list:
+    return sorted(
+        path for path in root.rglob("*")
+        if path.is_file() and path.suffix.lower() in LECTURE_EXTENSIONS
+    )
+
+
+def upsert_lectures(db, prepared: list) -> dict:
+    """Create or update Lecture rows in one transaction; returns counts by outcome"""
+    counts = {"created": 0, "updated": 0, "unchanged": 0}
+    titles = [item["title"] for item in prepared]
+    existing = {
+        lecture.title: lecture
+        for lecture in db.query(Lecture).filter(Lecture.title.in_(titles)).all()
+    }
+
+    new_lectures = []
+    for item in prepared:
+        lecture = existing.get(item["title"])
+        if lecture is None:
+            lecture = Lecture(title=item["title"], content=item["content"])
+            new_lectures.append(lecture)
+            counts["created"] += 1
+        elif lecture.content != item["content"]:
+            lecture.content = item["content"]
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+        item["lecture"] = lecture
+
+    db.add_all(new_lectures)
+    db.commit()
+    for item in prepared:
+        item["lecture_id"] = item.pop("lecture").id
+    return counts
+
+
+def plan_chunks(processor: RAGProcessor, prepared: list) -> tuple:
+    """Diff every lecture against the index: chunks to embed and stale chunk ids to delete"""
+    texts, metadatas, ids, stale = [], [], [], []
+    total = 0
+    for item in prepared:
+        item_metadatas, item_ids = chunk_records(item["lecture_id"], item["chunks"])
+        total += len(item_ids)
+        pending, item_stale = processor.diff_lecture(item["lecture_id"], item_ids)
+        for i in pending:
+            texts.append(item["chunks"][i])
+            metadatas.append(item_metadatas[i])
+            ids.append(item_ids[i])
+        stale.extend(item_stale)
+    return texts, metadatas, ids, stale, total
+
+
+def format_timing(name: str) -> str:
+    timing = metrics.snapshot()["timings"].get(name, {"count": 0})
+    if not timing["count"]:
+        return "n/a"
+    return f"p50 {timing['p50_ms']} ms, p99 {timing['p99_ms']} ms ({timing['count']} calls)"
+
+
+def bulk_ingest(root: Path, workers: int) -> None:
+    started = time.perf_counter()
+    files = find_lecture_files(root)
+    print(f"Found {len(files)} lecture files under {root}")
+    if not files:
+        return
+
+    # Opened first: chunking must match the current index generation
+    processor = RAGProcessor()
+    try:
+        # Stage 1: read, normalize and chunk files in parallel processes
+        prepare_started = time.perf_counter()
+        config = processor.index_config
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            prepared = list(pool.map(
+                prepare_file,
+                [str(path) for path in files],
+                [str(root)] * len(files),
+                [config["chunk_size"]] * len(files),
+                [config["chunk_overlap"]] * len(files)
+            ))
+        prepare_seconds = time.perf_counter() - prepare_started
+
+        # Stage 2: upsert lecture rows in bulk
+        db = SessionLocal()
+        try:
+            counts = upsert_lectures(db, prepared)
+        finally:
+            db.close()
+
+        # Stage 3: embed and index only chunks the store does not have, drop stale ones
+        texts, metadatas, ids, stale, total_chunks = plan_chunks(processor, prepared)
+        stats = None
+        if texts:
+            stats = asyncio.run(processor.ingest_chunks(texts, metadatas, ids=ids))
+        # Chunks of edited lectures that no longer exist
+        deleted = processor.vector_store.delete(stale) if stale else 0
+    finally:
+        processor.shutdown()
+
+    total_seconds = time.perf_counter() - started
+    print("\nBulk ingest summary")
+    print(f"  Files:            {len(files)} ({workers} worker processes, {prepare_seconds:.2f}s to prepare)")
+    print(f"  Lectures:         {counts['created']} created, {counts['updated']} updated, "
+          f"{counts['unchanged']} unchanged")
+    print(f"  Chunks:           {total_chunks} total, {total_chunks - len(texts)} already indexed, "
+          f"{len(texts)} embedded, {deleted} stale removed")
+    if stats:
+        print(f"  Embedding:        {stats['seconds']:.2f}s, {stats['chunks_per_second']} chunks/s, "
+              f"{stats['batches']} batches, {stats['retries']} retries")
+        print(f"  Batch latency:    {format_timing('embedding.run')}")
+        print(f"  Index flushes:    {stats['flushes']}, {format_timing('index_writer.run')}")
+    else:
+        print("  Embedding:        nothing to do")
+    print(f"  Total:            {total_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a directory tree of lecture files into the RAG index")
+    parser.add_argument("--dir", type=str, default=str(backend_dir / "data/lectures"),
+                        help="Root directory of lecture files (.txt, .md)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes used to read and chunk files")
+    args = parser.parse_args()
+
+    bulk_ingest(Path(args.dir).resolve(), max(1, args.workers))
@@ -2,5 +2,5 @@
 from rag.processor import RAGProcessor
 
 processor = RAGProcessor()
-count = processor.vector_store._collection.count()
+count = processor.vector_store.count()
 print(f"Number of documents in vector store: {count}")
\ No newline at end of file
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# File: backend/scripts/compact_numpy_index.py
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from app.config import settings
+from rag.generations import IndexGenerations
+from rag.numpy_store import NumpyVectorStore
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fold deleted-chunk tombstones into the NumPy index sidecar (run while ingestion is idle)"
+    )
+    parser.add_argument("--path", type=str, default=None,
+                        help="Index directory (default: the current generation under NUMPY_INDEX_PATH)")
+    args = parser.parse_args()
+
+    if args.path:
+        path = Path(args.path)
+    else:
+        generations = IndexGenerations(settings.NUMPY_INDEX_PATH)
+        path = generations.path(generations.current())
+
+    # Compaction never embeds anything
+    store = NumpyVectorStore(embeddings=None, persist_directory=str(path))
+    compacted = store.compact()
+    print(f"{path}: folded {compacted} tombstones, {store.count()} live chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -74,12 +74,20 @@ def load_lectures():
         logger.info("✓ Lecture processed for RAG system")
 
         # Verify data is in vector store
-        results = processor.vector_store.similarity_search(
+        results = processor.vector_store.search(
             "What is computer science?",
             k=1
         )
         logger.info(f"✓ Vector store test successful - found {len(results)} results")
-        
+
+        # Report embedding cache usage (re-runs on the same corpus should be all hits)
+        if hasattr(processor.embeddings, "stats"):
+            stats = processor.embeddings.stats()
+            logger.info(
+                f"✓ Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_ratio']:.0%} hit ratio)"
+            )
+
         logger.info("Setup complete! You can now start asking questions.")
         
     except Exception as e:
@@ -12,6 +12,8 @@ sys.path.append(str(backend_dir))
 # Change working directory to backend
 os.chdir(backend_dir)
 
+from app.config import settings
+
 if __name__ == "__main__":
     print("Starting WebSocket server...")
     print(f"Current working directory: {os.getcwd()}")
@@ -21,5 +23,8 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True,
-        log_level="info"
+        log_level="info",
+        # Protocol-level heartbeats: half-open sockets are closed after a missed pong
+        ws_ping_interval=settings.WS_PING_INTERVAL_SECONDS,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT_SECONDS
     ) 
\ No newline at end of file
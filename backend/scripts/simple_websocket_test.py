@@ -23,17 +23,20 @@ async def test_websocket():
         async with websockets.connect(uri) as websocket:
             logger.info("Connected to WebSocket server")
             
-            # Send audio path
-            request = {"audio_path": audio_path}
-            logger.info(f"Sending audio path: {audio_path}")
-            await websocket.send(json.dumps(request))
+            # Send the audio file as a binary frame
+            logger.info(f"Sending audio file: {audio_path}")
+            await websocket.send(Path(audio_path).read_bytes())
             
-            # Receive response
+            # Receive response (the transcript comes first, then the answer)
             logger.info("Waiting for response...")
-            response = await websocket.recv()
+            while True:
+                data = json.loads(await websocket.recv())
+                if "answer" in data or "error" in data:
+                    break
+                if data.get("type") == "final_transcript" and not data.get("content"):
+                    break
+                logger.info(f"Received {data.get('type')}: {data.get('content')}")
             
-            # Parse response
-            data = json.loads(response)
             logger.info(f"Received response:")
             logger.info(f"Question: {data.get('question', 'N/A')}")
             logger.info(f"Answer: {data.get('answer', 'N/A')}")
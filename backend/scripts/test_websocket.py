@@ -27,16 +27,19 @@ def test_websocket_connection(server_url, audio_path):
         )
         logger.info("Connected to WebSocket server")
         
-        # Send audio path
-        request = {"audio_path": str(audio_path)}
-        logger.info(f"Sending audio path: {audio_path}")
-        ws.send(json.dumps(request))
+        # Send the audio file as a binary frame
+        logger.info(f"Sending audio file: {audio_path}")
+        ws.send(Path(audio_path).read_bytes(), opcode=websocket.ABNF.OPCODE_BINARY)
         
-        # Receive response
+        # Receive response (the transcript comes first, then the answer)
         logger.info("Waiting for response...")
-        response = json.loads(ws.recv())
-        
-        logger.info(f"Received response: {response}")
+        while True:
+            response = json.loads(ws.recv())
+            logger.info(f"Received response: {response}")
+            if "answer" in response or "error" in response:
+                break
+            if response.get("type") == "final_transcript" and not response.get("content"):
+                break
         
         # Close connection
         ws.close()
@@ -8,6 +8,11 @@ import time
 import logging
 from pathlib import Path
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,10 +20,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Subprotocols: MessagePack frames with inline audio, or JSON. The JSON one is
+# always offered too: websocket-client fails the handshake if the server
+# accepts none of the offered subprotocols (e.g. it lacks msgpack)
+MSGPACK_SUBPROTOCOL = "vt.msgpack"
+JSON_SUBPROTOCOL = "vt.json"
+
 class UnrealWebSocketClient:
-    def __init__(self, server_url="ws://localhost:8000/ws"):
-        """Initialize WebSocket client for Unreal Engine"""
+    def __init__(self, server_url="ws://localhost:8000/ws", use_msgpack=True):
+        """Initialize WebSocket client for Unreal Engine
+
+        With use_msgpack (and msgpack installed) the audio is uploaded and
+        the answer's speech received inside MessagePack frames. Otherwise
+        the audio is sent as a binary frame and the speech downloaded over
+        HTTP.
+        """
         self.server_url = server_url
+        self.use_msgpack = use_msgpack and msgpack is not None
+        self.binary = False
         self.ws = None
         self.unreal_audio_dir = Path("C:/UnrealAudio")
         
@@ -26,12 +45,22 @@ class UnrealWebSocketClient:
         self.unreal_audio_dir.mkdir(parents=True, exist_ok=True)
         logger.info(f"Unreal audio directory: {self.unreal_audio_dir}")
 
+    def _subprotocols(self):
+        """Subprotocols to offer, preferred first; anything but msgpack means JSON"""
+        if self.use_msgpack:
+            return [MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL]
+        return [JSON_SUBPROTOCOL]
+
     def connect(self):
         """Connect to WebSocket server"""
         try:
             logger.info(f"Connecting to WebSocket server at {self.server_url}")
-            self.ws = websocket.create_connection(self.server_url)
-            logger.info("Connected to WebSocket server")
+            self.ws = websocket.create_connection(
+                self.server_url,
+                subprotocols=self._subprotocols()
+            )
+            self.binary = self.ws.getsubprotocol() == MSGPACK_SUBPROTOCOL
+            logger.info(f"Connected to WebSocket server ({'msgpack' if self.binary else 'json'})")
             return True
         except Exception as e:
             logger.error(f"Failed to connect to WebSocket server: {e}")
@@ -58,16 +87,25 @@ class UnrealWebSocketClient:
                 return None
             
             logger.info(f"Sending audio file: {audio_path}")
-            self.ws.send(json.dumps({"audio_path": str(audio_path)}))
-            
-            # Receive AI response
-            logger.info("Waiting for AI response...")
-            response = json.loads(self.ws.recv())
+            if self.binary:
+                response = self._send_audio_inline(audio_file)
+            else:
+                # The file itself goes in a binary frame; the server never reads client paths
+                self.ws.send(audio_file.read_bytes(), opcode=websocket.ABNF.OPCODE_BINARY)
+                response = self._wait_for_answer(json.loads)
             
             logger.info(f"Received AI response: {response['answer'][:50]}...")
             
+            if response.get("audio"):
+                # The speech came with the answer; no download needed
+                output_audio = self.unreal_audio_dir / "output.mp3"
+                output_audio.write_bytes(response.pop("audio"))
+                logger.info(f"Saved AI speech to {output_audio}")
+                response["local_audio_path"] = str(output_audio)
+                self._play_audio(output_audio)
+            
             # Download AI Speech if available
-            if response["audio_url"]:
+            elif response["audio_url"]:
                 audio_url = f"http://localhost:8000{response['audio_url']}"
                 output_audio = self.unreal_audio_dir / "output.mp3"
                 
@@ -89,6 +127,28 @@ class UnrealWebSocketClient:
             self.connect()
             return None
 
+    def _send_audio_inline(self, audio_file):
+        """Upload the audio inside a MessagePack frame and wait for the answer frame"""
+        self.ws.send(
+            msgpack.packb({"type": "audio_upload", "audio": audio_file.read_bytes()}, use_bin_type=True),
+            opcode=websocket.ABNF.OPCODE_BINARY
+        )
+        return self._wait_for_answer(lambda frame: msgpack.unpackb(frame, raw=False))
+
+    def _wait_for_answer(self, decode):
+        """Read frames until the answer to an uploaded file arrives"""
+        logger.info("Waiting for AI response...")
+        while True:
+            response = decode(self.ws.recv())
+            if "answer" in response:
+                return response
+            if response.get("type") == "final_transcript" and not response.get("content"):
+                # Nothing was recognized, so there is no answer to wait for
+                return {"question": "", "answer": "", "audio_url": None}
+            if "error" in response or response.get("type") == "error":
+                raise RuntimeError(response.get("error") or response.get("content"))
+            logger.info(f"Received {response.get('type')}: {response.get('content')}")
+
     def _play_audio(self, audio_path):
         """Play audio file using Windows Media Player"""
         try:
@@ -4,14 +4,39 @@ import threading
 import time
 import os
 import json
+import uuid
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Subprotocols: MessagePack frames with inline audio, or JSON. The JSON one is
+# always offered too: websocket-client fails the handshake if the server
+# accepts none of the offered subprotocols (e.g. it lacks msgpack)
+MSGPACK_SUBPROTOCOL = "vt.msgpack"
+JSON_SUBPROTOCOL = "vt.json"
 
 class WebSocketClient:
-    def __init__(self, server_url="ws://localhost:8000/ws"):
-        """Initialize WebSocket client with server URL"""
+    def __init__(self, server_url="ws://localhost:8000/ws", keepalive_interval=60, use_msgpack=True):
+        """Initialize WebSocket client with server URL
+
+        keepalive_interval: seconds between pings that keep an idle
+        connection from being closed by the server (0 disables them)
+        use_msgpack: offer the MessagePack subprotocol (audio inline, no
+        audio download); JSON is used if the server or msgpack lacks it
+        """
         self.server_url = server_url
+        self.keepalive_interval = keepalive_interval
+        self.use_msgpack = use_msgpack and msgpack is not None
+        self.binary = False  # MessagePack negotiated
         self.ws = None
         self.connected = False
-        self.response_callback = None
+        self.response_callback = None  # for frames without a request_id
+        self.callbacks = {}  # request_id -> callback, until the request's "done" frame
+        self.stream_request_id = None
+        self._binary_request_id = None  # owner of the next binary frame
+        self._lock = threading.Lock()
         
         # Set up audio directory
         project_dir = unreal.Paths.project_dir()
@@ -20,6 +45,12 @@ class WebSocketClient:
             os.makedirs(self.audio_dir)
             unreal.log(f"Created audio directory: {self.audio_dir}")
     
+    def _subprotocols(self):
+        """Subprotocols to offer, preferred first; anything but msgpack means JSON"""
+        if self.use_msgpack:
+            return [MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL]
+        return [JSON_SUBPROTOCOL]
+
     def connect(self):
         """Connect to the WebSocket server"""
         try:
@@ -31,11 +62,16 @@ class WebSocketClient:
                 on_open=self._on_open,
                 on_message=self._on_message,
                 on_error=self._on_error,
-                on_close=self._on_close
+                on_close=self._on_close,
+                subprotocols=self._subprotocols()
             )
             
-            # Start WebSocket connection in a separate thread
-            self.ws_thread = threading.Thread(target=self.ws.run_forever, daemon=True)
+            # Start WebSocket connection in a separate thread; protocol pings detect a dead server
+            self.ws_thread = threading.Thread(
+                target=self.ws.run_forever,
+                kwargs={"ping_interval": 20, "ping_timeout": 10},
+                daemon=True
+            )
             self.ws_thread.start()
             
             # Wait for connection to establish
@@ -46,6 +82,8 @@ class WebSocketClient:
             
             if self.connected:
                 unreal.log(f"Connected to WebSocket server at {self.server_url}")
+                if self.keepalive_interval:
+                    threading.Thread(target=self._keepalive, daemon=True).start()
                 return True
             else:
                 unreal.log_error(f"Failed to connect to WebSocket server at {self.server_url}")
@@ -60,62 +98,194 @@ class WebSocketClient:
         if self.ws:
             self.ws.close()
             unreal.log("Disconnected from WebSocket server")
+
+    def _keepalive(self):
+        """Ping while connected so the server does not reap the idle connection"""
+        ws = self.ws
+        while True:
+            time.sleep(self.keepalive_interval)
+            if not self.connected or ws is not self.ws:
+                return
+            try:
+                self._send({"type": "ping"})
+            except Exception as e:
+                unreal.log_error(f"Error sending keepalive: {str(e)}")
+                return
+
+    def _send(self, message):
+        """Send a message in the negotiated encoding"""
+        if self.binary:
+            self.ws.send(msgpack.packb(message, use_bin_type=True), opcode=websocket.ABNF.OPCODE_BINARY)
+        else:
+            self.ws.send(json.dumps(message))
+
+    def _new_request(self, callback):
+        """Register a callback under a fresh request_id; responses are routed to it"""
+        request_id = uuid.uuid4().hex[:12]
+        if callback:
+            with self._lock:
+                self.callbacks[request_id] = callback
+        return request_id
+
+    def _forget_request(self, request_id):
+        with self._lock:
+            self.callbacks.pop(request_id, None)
+
+    def _callback_for(self, request_id):
+        if request_id is None:
+            return self.response_callback
+        with self._lock:
+            return self.callbacks.get(request_id)
     
     def send_audio(self, audio_file, callback=None):
-        """Send audio file to the WebSocket server"""
+        """Send audio file to the WebSocket server; returns the request_id (False on error)"""
         if not self.connected:
             unreal.log_error("Not connected to WebSocket server")
             return False
         
-        self.response_callback = callback
+        request_id = self._new_request(callback)
         
         try:
             # Read and send audio file
             with open(audio_file, 'rb') as f:
                 audio_data = f.read()
             
-            self.ws.send(audio_data, opcode=websocket.ABNF.OPCODE_BINARY)
+            if self.binary:
+                # One frame: the audio travels inside the message
+                self._send({"type": "audio_upload", "request_id": request_id, "audio": audio_data})
+            else:
+                # Announce the upload so its transcript and answer carry our request_id
+                self._send({"type": "audio_upload", "request_id": request_id})
+                self.ws.send(audio_data, opcode=websocket.ABNF.OPCODE_BINARY)
             unreal.log(f"Sent audio file: {audio_file}")
-            return True
+            return request_id
             
         except Exception as e:
+            self._forget_request(request_id)
             unreal.log_error(f"Error sending audio: {str(e)}")
             return False
     
+    def start_audio_stream(self, sample_rate=16000, callback=None):
+        """Start streaming microphone audio (16-bit mono PCM) to the server.
+
+        The callback receives partial_transcript and final_transcript messages
+        while the user talks, then the answer once they stop speaking. It
+        stays registered until the next stream is started.
+        """
+        if not self.connected:
+            unreal.log_error("Not connected to WebSocket server")
+            return False
+
+        if self.stream_request_id is not None:
+            self._forget_request(self.stream_request_id)
+        self.stream_request_id = self._new_request(callback)
+
+        try:
+            self._send({
+                "type": "audio_stream_start",
+                "encoding": "pcm16",
+                "sample_rate": sample_rate,
+                "request_id": self.stream_request_id
+            })
+            unreal.log(f"Started audio stream at {sample_rate} Hz")
+            return self.stream_request_id
+
+        except Exception as e:
+            unreal.log_error(f"Error starting audio stream: {str(e)}")
+            return False
+
+    def send_audio_chunk(self, pcm_bytes):
+        """Send a chunk of PCM audio for the current stream"""
+        if not self.connected:
+            return False
+
+        try:
+            if self.binary:
+                self._send({"type": "audio_chunk", "audio": pcm_bytes})
+            else:
+                self.ws.send(pcm_bytes, opcode=websocket.ABNF.OPCODE_BINARY)
+            return True
+
+        except Exception as e:
+            unreal.log_error(f"Error sending audio chunk: {str(e)}")
+            return False
+
+    def end_audio_stream(self):
+        """Finish the current stream so any buffered speech is transcribed"""
+        if not self.connected:
+            return False
+
+        try:
+            self._send({"type": "audio_stream_end", "request_id": self.stream_request_id})
+            unreal.log("Ended audio stream")
+            return True
+
+        except Exception as e:
+            unreal.log_error(f"Error ending audio stream: {str(e)}")
+            return False
+
     def send_text(self, text_message, callback=None):
-        """Send text message to the WebSocket server"""
+        """Send text message to the WebSocket server; returns the request_id (False on error)
+
+        Several questions may be in flight at once; each callback only
+        receives the responses to its own question.
+        """
         if not self.connected:
             unreal.log_error("Not connected to WebSocket server")
             return False
         
-        self.response_callback = callback
+        request_id = self._new_request(callback)
         
         try:
-            # Create JSON message format
-            message = json.dumps({
-                "type": "text",
-                "question": text_message
+            self._send({
+                "type": "text_input",
+                "content": text_message,
+                "request_id": request_id
             })
-            
-            self.ws.send(message)
             unreal.log(f"Sent text message: {text_message}")
-            return True
+            return request_id
             
         except Exception as e:
+            self._forget_request(request_id)
             unreal.log_error(f"Error sending text: {str(e)}")
             return False
     
+    def cancel(self, request_id=None):
+        """Cancel one in-flight request, or every request on the connection (None)
+
+        The request's callback receives a {"type": "cancelled"} message.
+        """
+        if not self.connected:
+            return False
+
+        try:
+            message = {"type": "cancel"}
+            if request_id is not None:
+                message["request_id"] = request_id
+            self._send(message)
+            unreal.log(f"Cancelled request: {request_id or 'all'}")
+            return True
+
+        except Exception as e:
+            unreal.log_error(f"Error cancelling request: {str(e)}")
+            return False
+
     def _on_open(self, ws):
         """Called when WebSocket connection is established"""
+        self.binary = ws.sock is not None and ws.sock.getsubprotocol() == MSGPACK_SUBPROTOCOL
         self.connected = True
-        unreal.log("WebSocket connection opened")
+        unreal.log(f"WebSocket connection opened ({'msgpack' if self.binary else 'json'})")
     
     def _on_message(self, ws, message):
         """Called when a message is received from the server"""
         try:
+            if isinstance(message, bytes) and self.binary:
+                self._on_msgpack(message)
             # Check if message is binary (audio file)
-            if isinstance(message, bytes):
-                timestamp = int(time.time())
+            elif isinstance(message, bytes):
+                # A binary frame belongs to the request of the frame announcing it
+                request_id, self._binary_request_id = self._binary_request_id, None
+                timestamp = int(time.time() * 1000)
                 response_filename = os.path.join(self.audio_dir, f"response_{timestamp}.wav")
                 
                 with open(response_filename, 'wb') as f:
@@ -124,13 +294,15 @@ class WebSocketClient:
                 unreal.log(f"Received audio response: {response_filename}")
                 
                 # Call the callback function in the main thread
-                if self.response_callback:
+                callback = self._callback_for(request_id)
+                if callback:
                     response_data = {
                         "type": "audio", 
                         "file": response_filename,
-                        "audio_url": response_filename
+                        "audio_url": response_filename,
+                        "request_id": request_id
                     }
-                    unreal.execute_in_main_thread(lambda: self.response_callback(response_data))
+                    unreal.execute_in_main_thread(lambda: callback(response_data))
             else:
                 # Process text message
                 try:
@@ -140,9 +312,9 @@ class WebSocketClient:
                     # Handle response according to the format from chat_ui.html
                     # The response should contain type, question, answer, and audio_url
                     if isinstance(json_data, dict):
-                        # Pass the entire response data to the callback
-                        if self.response_callback:
-                            unreal.execute_in_main_thread(lambda: self.response_callback(json_data))
+                        if "size" in json_data:
+                            self._binary_request_id = json_data.get("request_id")
+                        self._route(json_data)
                     else:
                         # Fallback to plain text
                         if self.response_callback:
@@ -160,6 +332,33 @@ class WebSocketClient:
         except Exception as e:
             unreal.log_error(f"Error processing WebSocket message: {str(e)}")
     
+    def _on_msgpack(self, message):
+        """Handle a MessagePack frame; inline audio is saved to a file first"""
+        data = msgpack.unpackb(message, raw=False)
+        audio = data.pop("audio", None)
+        if audio is not None:
+            timestamp = int(time.time() * 1000)
+            response_filename = os.path.join(self.audio_dir, f"response_{timestamp}_{data.get('index', 0)}.mp3")
+            with open(response_filename, 'wb') as f:
+                f.write(audio)
+            data["file"] = response_filename
+            unreal.log(f"Received audio response: {response_filename}")
+        self._route(data)
+
+    def _route(self, json_data):
+        """Pass a message to the callback of its request"""
+        # Responses may arrive out of order; route by request_id
+        request_id = json_data.get("request_id")
+        if json_data.get("type") == "pong":
+            return
+        if json_data.get("type") == "done":
+            if request_id != self.stream_request_id:
+                self._forget_request(request_id)
+            return
+        callback = self._callback_for(request_id)
+        if callback:
+            unreal.execute_in_main_thread(lambda: callback(json_data))
+
     def _on_error(self, ws, error):
         """Called when a WebSocket error occurs"""
         unreal.log_error(f"WebSocket error: {str(error)}")